@@ -1,19 +1,25 @@
 """
 Build Script for Windows Executable
 This script should be run on Windows to create the .exe file
+
+python BUILD_WINDOWS_EXE.py [--onedir]
+--onedir builds dist/GalvoSwap/GalvoSwap.exe next to its runtime instead of a
+single exe that unpacks itself on every launch.
 """
 
 import PyInstaller.__main__
 import os
 import sys
 
-def build_windows_exe():
+def build_windows_exe(onedir=False):
     """Build Windows executable for GalvoSwap"""
+    exe_path = os.path.join('dist', 'GalvoSwap', 'GalvoSwap.exe') if onedir \
+        else os.path.join('dist', 'GalvoSwap.exe')
     
     # PyInstaller command for Windows
     args = [
         'GalvoSwap_v2.py',
-        '--onefile',
+        '--onedir' if onedir else '--onefile',
         '--noconsole',
         '--name=GalvoSwap',
         '--windowed',
@@ -32,11 +38,11 @@ def build_windows_exe():
     try:
         PyInstaller.__main__.run(args)
         print("\n✅ Build successful!")
-        print(f"Executable location: {os.path.abspath('dist/GalvoSwap.exe')}")
-        print(f"File size: {os.path.getsize('dist/GalvoSwap.exe') / 1024 / 1024:.1f} MB")
+        print(f"Executable location: {os.path.abspath(exe_path)}")
+        print(f"File size: {os.path.getsize(exe_path) / 1024 / 1024:.1f} MB")
         
         # Test if executable exists
-        if os.path.exists('dist/GalvoSwap.exe'):
+        if os.path.exists(exe_path):
             print("\n🎯 Windows executable ready!")
             print("\nTo use:")
             print("1. Run as Administrator")
@@ -66,4 +72,4 @@ if __name__ == "__main__":
         print("4. Run: python BUILD_WINDOWS_EXE.py")
         sys.exit(1)
     
-    build_windows_exe()
\ No newline at end of file
+    build_windows_exe(onedir='--onedir' in sys.argv[1:])
\ No newline at end of file
@@ -4,26 +4,58 @@ Automatically switches between EZCAD2 and LightBurn drivers for fiber lasers
 Features: Auto-uninstall old driver, force install, configurable hardware ID, verification
 Author: William Sorensen (Christ Driven Geek)
 Target: Windows 10/11 (Requires Administrator)
+
+Command line (no GUI): --status | --switch ezcad|lightburn [--json]
 """
 
-import tkinter as tk
-from tkinter import messagebox, filedialog
+import asyncio
 import subprocess
 import ctypes
 import sys
 import os
-import json
-import threading
 import time
 
+from ezswitch.aio import AsyncRunner, StepTimeout, run_blocking, within
+from ezswitch.backend import DeviceInfo, create_backend, preferred_device
+from ezswitch.broker import BrokerClient, request_timeout
+from ezswitch.config import CONFIG_FILE, PathChecker, read_config, write_config
+from ezswitch.engine import DEFAULT_HARDWARE_ID, DRIVERS, SwitchEngine, classify_service, target_for
+from ezswitch.history import HistoryStore
+from ezswitch.inf_cache import InfCache
+from ezswitch.profiles import ProfileIndex, profile_config
+from ezswitch.snapshot import RevertPoints, load_snapshot, save_snapshot
+from ezswitch.staging import DriverStaging
+from ezswitch.startup import mark, startup_report
+from ezswitch.timeouts import StepTimeouts
+from ezswitch.tracing import TRACE_FILE, Tracer, get_tracer, set_tracer, span
+
 # Configuration
-CONFIG_FILE = "driver_paths.json"
-DEFAULT_HARDWARE_ID = "VID_9588&PID_9899"
 LIGHTBURN_DEFAULT_PATH = r"C:\Program Files\LightBurn\EzCad2Driver\EzCad2Driver.inf"
 
+# Status line, status colour, detail line, button text, button colour per active driver
+DRIVER_STATUS = {
+    "LightBurn": ("LightBurn Driver Active", "#27ae60", "(WinUSB Protocol - Ready for LightBurn)",
+                  "Switch to EZCAD2", "#3498db"),
+    "EZCAD": ("EZCAD2 Driver Active", "#3498db", "(LMC Protocol - Ready for EZCAD2)",
+              "Switch to LightBurn", "#27ae60"),
+}
+
+# tkinter is imported on demand (load_gui) so command-line runs never pay for it
+tk = None
+messagebox = None
+filedialog = None
+
+
+def load_gui():
+    """Import tkinter into the module globals used by the GUI."""
+    global tk, messagebox, filedialog
+    import tkinter
+    from tkinter import messagebox as tk_messagebox, filedialog as tk_filedialog
+    tk, messagebox, filedialog = tkinter, tk_messagebox, tk_filedialog
+
 
 class EZLightBurnDriverSwitch:
-    def __init__(self, root):
+    def __init__(self, root, broker=None):
         self.root = root
         self.root.title("EZ LightBurn Driver Switch")
         self.root.geometry("560x480")
@@ -33,48 +65,47 @@ class EZLightBurnDriverSwitch:
         self.config = {}
         self.current_driver = "Unknown"
         self.is_working = False
+        self.backend = None
+        self.inf_cache = InfCache()
+        self.staging = DriverStaging(inf_cache=self.inf_cache)
+        # Detections and switches done in this process (the broker keeps its own)
+        self.history = HistoryStore()
+        # Driver package each switch replaced, per device, for the Revert button
+        self.reverts = RevertPoints()
+        self.devices = []
+        self.showing_last_known = False
+        # Driver paths are checked in the background (they may be on a slow
+        # share); path -> PathCheck, None while a recheck is running
+        self.path_checker = PathChecker()
+        self.path_status = {}
+        self.last_detection = None
+        # BrokerClient when an elevated broker does the device work for us
+        self.broker = broker
+        # Detection and switching run as coroutines on this loop; results come
+        # back to the Tk thread through root.after
+        self.runner = AsyncRunner(lambda func: self.root.after(0, func))
+        self.swap_task = None
+        self.detect_task = None
+        self.prewarm_task = None
         
         # Load config or show setup
         if not self.load_config():
             self.show_setup_wizard()
         else:
             self.create_main_ui()
-            # Small delay to allow UI to render before checking drivers
-            self.root.after(300, self.detect_current_driver)
+            # Show the last detected state right away, then refresh it
+            self._show_last_known()
+            self.root.after_idle(self.detect_current_driver)
     
     def load_config(self):
-        """Load and validate configuration."""
-        if not os.path.exists(CONFIG_FILE):
-            return False
-        try:
-            with open(CONFIG_FILE, 'r') as f:
-                self.config = json.load(f)
-            
-            # Ensure all required keys exist
-            required_keys = ['ezcad_driver', 'lightburn_driver', 'hardware_id', 'force_install']
-            for key in required_keys:
-                if key not in self.config:
-                    if key == 'hardware_id':
-                        self.config[key] = DEFAULT_HARDWARE_ID
-                    elif key == 'force_install':
-                        self.config[key] = True
-                    else:
-                        return False
-            
-            # Validate driver files exist
-            if not os.path.exists(self.config['ezcad_driver']) or \
-               not os.path.exists(self.config['lightburn_driver']):
-                return False
-                
-            return True
-        except Exception:
-            return False
+        """Load configuration. Driver paths are validated later, off the UI thread."""
+        self.config, valid = read_config(CONFIG_FILE, check_paths=False)
+        return valid
 
     def save_config(self):
         """Save configuration to JSON."""
         try:
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(self.config, f, indent=4)
+            write_config(self.config, CONFIG_FILE)
             return True
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save config: {e}")
@@ -84,7 +115,7 @@ class EZLightBurnDriverSwitch:
         """Display setup wizard for first-time configuration."""
         wizard = tk.Toplevel(self.root)
         wizard.title("EZ LightBurn Driver Switch - Setup")
-        wizard.geometry("640x620")
+        wizard.geometry("640x690")
         wizard.resizable(False, False)
         wizard.grab_set()
         
@@ -185,18 +216,55 @@ class EZLightBurnDriverSwitch:
             wraplength=550,
             justify=tk.LEFT
         ).pack(anchor=tk.W, padx=5, pady=(5, 0))
+        
+        staged_var = tk.BooleanVar(value=self.config.get('use_staged_drivers', True))
+        staged_check = tk.Checkbutton(
+            adv_frame,
+            text="Reuse Staged Driver Packages (Faster switching)",
+            variable=staged_var,
+            font=("Segoe UI", 9)
+        )
+        staged_check.pack(anchor=tk.W, pady=(5, 0))
+        
+        consolidated_var = tk.BooleanVar(value=self.config.get('switch_mode') == "consolidated")
+        consolidated_check = tk.Checkbutton(
+            adv_frame,
+            text="Run Each Switch as One PowerShell Script (installs from the INF)",
+            variable=consolidated_var,
+            font=("Segoe UI", 9)
+        )
+        consolidated_check.pack(anchor=tk.W, pady=(5, 0))
 
         def save_wizard():
             # Validation
-            if not os.path.exists(ez_var.get()):
-                messagebox.showerror("Error", "EZCAD2 driver file not found.\n\nPlease select a valid .inf file.")
-                return
-            if not os.path.exists(lb_var.get()):
-                messagebox.showerror("Error", "LightBurn driver file not found.\n\nPlease select a valid .inf file.")
-                return
             if not hw_var.get().strip():
                 messagebox.showerror("Error", "Hardware ID cannot be empty.")
                 return
+            # The driver files are checked in the background; the wizard stays responsive
+            save_btn.config(text="Checking driver files...", state=tk.DISABLED)
+            self.runner.submit(
+                self._check_paths_async([ez_var.get(), lb_var.get()]),
+                on_done=finish_save
+            )
+
+        def finish_save(checks):
+            if not wizard.winfo_exists():
+                return
+            save_btn.config(text="Save Settings", state=tk.NORMAL)
+            for check in checks:
+                self.path_status[check.path] = check
+            for check, name in zip(checks, ("EZCAD2", "LightBurn")):
+                if check.status == "missing":
+                    messagebox.showerror("Error", f"{name} driver file not found.\n\nPlease select a valid .inf file.")
+                    return
+            unreachable = [check.path for check in checks if check.status == "timeout"]
+            if unreachable and not messagebox.askyesno(
+                "Driver Share Not Responding",
+                f"No answer within {self.path_checker.timeout:g}s from:\n\n"
+                + "\n".join(unreachable)
+                + "\n\nSave these paths anyway?"
+            ):
+                return
             
             # Save configuration
             self.config['ezcad_driver'] = ez_var.get()
@@ -204,8 +272,12 @@ class EZLightBurnDriverSwitch:
             self.config['hardware_id'] = hw_var.get().strip()
             self.config['force_install'] = force_var.get()
             self.config['uninstall_first'] = uninstall_var.get()
+            self.config['use_staged_drivers'] = staged_var.get()
+            self.config['switch_mode'] = "consolidated" if consolidated_var.get() else "steps"
             
             if self.save_config():
+                # Record what the configured packages are (hashes only if changed)
+                self.runner.submit(run_blocking(self._hash_driver_packages))
                 messagebox.showinfo("Success", "Configuration saved successfully!")
                 wizard.destroy()
                 self.create_main_ui()
@@ -215,7 +287,7 @@ class EZLightBurnDriverSwitch:
         btn_frame = tk.Frame(main_frame)
         btn_frame.pack(pady=15)
         
-        tk.Button(
+        save_btn = tk.Button(
             btn_frame,
             text="Save Settings",
             command=save_wizard,
@@ -225,7 +297,8 @@ class EZLightBurnDriverSwitch:
             height=2,
             width=20,
             cursor="hand2"
-        ).pack()
+        )
+        save_btn.pack()
         
         # Center the wizard
         wizard.update_idletasks()
@@ -233,6 +306,14 @@ class EZLightBurnDriverSwitch:
         y = (wizard.winfo_screenheight() // 2) - (wizard.winfo_height() // 2)
         wizard.geometry(f"+{x}+{y}")
 
+    def _hash_driver_packages(self):
+        """Refresh the content hash of both configured driver packages."""
+        for key in ('ezcad_driver', 'lightburn_driver'):
+            try:
+                self.inf_cache.digest(self.config[key])
+            except (KeyError, OSError):
+                pass
+
     def browse_file(self, var, driver_name):
         """Open file browser for .inf file selection."""
         f = filedialog.askopenfilename(
@@ -244,6 +325,14 @@ class EZLightBurnDriverSwitch:
 
     def create_main_ui(self):
         """Create the main application interface."""
+        # Backend follows the (possibly just saved) configuration
+        self.backend = create_backend(self.config)
+        # Every configured board profile is found by one enumeration
+        self.profiles = ProfileIndex.from_config(self.config)
+        self.current_profile = None
+        # A new backend is cold again
+        self.prewarm_task = None
+        
         # Clear existing widgets
         for w in self.root.winfo_children():
             w.destroy()
@@ -290,13 +379,13 @@ class EZLightBurnDriverSwitch:
         
         # Hardware ID info
         hw_id = self.config.get('hardware_id', DEFAULT_HARDWARE_ID)
-        hw_label = tk.Label(
+        self.hw_label = tk.Label(
             status_container,
             text=f"Hardware ID: {hw_id}",
             font=("Consolas", 8),
             fg="#95a5a6"
         )
-        hw_label.pack(pady=(5, 0))
+        self.hw_label.pack(pady=(5, 0))
 
         # Action Button
         button_frame = tk.Frame(self.root)
@@ -327,12 +416,39 @@ class EZLightBurnDriverSwitch:
             fg="#95a5a6"
         ).pack()
         
+        # Multi-device panel, shown when several boards share the hardware ID
+        self.multi_frame = tk.LabelFrame(self.root, text="Connected Lasers", padx=10, pady=5)
+        self.device_list = tk.Listbox(
+            self.multi_frame,
+            selectmode=tk.MULTIPLE,
+            height=4,
+            width=70,
+            font=("Consolas", 8)
+        )
+        self.device_list.pack(fill=tk.X)
+        multi_btn_frame = tk.Frame(self.multi_frame)
+        multi_btn_frame.pack(pady=(5, 0))
+        for target, color in (("EZCAD", "#3498db"), ("LightBurn", "#27ae60")):
+            tk.Button(
+                multi_btn_frame,
+                text=f"Switch Selected to {DRIVERS[target]['name']}",
+                command=lambda t=target: self.start_multi_swap(t),
+                bg=color,
+                fg="white",
+                font=("Segoe UI", 9, "bold"),
+                bd=0,
+                padx=10,
+                cursor="hand2"
+            ).pack(side=tk.LEFT, padx=5)
+        
         # Footer
         footer_frame = tk.Frame(self.root)
         footer_frame.pack(side=tk.BOTTOM, pady=15)
         
+        footer_buttons = tk.Frame(footer_frame)
+        footer_buttons.pack()
         settings_btn = tk.Button(
-            footer_frame,
+            footer_buttons,
             text="⚙ Settings",
             command=self.show_setup_wizard,
             relief=tk.FLAT,
@@ -340,7 +456,17 @@ class EZLightBurnDriverSwitch:
             font=("Segoe UI", 9),
             cursor="hand2"
         )
-        settings_btn.pack()
+        settings_btn.pack(side=tk.LEFT)
+        # Shown when the last switch of this laser left a driver to go back to
+        self.revert_btn = tk.Button(
+            footer_buttons,
+            text="↶ Revert",
+            command=self.start_revert,
+            relief=tk.FLAT,
+            fg="#555",
+            font=("Segoe UI", 9),
+            cursor="hand2"
+        )
         
         tk.Label(
             footer_frame,
@@ -349,59 +475,194 @@ class EZLightBurnDriverSwitch:
             fg="#888"
         ).pack(pady=(5, 0))
 
+        self.validate_driver_paths()
+
+    def _driver_paths(self):
+        """Every configured driver INF, over all board profiles."""
+        paths = []
+        for profile in self.profiles.profiles:
+            config = profile_config(self.config, profile)
+            for driver in DRIVERS.values():
+                path = config.get(driver['config_key'])
+                if path and path not in paths:
+                    paths.append(path)
+        return paths
+
+    def validate_driver_paths(self, use_cache=True):
+        """Check the driver paths in the background. Until a check returns,
+        the last known result is used (use_cache=False: "checking")."""
+        paths = self._driver_paths()
+        for path in paths:
+            if not use_cache:
+                self.path_status[path] = None
+            elif path not in self.path_status:
+                self.path_status[path] = self.path_checker.last_known(path)
+        self.runner.submit(self._check_paths_async(paths), on_done=self._paths_checked)
+
+    async def _check_paths_async(self, paths):
+        """PathCheck for each path, checked concurrently."""
+        return await asyncio.gather(*[run_blocking(self.path_checker.check, path)
+                                      for path in paths])
+
+    def _paths_checked(self, checks):
+        for check in checks:
+            self.path_status[check.path] = check
+        if self.last_detection is not None and not self.is_working:
+            self._update_ui_after_detect(*self.last_detection)
+
+    def _path_problem(self):
+        """(driver name, path, "checking"/"missing"/"timeout") when the INF the
+        next switch needs is not known to be usable, else None."""
+        if self.current_driver == "Timeout" or self.broker:
+            return None
+        target = target_for(self.current_driver)
+        path = self._engine_config(self.current_profile).get(DRIVERS[target]['config_key'])
+        check = self.path_status.get(path)
+        if check is None:
+            return DRIVERS[target]['name'], path, "checking"
+        if check.status == "ok":
+            return None
+        return DRIVERS[target]['name'], path, check.status
+
+    def _apply_path_gate(self):
+        """Hold the switch button while the driver it would install is unusable."""
+        problem = self._path_problem()
+        if problem is None:
+            return
+        name, path, status = problem
+        if status == "checking":
+            self.swap_btn.config(text=f"Checking {name} Driver File...", state=tk.DISABLED)
+            return
+        if status == "missing":
+            self.detail_lbl.config(text=f"{name} driver file not found:\n{path}")
+        else:
+            self.detail_lbl.config(text=f"{name} driver location not responding:\n{path}")
+        self.swap_btn.config(text="Recheck Driver File", bg="#f39c12", state=tk.NORMAL)
+
+    async def _prewarm_async(self, detection):
+        """Warm the PowerShell host and the staged packages for the first click,
+        alongside the first detection (`detection`)."""
+        backend = self.backend
+        with span("prewarm", backend=backend.name) as info:
+            try:
+                # Detection needs the host and module too; whichever of the two
+                # gets the session first pays for them once
+                await run_blocking(backend.warm_up)
+            except Exception:
+                pass
+            # The rest waits for the first detection so it never competes with it
+            # (the detected device itself needs no warming: the switch reuses it)
+            try:
+                await asyncio.wrap_future(detection)
+            except Exception:
+                pass
+            # Stat and hash only packages known to be reachable: a path that
+            # timed out or is missing would stall the worker thread or fail
+            paths = [path for path in self._driver_paths()
+                     if getattr(self.path_status.get(path), 'status', None) == "ok"]
+            staged = await run_blocking(self.staging.resolve, backend, paths)
+            info['staged'] = sum(1 for published in staged.values() if published)
+
     def detect_current_driver(self):
         """Detect the currently installed driver."""
         if self.is_working:
             return
         
-        self.status_lbl.config(text="Detecting Driver...", fg="#2c3e50")
-        self.detail_lbl.config(text="Querying Windows Device Manager...")
+        if self.showing_last_known:
+            # Keep the last known state on screen until the fresh result arrives
+            self.detail_lbl.config(text=self.detail_lbl.cget("text").replace(
+                "refreshing...", "checking Device Manager..."))
+        else:
+            self.status_lbl.config(text="Detecting Driver...", fg="#2c3e50")
+            self.detail_lbl.config(text="Querying Windows Device Manager...")
         
-        # Run detection in background thread
-        threading.Thread(target=self._detect_thread, daemon=True).start()
+        # Run detection on the background event loop
+        self.detect_task = self.runner.submit(
+            self._detect_async(),
+            on_done=lambda result: self._update_ui_after_detect(*result)
+        )
+        # The first detection after the window is built also starts warming
+        # the PnP tooling (with a broker there is nothing to warm here)
+        if self.prewarm_task is None and not self.broker:
+            self.prewarm_task = self.runner.submit(self._prewarm_async(self.detect_task))
 
-    def _detect_thread(self):
-        """Run driver detection in background thread."""
+    async def _detect_async(self):
+        """Detect the driver. Returns (status, service, devices) for _update_ui_after_detect."""
         hw_id = self.config.get('hardware_id', DEFAULT_HARDWARE_ID)
-        
-        # PowerShell command to find the device and its service
-        # Prioritizes active (connected) devices
-        ps_cmd = f"""
-        $devices = Get-PnpDevice | Where-Object {{$_.HardwareID -like "*{hw_id}*"}}
-        if ($devices) {{
-            # Prefer active device with Status 'OK'
-            $target = $devices | Where-Object {{$_.Status -eq 'OK'}} | Select-Object -First 1
-            if (-not $target) {{ $target = $devices | Select-Object -First 1 }}
-
-            $target.Status
-            $target | Select-Object -ExpandProperty Service
-        }} else {{
-            "Not Found"
-        }}
-        """
-        
+        # Learned from this PC's history (e.g. 20s until enough detections are recorded)
+        timeouts = StepTimeouts.from_history(self.config, self.history)
+        if not self.broker:
+            self.backend.apply_timeouts(timeouts)
+        start = time.perf_counter()
+        status, service, devices = await self._query_devices(hw_id, timeouts.step('detect'))
+        if not self.broker:
+            self.history.record_detection(time.perf_counter() - start, status,
+                                          len(devices or []), self.backend.name)
+        return status, service, devices
+
+    async def _query_devices(self, hw_id, timeout):
+        """One device query bounded by `timeout`. Returns (status, service, devices)."""
         try:
-            res = subprocess.run(
-                ["powershell", "-Command", ps_cmd],
-                capture_output=True,
-                text=True,
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                timeout=10
-            )
-            
-            output = res.stdout.strip().split('\n')
-            status = output[0] if output else "Unknown"
-            service = output[1] if len(output) > 1 else ""
-            
-            self.root.after(0, lambda: self._update_ui_after_detect(status.lower(), service.lower()))
+            # Looks up the USB instance ID directly and prioritizes active devices
+            with span("detect", backend=self.backend.name) as info:
+                if self.broker:
+                    lookup = run_blocking(self._broker_devices, timeout)
+                else:
+                    lookup = self.backend.call_async('find_devices', self.profiles.hardware_ids)
+                devices = await within('detect', lookup, timeout)
+                device = preferred_device(devices)
+                info['devices'] = len(devices)
+                if device is None:
+                    status, service = "not found", ""
+                else:
+                    status, service = device.status.lower(), device.service.lower()
+                    save_snapshot(device, hw_id)
+                info.update(status=status, service=service)
+            return status, service, devices
             
-        except subprocess.TimeoutExpired:
-            self.root.after(0, lambda: self._update_ui_after_detect("timeout", ""))
+        except (subprocess.TimeoutExpired, StepTimeout):
+            return "timeout", "", None
+        except Exception:
+            return "error", "", None
+
+    def _broker_devices(self, timeout=None):
+        """Detect through the broker; same result shape as backend.find_devices."""
+        # A reply that misses the detect timeout drops the connection (reopened
+        # on the next request) rather than leave this call waiting behind it
+        reply = self.broker.request("status", timeout=timeout)
+        if 'data' not in reply:
+            raise RuntimeError(reply.get('error', "Broker error"))
+        return [
+            DeviceInfo(item['instance_id'], item['status'], item['service'],
+                       item.get('inf_name'), item.get('driver_version'), item.get('problem_code'))
+            for item in reply['data'].get('devices', [])
+        ]
+
+    def _broker_switch(self, target, instance_id=None, op="switch"):
+        """Run one switch (or, with op "revert", a revert) in the broker.
+        Returns (success, message)."""
+        try:
+            reply = self.broker.request(op, timeout=request_timeout(self.config),
+                                        target=target, instance_id=instance_id)
         except Exception as e:
-            self.root.after(0, lambda: self._update_ui_after_detect("error", ""))
+            return False, f"Broker error: {str(e)}"
+        if 'data' not in reply:
+            return False, f"Broker error: {reply.get('error', 'no reply')}"
+        return reply['data'].get('ok', False), reply['text']
 
-    def _update_ui_after_detect(self, status, service):
+    def _update_ui_after_detect(self, status, service, devices=None):
         """Update UI based on driver detection results."""
+        self.last_detection = (status, service, devices)
+        mark("first_detection", status=status)
+        self.showing_last_known = False
+        self._show_devices(devices or [])
+        device = preferred_device(devices or [])
+        if device is not None:
+            self.current_profile, driver = self.profiles.classify(device)
+        else:
+            self.current_profile, driver = None, classify_service(service)
+        if self.current_profile is not None and len(self.profiles.profiles) > 1:
+            self.hw_label.config(text=f"Board: {self.current_profile.name} ({device.instance_id})")
         if status == "timeout":
             self.current_driver = "Timeout"
             self.status_lbl.config(text="Detection Timeout", fg="#f39c12")
@@ -422,23 +683,14 @@ class EZLightBurnDriverSwitch:
                 fg="white",
                 state=tk.NORMAL
             )
-        elif "winusb" in service or "usblmc" in service:
-            self.current_driver = "LightBurn"
-            self.status_lbl.config(text="LightBurn Driver Active", fg="#27ae60")
-            self.detail_lbl.config(text="(WinUSB Protocol - Ready for LightBurn)")
-            self.swap_btn.config(
-                text="Switch to EZCAD2",
-                bg="#3498db",
-                fg="white",
-                state=tk.NORMAL
-            )
-        elif "lmc" in service or "bjjcz" in service:
-            self.current_driver = "EZCAD"
-            self.status_lbl.config(text="EZCAD2 Driver Active", fg="#3498db")
-            self.detail_lbl.config(text="(LMC Protocol - Ready for EZCAD2)")
+        elif driver in DRIVER_STATUS:
+            self.current_driver = driver
+            status_text, color, detail, button_text, button_color = DRIVER_STATUS[driver]
+            self.status_lbl.config(text=status_text, fg=color)
+            self.detail_lbl.config(text=detail)
             self.swap_btn.config(
-                text="Switch to LightBurn",
-                bg="#27ae60",
+                text=button_text,
+                bg=button_color,
                 fg="white",
                 state=tk.NORMAL
             )
@@ -452,199 +704,195 @@ class EZLightBurnDriverSwitch:
                 fg="white",
                 state=tk.NORMAL
             )
+        self._show_revert(device)
+        self._apply_path_gate()
+
+    def _show_revert(self, device):
+        """Offer the Revert button when this laser has a recorded previous driver."""
+        # Re-read: switches done by the broker are recorded by its process
+        self.reverts = RevertPoints()
+        point = self.reverts.get(device.instance_id) if device is not None else None
+        if point is None or point.get('family') not in DRIVERS or \
+                (device.inf_name or "").lower() == point['inf_name'].lower():
+            self.revert_btn.pack_forget()
+            return
+        version = f" {point['driver_version']}" if point.get('driver_version') else ""
+        self.revert_btn.config(
+            text=f"↶ Revert to {DRIVERS[point['family']]['name']}{version}",
+            state=tk.NORMAL
+        )
+        self.revert_btn.pack(side=tk.LEFT, padx=(10, 0))
+
+    def _show_last_known(self):
+        """Render the persisted snapshot as a 'last known' status (button stays disabled)."""
+        snapshot = load_snapshot(self.config.get('hardware_id', DEFAULT_HARDWARE_ID))
+        if snapshot is None:
+            return
+        
+        driver = classify_service(snapshot['service'])
+        name = DRIVERS[driver]['name'] if driver in DRIVERS else "Unknown"
+        color = {"LightBurn": "#27ae60", "EZCAD": "#3498db"}.get(driver, "#95a5a6")
+        self.showing_last_known = True
+        self.status_lbl.config(text=f"{name} Driver (last known)", fg=color)
+        self.detail_lbl.config(text=f"As of {snapshot['timestamp']} - refreshing...")
+
+    def _show_devices(self, devices):
+        """List every matching board when there is more than one."""
+        self.devices = devices
+        if len(devices) < 2:
+            self.multi_frame.pack_forget()
+            self.root.geometry("560x480")
+            return
+        
+        self.device_list.delete(0, tk.END)
+        for device in devices:
+            profile, driver = self.profiles.classify(device)
+            if profile is not None and len(self.profiles.profiles) > 1:
+                driver = f"{profile.name}: {driver}"
+            version = f" {device.driver_version}" if device.driver_version else ""
+            self.device_list.insert(
+                tk.END,
+                f"{device.instance_id}  [{device.status}]  {device.service or '-'} ({driver}{version})"
+            )
+        self.root.geometry("560x620")
+        self.multi_frame.pack(pady=5, padx=20, fill=tk.X)
+
+    def start_multi_swap(self, target):
+        """Switch the selected boards to `target` concurrently."""
+        if self.is_working:
+            return
+        selected = [self.devices[i] for i in self.device_list.curselection()]
+        if not selected:
+            messagebox.showwarning("No Laser Selected", "Select one or more lasers to switch.")
+            return
+        
+        self.is_working = True
+        self._show_cancel_button("Cancel Switching")
+        self.swap_task = self.runner.submit(
+            self._multi_swap_async(selected, target),
+            on_done=lambda outcome: self._finish_swap(*outcome),
+            on_cancel=lambda: self._finish_swap(False, "Switch cancelled.")
+        )
+
+    async def _multi_swap_async(self, devices, target):
+        """Switch several boards. Returns (success, message) for _finish_swap."""
+        if self.broker:
+            # The broker handles one request at a time
+            lines = []
+            succeeded = True
+            for device in devices:
+                ok, text = await run_blocking(self._broker_switch, target, device.instance_id)
+                succeeded = succeeded and ok
+                icon = "✓" if ok else "✗"
+                summary = text.split('\n')[0]
+                lines.append(f"{icon} {device.instance_id}\n    {summary}")
+            return succeeded, "\n".join(lines)
+        # One batch per board profile, since each has its own INFs and services
+        groups = {}
+        for device in devices:
+            profile, _ = self.profiles.classify(device)
+            groups.setdefault(profile.name if profile else None, (profile, []))[1].append(device)
+        results = []
+        elapsed = 0.0
+        for profile, group in groups.values():
+            engine = SwitchEngine(self.backend, self._engine_config(profile), self.staging,
+                                  self.history, self.reverts)
+            batch = await engine.switch_many_async(
+                group,
+                target,
+                progress=lambda message: self.root.after(0, lambda: self.detail_lbl.config(text=message))
+            )
+            results.extend(batch.results)
+            elapsed += batch.elapsed
+        lines = []
+        for device, result in results:
+            icon = "✓" if result.success else "✗"
+            summary = result.message.split('\n')[0]
+            lines.append(f"{icon} {device.instance_id}\n    {summary} ({result.timings['total']:.1f}s)")
+        succeeded = all(result.success for _, result in results)
+        return succeeded, "\n".join(lines) + f"\n\nTotal time: {elapsed:.1f}s"
+
+    def _engine_config(self, profile):
+        """Configuration for switching a board of `profile` (None = default)."""
+        return profile_config(self.config, profile) if profile is not None else self.config
 
     def start_swap_thread(self):
         """Start the driver swap process."""
         if self.is_working:
             return
+        if self._path_problem() is not None:
+            # The button offered a recheck of the driver file instead
+            self.validate_driver_paths(use_cache=False)
+            self._apply_path_gate()
+            return
         
         self.is_working = True
-        self.swap_btn.config(
-            state=tk.DISABLED,
-            text="Switching Driver...",
-            bg="#95a5a6"
+        self._show_cancel_button("Cancel Switch")
+        
+        # Run the swap on the background event loop
+        self.swap_task = self.runner.submit(
+            self._swap_async(),
+            on_done=lambda outcome: self._finish_swap(*outcome),
+            on_cancel=lambda: self._finish_swap(False, "Switch cancelled.")
         )
+
+    def start_revert(self):
+        """Rebind the driver package the last switch replaced."""
+        if self.is_working:
+            return
         
-        # Run swap process in background thread
-        threading.Thread(target=self._swap_process, daemon=True).start()
+        self.is_working = True
+        self.revert_btn.config(state=tk.DISABLED)
+        self._show_cancel_button("Cancel Revert")
+        self.swap_task = self.runner.submit(
+            self._revert_async(),
+            on_done=lambda outcome: self._finish_swap(*outcome),
+            on_cancel=lambda: self._finish_swap(False, "Revert cancelled.")
+        )
 
-    def _swap_process(self):
-        """Execute the complete driver swap process."""
-        try:
-            hw_id = self.config.get('hardware_id', DEFAULT_HARDWARE_ID)
-            uninstall_first = self.config.get('uninstall_first', True)
-            
-            # Identify which driver we want to end up with
-            if self.current_driver == "LightBurn":
-                target_path = self.config['ezcad_driver']
-                target_name = "EZCAD2"
-                expected_service_markers = ["lmc", "bjjcz"]
-            else:
-                target_path = self.config['lightburn_driver']
-                target_name = "LightBurn"
-                expected_service_markers = ["winusb", "usblmc"]
-
-            # Find device instance ID (Robust method)
-            device_cmd = f"""
-            $devices = Get-PnpDevice | Where-Object {{$_.HardwareID -like "*{hw_id}*"}}
-            if ($devices) {{
-                $target = $devices | Where-Object {{$_.Status -eq 'OK'}} | Select-Object -First 1
-                if (-not $target) {{ $target = $devices | Select-Object -First 1 }}
-                $target.InstanceId
-            }} else {{
-                "Not Found"
-            }}
-            """
-            
-            try:
-                res = subprocess.run(
-                    ["powershell", "-Command", device_cmd],
-                    capture_output=True,
-                    text=True,
-                    creationflags=subprocess.CREATE_NO_WINDOW,
-                    timeout=10
-                )
-                device_instance = res.stdout.strip()
-                
-                if device_instance == "Not Found" or not device_instance:
-                    self.root.after(0, lambda: self._finish_swap(False, "Device not found. Ensure laser is connected."))
-                    return
-                    
-            except Exception as e:
-                self.root.after(0, lambda: self._finish_swap(False, f"Failed to find device: {str(e)}"))
-                return
-            
-            # Step 1: Uninstall old driver if enabled
-            if uninstall_first:
-                self.root.after(0, lambda: self.detail_lbl.config(text="Uninstalling old driver..."))
-                
-                uninstall_cmd = f"""
-                $device = Get-PnpDevice -InstanceId "{device_instance}"
-                if ($device) {{
-                    try {{
-                        $device | Uninstall-PnpDevice -Confirm:$false
-                        "Uninstall Success"
-                    }} catch {{
-                        "Uninstall Failed: $_"
-                    }}
-                }} else {{
-                    "Device Not Found"
-                }}
-                """
-                
-                try:
-                    res = subprocess.run(
-                        ["powershell", "-Command", uninstall_cmd],
-                        capture_output=True,
-                        text=True,
-                        creationflags=subprocess.CREATE_NO_WINDOW,
-                        timeout=15
-                    )
-                    
-                    if "Uninstall Success" not in res.stdout:
-                        # Don't fail if uninstall fails, just continue
-                        pass
-                    
-                    # Wait for Windows to process the uninstall
-                    time.sleep(2)
-                    
-                except Exception:
-                    # Continue even if uninstall fails
-                    pass
-            
-            # Step 2: Install new driver
-            self.root.after(0, lambda: self.detail_lbl.config(text=f"Installing {target_name} driver..."))
-            
-            # Build pnputil command
-            cmd = ["pnputil", "/add-driver", target_path, "/install"]
-            if self.config.get('force_install', True):
-                cmd.append("/force")
-            
-            try:
-                res = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    creationflags=subprocess.CREATE_NO_WINDOW,
-                    timeout=30
-                )
-                
-                # Check for success codes (0 = Success, 3010 = Reboot Required)
-                success = res.returncode == 0 or res.returncode == 3010
-                restart_required = res.returncode == 3010
-                log_msg = res.stdout if success else res.stderr
-                
-                if not success:
-                    self.root.after(0, lambda: self._finish_swap(False, f"Driver installation failed:\n{log_msg}"))
-                    return
-                
-                if restart_required:
-                    # If restart is required, we can't verify effectively without reboot
-                    self.root.after(0, lambda: self._finish_swap(True, f"{target_name} driver installed.\n\nIMPORTANT: Restart your computer to complete the update."))
-                    return
+    async def _revert_async(self):
+        """Revert to the previous driver. Returns (success, message) for _finish_swap."""
+        device = preferred_device(self.devices)
+        if self.broker:
+            return await run_blocking(self._broker_switch, None,
+                                      device.instance_id if device else None, "revert")
+        engine = SwitchEngine(self.backend, self._engine_config(self.current_profile), self.staging,
+                              self.history, self.reverts)
+        result = await engine.revert_async(
+            progress=lambda message: self.root.after(0, lambda: self.detail_lbl.config(text=message)),
+            cached=device
+        )
+        return result.success, result.message
 
-                # Step 3: Scan for hardware changes
-                self.root.after(0, lambda: self.detail_lbl.config(text="Scanning for hardware changes..."))
-                
-                try:
-                    subprocess.run(
-                        ["pnputil", "/scan-devices"],
-                        capture_output=True,
-                        creationflags=subprocess.CREATE_NO_WINDOW,
-                        timeout=10
-                    )
-                except:
-                    pass
-                
-                # Wait for Windows to detect the new driver
-                time.sleep(3)
-
-                # Step 4: Verification
-                self.root.after(0, lambda: self.detail_lbl.config(text="Verifying installation..."))
-
-                verify_cmd = f"""
-                $device = Get-PnpDevice -InstanceId "{device_instance}"
-                if ($device) {{
-                    $device | Select-Object -ExpandProperty Service
-                }} else {{
-                    "Not Found"
-                }}
-                """
-
-                verify_res = subprocess.run(
-                    ["powershell", "-Command", verify_cmd],
-                    capture_output=True,
-                    text=True,
-                    creationflags=subprocess.CREATE_NO_WINDOW,
-                    timeout=10
-                )
-
-                current_service = verify_res.stdout.strip().lower()
-
-                # Check if the current service matches one of the expected markers
-                is_verified = any(marker in current_service for marker in expected_service_markers)
-
-                if is_verified:
-                    self.root.after(0, lambda: self._finish_swap(True, f"{target_name} driver installed and verified!"))
-                else:
-                    self.root.after(0, lambda: self._finish_swap(False,
-                        f"Driver was installed but device is still using '{current_service}'.\n\n"
-                        "Try:\n"
-                        "1. Restarting your computer\n"
-                        "2. Unplugging and replugging the laser\n"
-                        "3. Checking 'Force Install' in Settings"
-                    ))
-                
-            except Exception as e:
-                self.root.after(0, lambda: self._finish_swap(False, f"Installation error: {str(e)}"))
-                return
-            
-        except Exception as e:
-            self.root.after(0, lambda: self._finish_swap(False, f"Unexpected error: {str(e)}"))
+    def _show_cancel_button(self, text):
+        """While switching, the main button cancels the running switch."""
+        self.swap_btn.config(text=text, command=self.cancel_swap, bg="#95a5a6", state=tk.NORMAL)
+
+    def cancel_swap(self):
+        """Cancel the running switch (the current step is abandoned)."""
+        if self.swap_task is not None:
+            self.swap_task.cancel()
+            self.swap_btn.config(text="Cancelling...", state=tk.DISABLED)
+
+    async def _swap_async(self):
+        """Execute the complete driver swap process. Returns (success, message)."""
+        if self.broker:
+            return await run_blocking(self._broker_switch, target_for(self.current_driver))
+        engine = SwitchEngine(self.backend, self._engine_config(self.current_profile), self.staging,
+                              self.history, self.reverts)
+        result = await engine.switch_async(
+            self.current_driver,
+            progress=lambda message: self.root.after(0, lambda: self.detail_lbl.config(text=message)),
+            # Reuse the device found by detection; only that instance is re-queried
+            cached=preferred_device(self.devices)
+        )
+        return result.success, result.message
 
     def _finish_swap(self, success, message):
         """Handle completion of driver swap process."""
         self.is_working = False
+        self.swap_task = None
+        self.swap_btn.config(command=self.start_swap_thread)
         
         if success:
             messagebox.showinfo(
@@ -664,7 +912,25 @@ class EZLightBurnDriverSwitch:
         self.detect_current_driver()
 
 
+def report_first_window():
+    """Record the bundle's startup footprint once the window is up."""
+    report = startup_report()
+    get_tracer().record("startup", "startup", time.time(), 0.0, report)
+    mark("first_window", **report)
+
+
 if __name__ == "__main__":
+    # Build check (build.py): what a GUI start imports, without a window
+    if sys.argv[1:] == ["--startup-report"]:
+        load_gui()
+        mark("startup_report", **startup_report())
+        sys.exit(0)
+
+    # Command-line mode: handled without importing tkinter
+    if len(sys.argv) > 1 and sys.argv[1].startswith("-"):
+        from ezswitch.cli import main
+        sys.exit(main(sys.argv[1:]))
+
     # Admin check and auto-elevation
     def is_admin():
         try:
@@ -672,9 +938,17 @@ if __name__ == "__main__":
         except:
             return False
 
-    if is_admin():
+    # With an elevated broker running the GUI needs no UAC prompt
+    broker = None if is_admin() else BrokerClient.connect()
+
+    if is_admin() or broker is not None:
+        # Every detection and switch is traced to a rotating local file
+        set_tracer(Tracer(TRACE_FILE))
+        load_gui()
         root = tk.Tk()
-        app = EZLightBurnDriverSwitch(root)
+        app = EZLightBurnDriverSwitch(root, broker=broker)
+        # Runs on the first idle pass, once the window has been drawn
+        root.after_idle(report_first_window)
         root.mainloop()
     else:
         # Relaunch with admin privileges
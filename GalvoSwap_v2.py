@@ -12,10 +12,10 @@ Improvements in v2.0:
 - Configurable Hardware ID for different laser boards
 - Better error messages and status indicators
 - Cleaner, more modern UI
+
+Command line (no GUI): --status | --switch ezcad|lightburn [--json]
 """
 
-import tkinter as tk
-from tkinter import messagebox, filedialog
 import subprocess
 import ctypes
 import sys
@@ -23,12 +23,27 @@ import os
 import json
 import threading
 
+from ezswitch.backend import create_backend
+
 # --- CONFIGURATION DEFAULTS ---
 CONFIG_FILE = "driver_paths.json"
 # Standard ID for BJJCZ boards (ComMarker B4, Cloudray, Monport, etc.)
 DEFAULT_HARDWARE_ID = "VID_9588&PID_9899" 
 LIGHTBURN_DEFAULT_PATH = r"C:\Program Files\LightBurn\EzCad2Driver\EzCad2Driver.inf"
 
+# tkinter is imported on demand so command-line runs never load it
+tk = None
+messagebox = None
+filedialog = None
+
+
+def load_gui():
+    """Import tkinter into the module globals used by the GUI."""
+    global tk, messagebox, filedialog
+    import tkinter
+    from tkinter import messagebox as tk_messagebox, filedialog as tk_filedialog
+    tk, messagebox, filedialog = tkinter, tk_messagebox, tk_filedialog
+
 
 class GalvoSwap:
     def __init__(self, root):
@@ -41,6 +56,7 @@ class GalvoSwap:
         self.config = {}
         self.current_driver = "Unknown"
         self.is_working = False
+        self.backend = None
         
         # Load config; if missing or invalid, show wizard
         if not self.load_config():
@@ -238,6 +254,8 @@ class GalvoSwap:
 
     def create_main_ui(self):
         """Create the main application interface."""
+        self.backend = create_backend(self.config)
+        
         # Clear existing widgets
         for w in self.root.winfo_children():
             w.destroy()
@@ -329,19 +347,10 @@ class GalvoSwap:
         """Run driver detection in background thread."""
         hw_id = self.config.get('hardware_id', DEFAULT_HARDWARE_ID)
         
-        # PowerShell command to identify the active service for the USB device
-        cmd = f"Get-PnpDevice | Where-Object {{$_.HardwareID -like '*{hw_id}*'}} | Select-Object -ExpandProperty Service"
-        
         try:
-            # CREATE_NO_WINDOW prevents black console flash
-            res = subprocess.run(
-                ["powershell", "-Command", cmd], 
-                capture_output=True, 
-                text=True, 
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                timeout=10
-            )
-            svc = res.stdout.strip().lower()
+            # Service of every matching device, via the shared PowerShell session
+            devices = self.backend.find_devices(hw_id)
+            svc = " ".join(device.service for device in devices).lower()
             self.root.after(0, lambda: self._update_ui_after_detect(svc))
         except subprocess.TimeoutExpired:
             self.root.after(0, lambda: self._update_ui_after_detect("timeout"))
@@ -430,19 +439,12 @@ class GalvoSwap:
             target_path = self.config['ezcad_driver']
             target_name = "EZCAD2"
         
-        # Build command
-        cmd = ["pnputil", "/add-driver", target_path, "/install"]
-        if self.config.get('force_install', True):
-            cmd.append("/force")
-        
         try:
-            # CREATE_NO_WINDOW prevents black console flash
-            res = subprocess.run(
-                cmd, 
-                capture_output=True, 
-                text=True, 
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                timeout=30
+            # pnputil /add-driver <inf> /install [/force]
+            res = self.backend.add_driver(
+                target_path,
+                install=True,
+                force=self.config.get('force_install', True)
             )
             
             # 0 = Success, 3010 = Success (Reboot required, but usually fine for USB)
@@ -482,6 +484,11 @@ class GalvoSwap:
 
 
 if __name__ == "__main__":
+    # Command-line mode shares the EZ LightBurn Driver Switch engine
+    if len(sys.argv) > 1 and sys.argv[1].startswith("-"):
+        from ezswitch.cli import main
+        sys.exit(main(sys.argv[1:]))
+
     # Robust Admin Check
     def is_admin():
         try:
@@ -490,6 +497,7 @@ if __name__ == "__main__":
             return False
 
     if is_admin():
+        load_gui()
         root = tk.Tk()
         app = GalvoSwap(root)
         root.mainloop()
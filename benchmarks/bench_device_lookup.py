@@ -0,0 +1,76 @@
+"""
+Device lookup benchmark
+Times the original full Get-PnpDevice enumeration against the targeted
+instance-ID lookup, both running in the same warm PowerShell session.
+Windows only. Usage: python benchmarks/bench_device_lookup.py [hardware_id] [runs]
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ezswitch.pnp_queries import legacy_device_source, select_device_script
+from ezswitch.ps_session import get_session
+
+DEFAULT_HARDWARE_ID = "VID_9588&PID_9899"
+
+
+def time_script(session, script, runs):
+    """Run a script repeatedly and return per-run durations in ms."""
+    samples = []
+    output = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = session.run(script, timeout=60).stdout.strip()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, output
+
+
+def summarize(samples):
+    return {
+        "min_ms": round(min(samples), 1),
+        "median_ms": round(statistics.median(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+def main():
+    if sys.platform != 'win32':
+        print("This benchmark must be run on Windows.")
+        return 1
+
+    hw_id = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_HARDWARE_ID
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    fields = ["InstanceId", "Status", "Service"]
+
+    session = get_session()
+    # Pay host startup and module load before timing anything
+    session.run("Import-Module PnpDevice", timeout=60)
+
+    results = {"hardware_id": hw_id, "runs": runs}
+    scripts = {
+        "full_enumeration": select_device_script(hw_id, fields, legacy_device_source(hw_id)),
+        "targeted_lookup": select_device_script(hw_id, fields),
+    }
+    for name, script in scripts.items():
+        samples, output = time_script(session, script, runs)
+        results[name] = summarize(samples)
+        results[name]["result"] = output.split('\n')
+
+    if results["full_enumeration"]["result"] != results["targeted_lookup"]["result"]:
+        results["warning"] = "Lookups returned different devices"
+
+    results["speedup"] = round(
+        results["full_enumeration"]["median_ms"] / max(results["targeted_lookup"]["median_ms"], 0.1),
+        2
+    )
+    print(json.dumps(results, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Startup benchmark
+Launches each build flavor of the GUI repeatedly and reports time to first
+window and time to first detection (p50/p95/max, seconds from launch).
+The app writes the milestones to the file named by EZSWITCH_STARTUP_LOG
+(see ezswitch.startup); each run is killed once detection has finished.
+
+Run from an Administrator prompt, or with the broker running, so the app
+does not stop at a UAC prompt. The working directory must hold a valid
+driver_paths.json.
+
+Flavors default to the script and whichever builds exist in dist/:
+  script  - python EZ_LightBurn_Driver_Switch.py
+  onefile - dist/EZ LightBurn Driver Switch.exe
+  onedir  - dist/EZ LightBurn Driver Switch/EZ LightBurn Driver Switch.exe
+
+Usage:
+  python benchmarks/bench_startup.py [--runs 5] [--workdir DIR] [--timeout 60]
+                                     [--flavor NAME=COMMAND ...] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ezswitch.startup import STARTUP_LOG_ENV, read_marks
+from ezswitch.stats import summarize
+
+APP_NAME = "EZ LightBurn Driver Switch"
+MILESTONES = ("first_window", "first_detection")
+
+
+def default_flavors():
+    """(name, argv) for the script and every build present in dist/."""
+    flavors = [("script", [sys.executable, os.path.join(ROOT, "EZ_LightBurn_Driver_Switch.py")])]
+    builds = [
+        ("onefile", os.path.join(ROOT, "dist", f"{APP_NAME}.exe")),
+        ("onedir", os.path.join(ROOT, "dist", APP_NAME, f"{APP_NAME}.exe")),
+    ]
+    flavors.extend((name, [path]) for name, path in builds if os.path.exists(path))
+    return flavors
+
+
+def parse_flavor(text):
+    """NAME=COMMAND, e.g. installed="C:\\Program Files\\EZ LightBurn Driver Switch\\...exe"."""
+    name, sep, command = text.partition('=')
+    if not sep or not command:
+        raise argparse.ArgumentTypeError(f"Expected NAME=COMMAND, got: {text}")
+    return name, shlex.split(command, posix=os.name != 'nt')
+
+
+def kill_tree(proc):
+    """Stop the app, including the child a onefile bootloader starts."""
+    if proc.poll() is not None:
+        return
+    if os.name == 'nt':
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        proc.kill()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        pass
+
+
+def launch_once(argv, workdir, timeout):
+    """Seconds from launch to each milestone (None if not reached in time)."""
+    fd, log_path = tempfile.mkstemp(prefix="ezswitch-startup-", suffix=".jsonl")
+    os.close(fd)
+    env = dict(os.environ, **{STARTUP_LOG_ENV: log_path})
+    try:
+        launched = time.time()
+        proc = subprocess.Popen(argv, cwd=workdir, env=env)
+        deadline = time.monotonic() + timeout
+        marks = {}
+        try:
+            while time.monotonic() < deadline:
+                marks = read_marks(log_path)
+                if "first_detection" in marks:
+                    break
+                time.sleep(0.05)
+        finally:
+            kill_tree(proc)
+        return dict((name, marks[name]['ts'] - launched if name in marks else None)
+                    for name in MILESTONES)
+    finally:
+        os.remove(log_path)
+
+
+def bench_flavor(argv, args):
+    samples = dict((name, []) for name in MILESTONES)
+    missed = 0
+    for _ in range(args.runs):
+        run = launch_once(argv, args.workdir, args.timeout)
+        if run["first_detection"] is None:
+            missed += 1
+        for name, seconds in run.items():
+            if seconds is not None:
+                samples[name].append(seconds)
+    result = dict((name, summarize(values)) for name, values in samples.items())
+    result["timeouts"] = missed
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GUI startup benchmark per build flavor")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workdir", default=os.getcwd(),
+                        help="Directory with driver_paths.json to start the app in")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="Seconds to wait for the first detection per run")
+    parser.add_argument("--flavor", type=parse_flavor, action="append",
+                        help="NAME=COMMAND to launch (repeatable); default: script and dist/ builds")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    results = {
+        "machine": platform.node(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "flavors": {},
+    }
+    for name, command in args.flavor or default_flavors():
+        results["flavors"][name] = bench_flavor(command, args)
+
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""
+End-to-end switch latency benchmark
+Drives each switching strategy against the simulated backend with
+configurable per-step latency and reports p50/p95/max per phase and total.
+
+Strategies:
+  GalvoSwap.py                  - pnputil /add-driver /install, then re-detect
+  GalvoSwap_v2.py               - pnputil /add-driver /install /force
+  EZ_LightBurn_Driver_Switch.py - lookup, uninstall, add-driver, scan, verify
+  consolidated                  - the same sequence in one run_switch() call
+
+Usage:
+  python benchmarks/bench_switch.py [--runs 5] [--latency add_driver=1.2,uninstall=0.4]
+                                    [--output results.json]
+                                    [--baseline previous.json --tolerance 0.2]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ezswitch.backend import SimulatedBackend
+from ezswitch.engine import DEFAULT_HARDWARE_ID, DRIVERS, SwitchEngine, target_for
+from ezswitch.stats import summarize
+
+# Per-operation latency (seconds) roughly matching a healthy Windows 10 PC
+DEFAULT_LATENCY = {
+    "find_devices": 0.05,
+    "get_service": 0.03,
+    "uninstall": 0.4,
+    "add_driver": 1.2,
+    "rescan": 0.3,
+    "run_switch": 0.25,
+}
+DEFAULT_BIND_DELAY = 0.3
+DEFAULT_REENUMERATE_DELAY = 0.6
+
+CONFIG = {
+    "hardware_id": DEFAULT_HARDWARE_ID,
+    "ezcad_driver": r"C:\EZCAD2\Driver\lmc1usb.inf",
+    "lightburn_driver": r"C:\Program Files\LightBurn\EzCad2Driver\EzCad2Driver.inf",
+    "force_install": True,
+    "uninstall_first": True,
+}
+PACKAGES = {CONFIG["ezcad_driver"]: "lmcv2", CONFIG["lightburn_driver"]: "winusb"}
+START_SERVICE = {"EZCAD": "lmcv2", "LightBurn": "winusb"}
+
+
+def _timed(timings, name, func, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        timings[name] = time.perf_counter() - start
+
+
+def run_galvoswap_v1(backend, current_driver):
+    """GalvoSwap.py: add-driver without /force, then synchronous re-detect."""
+    timings = {}
+    target = target_for(current_driver)
+    res = _timed(timings, "add_driver", backend.add_driver,
+                 CONFIG[DRIVERS[target]["config_key"]], install=True, force=False)
+    _timed(timings, "detect", backend.find_devices, CONFIG["hardware_id"])
+    return res.returncode == 0, target, timings
+
+
+def run_galvoswap_v2(backend, current_driver):
+    """GalvoSwap_v2.py: add-driver with /force, 3010 counts as success."""
+    timings = {}
+    target = target_for(current_driver)
+    res = _timed(timings, "add_driver", backend.add_driver,
+                 CONFIG[DRIVERS[target]["config_key"]], install=True, force=True)
+    return res.returncode in (0, 3010), target, timings
+
+
+def run_ez_switch(backend, current_driver):
+    """EZ_LightBurn_Driver_Switch.py: the full SwitchEngine sequence."""
+    result = SwitchEngine(backend, CONFIG).switch(current_driver)
+    timings = dict(result.timings)
+    timings.pop("total", None)
+    return result.success, result.target, timings
+
+
+def run_consolidated(backend, current_driver):
+    """switch_mode "consolidated": one script runs the whole sequence."""
+    config = dict(CONFIG, switch_mode="consolidated")
+    result = SwitchEngine(backend, config).switch(current_driver)
+    timings = dict(result.timings)
+    timings.pop("total", None)
+    return result.success, result.target, timings
+
+
+STRATEGIES = [
+    ("GalvoSwap.py", run_galvoswap_v1),
+    ("GalvoSwap_v2.py", run_galvoswap_v2),
+    ("EZ_LightBurn_Driver_Switch.py", run_ez_switch),
+    ("consolidated", run_consolidated),
+]
+
+
+def make_backend(args, start_driver):
+    return SimulatedBackend.with_laser(
+        CONFIG["hardware_id"],
+        service=START_SERVICE[start_driver],
+        packages=PACKAGES,
+        latency=args.latency,
+        bind_delay=args.bind_delay,
+        reenumerate_delay=args.reenumerate_delay,
+        seed=args.seed
+    )
+
+
+def bench_strategy(func, args):
+    phases = {}
+    totals = []
+    successes = 0
+    verified = 0
+    for run in range(args.runs):
+        # Alternate direction so both drivers are exercised
+        current = "EZCAD" if run % 2 == 0 else "LightBurn"
+        backend = make_backend(args, current)
+        start = time.perf_counter()
+        success, target, timings = func(backend, current)
+        totals.append(time.perf_counter() - start)
+
+        successes += 1 if success else 0
+        # Is the device actually on the new driver the moment the strategy returns?
+        device = backend.find_device(CONFIG["hardware_id"])
+        service = device.service.lower() if device else ""
+        if any(marker in service for marker in DRIVERS[target]["markers"]):
+            verified += 1
+        for name, seconds in timings.items():
+            phases.setdefault(name, []).append(seconds)
+
+    return {
+        "phases": dict((name, summarize(values)) for name, values in phases.items()),
+        "total": summarize(totals),
+        "success_rate": round(successes / float(args.runs), 3),
+        "verified_rate": round(verified / float(args.runs), 3),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return regressions where total p50 grew by more than `tolerance`."""
+    regressions = []
+    for name, current in results["strategies"].items():
+        previous = baseline.get("strategies", {}).get(name)
+        if not previous or not previous["total"]["p50"]:
+            continue
+        ratio = current["total"]["p50"] / previous["total"]["p50"]
+        if ratio > 1.0 + tolerance:
+            regressions.append({
+                "strategy": name,
+                "baseline_p50": previous["total"]["p50"],
+                "current_p50": current["total"]["p50"],
+                "ratio": round(ratio, 2),
+            })
+    return regressions
+
+
+def parse_latency(text):
+    latency = dict(DEFAULT_LATENCY)
+    if text:
+        for item in text.split(','):
+            name, _, value = item.partition('=')
+            if name.strip() not in SimulatedBackend.OPERATIONS:
+                raise argparse.ArgumentTypeError(f"Unknown operation: {name}")
+            latency[name.strip()] = float(value)
+    return latency
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Driver switch latency benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=parse_latency, default=dict(DEFAULT_LATENCY),
+                        help="Per-operation latency overrides, e.g. add_driver=2.0,rescan=0.5")
+    parser.add_argument("--bind-delay", type=float, default=DEFAULT_BIND_DELAY)
+    parser.add_argument("--reenumerate-delay", type=float, default=DEFAULT_REENUMERATE_DELAY)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed p50 slowdown vs baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results = {
+        "generated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "latency": args.latency,
+        "bind_delay": args.bind_delay,
+        "reenumerate_delay": args.reenumerate_delay,
+        "strategies": {},
+    }
+    for name, func in STRATEGIES:
+        results["strategies"][name] = bench_strategy(func, args)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance)
+        if results["regressions"]:
+            exit_code = 1
+
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
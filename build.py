@@ -2,14 +2,138 @@
 """
 Build script for EZ LightBurn Driver Switch
 Automated build process with error checking and validation
+
+Build flavors (python build.py [--flavor onefile|onedir|installer]):
+  onefile   - one self-extracting exe (default); unpacks the runtime to a
+              temp folder on every launch, including the elevation relaunch
+  onedir    - exe plus its runtime in a folder; nothing to unpack at launch
+  installer - the onedir build wrapped in an Inno Setup installer (needs
+              iscc.exe from Inno Setup 6 on PATH)
+
+benchmarks/bench_startup.py compares time-to-first-window and
+time-to-first-detection of the flavors.
+
+Builds are incremental: each executable's inputs (sources, bundled data,
+PyInstaller options and versions) are hashed, and a target whose hash already
+has an artifact in build_cache/ is not rebuilt. Both executables build in
+parallel. --clean discards all caches (including PyInstaller's per-user
+cache, cleared once before the builds start) and rebuilds everything.
+
+Bundles are trimmed: PyInstaller runs from a generated spec that excludes
+stdlib packages the apps never import and drops Tcl/Tk data they never use.
+Each build is checked against its budget (exe size, modules imported at
+startup); going over fails the build. --max-size-mb / --max-modules
+override the budgets.
 """
 
+import argparse
+import hashlib
+import json
 import os
 import sys
 import subprocess
 import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+APP_NAME = "EZ LightBurn Driver Switch"
+APP_VERSION = "2.2"
+FLAVORS = ("onefile", "onedir", "installer")
+CACHE_DIR = Path("build_cache")
+
+# Executables built by this script: entry script, EXE options, bundled data
+# files (data that does not exist is skipped) and budget. Sizes are per flavor:
+# onefile_mb is the compressed exe, onedir_mb the unpacked program folder
+# (also what the installer ships); modules is len(sys.modules) once the GUI
+# has loaded, measured with --startup-report (targets with startup_report)
+BUILD_TARGETS = {
+    APP_NAME: {
+        "script": "EZ_LightBurn_Driver_Switch.py",
+        "exe": {"console": False, "uac_admin": True},
+        "data": ["README.md", "LICENSE"],
+        "startup_report": True,
+        "budget": {"onefile_mb": 12.0, "onedir_mb": 30.0, "modules": 300},
+    },
+    "GalvoSwap": {
+        "script": "GalvoSwap_v2.py",
+        "exe": {"console": False, "icon": "NONE"},
+        "data": ["driver_paths.json"],
+        "startup_report": False,
+        "budget": {"onefile_mb": 12.0, "onedir_mb": 30.0},
+    },
+}
+# Sources every target imports
+SHARED_SOURCES = ["ezswitch"]
+
+# Stdlib packages neither app imports (asyncio works without ssl)
+EXCLUDED_MODULES = [
+    "unittest", "doctest", "pdb", "pydoc", "pydoc_data", "lib2to3", "distutils",
+    "setuptools", "pkg_resources", "ensurepip", "venv", "idlelib", "turtle", "turtledemo",
+    "test", "tkinter.test", "tkinter.tix", "sqlite3", "curses", "xml", "xmlrpc",
+    "http", "email", "ftplib", "smtplib", "ssl",
+]
+# Tcl/Tk data the GUI never uses: time zones, translations, demos, images
+EXCLUDED_TCL_DATA = [
+    "tcl/tzdata", "tcl/msgs", "tk/msgs", "tk/demos", "tk/images",
+    "_tcl_data/tzdata", "_tcl_data/msgs", "_tk_data/msgs", "_tk_data/demos", "_tk_data/images",
+]
+
+SPEC_HEADER = """# Generated by build.py from BUILD_TARGETS - edit it there
+a = Analysis(
+    [{script!r}],
+    pathex=[{root!r}],
+    datas={datas!r},
+    excludes={excludes!r},
+)
+a.datas = [entry for entry in a.datas
+           if not entry[0].replace('\\\\', '/').startswith({tcl_data!r})]
+pyz = PYZ(a.pure)
+"""
+SPEC_ONEFILE = """exe = EXE(pyz, a.scripts, a.binaries, a.datas, [], name={name!r}, upx=False, {exe})
+"""
+SPEC_ONEDIR = """exe = EXE(pyz, a.scripts, [], exclude_binaries=True, name={name!r}, upx=False, {exe})
+coll = COLLECT(exe, a.binaries, a.datas, upx=False, name={name!r})
+"""
+
+# Inno Setup script for the installer flavor; installs the onedir folder
+INSTALLER_SCRIPT = r"""
+[Setup]
+AppName={name}
+AppVersion={version}
+DefaultDirName={{autopf}}\{name}
+DefaultGroupName={name}
+OutputDir={output}
+OutputBaseFilename=EZ-LightBurn-Driver-Switch-Setup-v{version}
+PrivilegesRequired=admin
+Compression=lzma2
+SolidCompression=yes
+
+[Files]
+Source: "{source}\*"; DestDir: "{{app}}"; Flags: recursesubdirs ignoreversion
+
+[Icons]
+Name: "{{group}}\{name}"; Filename: "{{app}}\{name}.exe"
+Name: "{{autodesktop}}\{name}"; Filename: "{{app}}\{name}.exe"
+"""
+
+
+def executable_path(flavor, name=APP_NAME, dist=Path("dist")):
+    """Where the exe of a target ends up for a flavor."""
+    if flavor == "onefile":
+        return dist / f"{name}.exe"
+    return dist / name / f"{name}.exe"
+
+
+def pyinstaller_version():
+    """Installed PyInstaller version, or None."""
+    try:
+        result = subprocess.run([sys.executable, "-m", "PyInstaller", "--version"],
+                                capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
 
 def run_command(cmd, description):
     """Run a command and handle errors."""
@@ -50,17 +174,11 @@ def check_dependencies():
     print(f"✅ Python {sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}")
     
     # Check PyInstaller
-    try:
-        result = subprocess.run([sys.executable, "-m", "pyinstaller", "--version"], 
-                              capture_output=True, text=True)
-        if result.returncode == 0:
-            print(f"✅ PyInstaller {result.stdout.strip()}")
-        else:
-            print("❌ PyInstaller not found")
-            return False
-    except:
+    version = pyinstaller_version()
+    if version is None:
         print("❌ PyInstaller not found")
         return False
+    print(f"✅ PyInstaller {version}")
     
     return True
 
@@ -71,6 +189,7 @@ def validate_source_files():
     
     required_files = [
         "EZ_LightBurn_Driver_Switch.py",
+        "GalvoSwap_v2.py",
         "README.md",
         "LICENSE"
     ]
@@ -89,8 +208,13 @@ def clean_build():
     """Clean previous build artifacts."""
     print("\n🧹 Cleaning previous build artifacts...")
     
-    dirs_to_clean = ["build", "dist", "__pycache__"]
+    dirs_to_clean = ["build", "dist", str(CACHE_DIR), "__pycache__"]
     files_to_clean = ["*.spec"]
+    # Cleared here, once: PyInstaller --clean in each of the parallel builds
+    # would purge the cache while the other build is using it
+    cache = pyinstaller_cache_dir()
+    if cache is not None:
+        dirs_to_clean.append(str(cache))
     
     for dir_name in dirs_to_clean:
         if Path(dir_name).exists():
@@ -103,42 +227,206 @@ def clean_build():
     return True
 
 
-def build_executable():
-    """Build the executable using PyInstaller."""
-    print("\n🔨 Building executable...")
-    
-    # PyInstaller command
-    cmd = (
-        'pyinstaller '
-        '--onefile '
-        '--noconsole '
-        '--name="EZ LightBurn Driver Switch" '
-        '--uac-admin '
-        '--clean '
-        '--add-data="README.md;." '
-        '--add-data="LICENSE;." '
-        'EZ_LightBurn_Driver_Switch.py'
+def pyinstaller_cache_dir():
+    """PyInstaller's per-user cache (what its --clean purges), or None."""
+    configured = os.environ.get("PYINSTALLER_CONFIG_DIR")
+    if configured:
+        return Path(configured)
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("APPDATA")
+    return Path(base) / "pyinstaller" if base else None
+
+
+def target_inputs(name):
+    """Files whose content goes into a target's build."""
+    target = BUILD_TARGETS[name]
+    files = [Path(target["script"])]
+    for package in SHARED_SOURCES:
+        files.extend(sorted(Path(package).rglob("*.py")))
+    files.extend(Path(data) for data in target["data"] if Path(data).exists())
+    return files
+
+
+def render_spec(name, flavor):
+    """PyInstaller spec for a target: trimmed analysis plus the flavor's EXE."""
+    target = BUILD_TARGETS[name]
+    # Paths are absolute because the spec file lives in the work folder
+    header = SPEC_HEADER.format(
+        script=str(Path(target["script"]).resolve()),
+        root=str(Path.cwd()),
+        datas=[(str(Path(data).resolve()), ".") for data in target["data"]
+               if Path(data).exists()],
+        excludes=EXCLUDED_MODULES,
+        tcl_data=tuple(EXCLUDED_TCL_DATA),
     )
-    
-    success = run_command(cmd, "Building executable with PyInstaller")
-    
-    if not success:
-        return False
-    
-    # Check if executable was created
-    exe_path = Path("dist/EZ LightBurn Driver Switch.exe")
-    if exe_path.exists():
-        size_mb = exe_path.stat().st_size / 1024 / 1024
-        print(f"✅ Executable created: {exe_path}")
-        print(f"📦 File size: {size_mb:.1f} MB")
-        return True
+    exe = ", ".join(f"{key}={value!r}" for key, value in sorted(target["exe"].items()))
+    body = SPEC_ONEFILE if flavor == "onefile" else SPEC_ONEDIR
+    return header + body.format(name=name, exe=exe)
+
+
+def build_key(name, flavor, pyinstaller):
+    """Content hash of everything that determines a target's artifact."""
+    digest = hashlib.sha256(json.dumps({
+        "spec": render_spec(name, flavor),
+        "python": sys.version,
+        "pyinstaller": pyinstaller,
+    }, sort_keys=True).encode("utf-8"))
+    for path in target_inputs(name):
+        digest.update(path.as_posix().encode("utf-8") + b"\0")
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def pyinstaller_command(name, flavor, cache_dir):
+    """Write the target's spec and return the PyInstaller command building it
+    into its cache folder. Each target has its own work folder so targets can
+    build in parallel; there is no --clean, since the per-user cache is shared
+    (clean_build() clears it before the builds)."""
+    work = Path("build") / name
+    work.mkdir(parents=True, exist_ok=True)
+    spec = work / f"{name}.spec"
+    spec.write_text(render_spec(name, flavor))
+    parts = [
+        "pyinstaller",
+        f'--distpath="{cache_dir}"',
+        f'--workpath="{work}"',
+        "--noconfirm",
+        f'"{spec}"',
+    ]
+    return " ".join(parts)
+
+
+def measure_startup(artifact):
+    """Modules imported by a GUI start of the built exe (--startup-report),
+    or None if it cannot be launched from here."""
+    from ezswitch.startup import STARTUP_LOG_ENV, read_marks
+    fd, log_path = tempfile.mkstemp(prefix="ezswitch-build-", suffix=".jsonl")
+    os.close(fd)
+    try:
+        # RunAsInvoker starts the uac_admin exe without elevation, so the
+        # count works from a normal prompt (the report needs no admin rights)
+        env = dict(os.environ, **{STARTUP_LOG_ENV: log_path, "__COMPAT_LAYER": "RunAsInvoker"})
+        subprocess.run([str(artifact), "--startup-report"], env=env, timeout=120)
+        report = read_marks(log_path).get("startup_report")
+        return report["modules"] if report else None
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    finally:
+        os.remove(log_path)
+
+
+def check_budget(name, flavor, artifact, overrides):
+    """Print size and startup imports against the target's budget.
+    Returns False if the build is over budget."""
+    target = BUILD_TARGETS[name]
+    budget = dict(target["budget"], **dict((k, v) for k, v in overrides.items() if v))
+    if flavor == "onefile":
+        size = artifact.stat().st_size
+        size_budget = budget.get("size_mb") or budget["onefile_mb"]
     else:
-        print("❌ Executable not found in dist/")
+        size = sum(f.stat().st_size for f in artifact.parent.rglob("*") if f.is_file())
+        size_budget = budget.get("size_mb") or budget["onedir_mb"]
+    size_mb = size / 1024 / 1024
+    within = size_mb <= size_budget
+    kind = "exe" if flavor == "onefile" else "program folder"
+    print(f"{'✅' if within else '❌'} {name}: {kind} {size_mb:.1f} MB "
+          f"(budget {size_budget:.1f} MB)")
+
+    if target["startup_report"] and budget.get("modules"):
+        modules = measure_startup(artifact)
+        if modules is None:
+            # An unchecked budget is not a passed one
+            print(f"❌ {name}: could not launch the exe to count startup imports")
+            within = False
+        else:
+            ok = modules <= budget["modules"]
+            within = within and ok
+            print(f"{'✅' if ok else '❌'} {name}: {modules} modules imported at startup "
+                  f"(budget {budget['modules']})")
+    return within
+
+
+def build_target(name, flavor, pyinstaller):
+    """Build one target unless its inputs are unchanged.
+    Returns (artifact path or None, True if it came from the cache)."""
+    key = build_key(name, flavor, pyinstaller)
+    cache_dir = CACHE_DIR / name / key
+    artifact = executable_path(flavor, name, cache_dir)
+    if artifact.exists() and (cache_dir / "manifest.json").exists():
+        return artifact, True
+
+    cmd = pyinstaller_command(name, flavor, cache_dir)
+    if not run_command(cmd, f"Building {name} with PyInstaller") or not artifact.exists():
+        return None, False
+    manifest = {
+        "target": name,
+        "key": key,
+        "flavor": "onefile" if flavor == "onefile" else "onedir",
+        "inputs": [path.as_posix() for path in target_inputs(name)],
+        "pyinstaller": pyinstaller,
+    }
+    (cache_dir / "manifest.json").write_text(json.dumps(manifest, indent=4))
+    return artifact, False
+
+
+def publish(name, flavor, artifact):
+    """Copy a cached artifact to dist/, where users and the installer expect it."""
+    dest = executable_path(flavor, name)
+    if flavor == "onefile":
+        dest.parent.mkdir(exist_ok=True)
+        shutil.copy2(artifact, dest)
+    else:
+        if dest.parent.exists():
+            shutil.rmtree(dest.parent)
+        shutil.copytree(artifact.parent, dest.parent)
+    return dest
+
+
+def build_executables(flavor="onefile", budget=None):
+    """Build every target in parallel. Returns {name: cached artifact} or None
+    (a build failed or went over budget)."""
+    print(f"\n🔨 Building executables ({flavor})...")
+    pyinstaller = pyinstaller_version()
+    names = list(BUILD_TARGETS)
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        results = list(pool.map(lambda name: build_target(name, flavor, pyinstaller), names))
+
+    artifacts = {}
+    for name, (artifact, reused) in zip(names, results):
+        if artifact is None:
+            print(f"❌ {name}: executable not built")
+            return None
+        dest = publish(name, flavor, artifact)
+        state = "♻️  Unchanged, reused" if reused else "✅ Built"
+        print(f"{state}: {dest}")
+        if not check_budget(name, flavor, artifact, budget or {}):
+            print(f"❌ {name} is over its budget")
+            return None
+        artifacts[name] = artifact
+
+    if flavor == "installer" and not build_installer():
+        return None
+    return artifacts
+
+
+def build_installer():
+    """Wrap the onedir build in an Inno Setup installer."""
+    print("\n📀 Building installer...")
+    iscc = shutil.which("iscc")
+    if iscc is None:
+        print("❌ iscc.exe not found - install Inno Setup 6 and add it to PATH")
         return False
+    script = Path("build") / "installer.iss"
+    script.parent.mkdir(exist_ok=True)
+    script.write_text(INSTALLER_SCRIPT.format(
+        name=APP_NAME, version=APP_VERSION,
+        source=(Path("dist") / APP_NAME).resolve(), output=Path("dist").resolve()
+    ))
+    return run_command(f'"{iscc}" "{script}"', "Building installer with Inno Setup")
 
 
-def create_release_package():
-    """Create a release package with documentation."""
+def create_release_package(flavor="onefile", artifact=None):
+    """Create a release package with documentation.
+    `artifact` is the app's exe in build_cache/ (default: the one in dist/)."""
     print("\n📦 Creating release package...")
     
     # Create release directory
@@ -147,10 +435,14 @@ def create_release_package():
         shutil.rmtree(release_dir)
     release_dir.mkdir()
     
-    # Copy executable
-    exe_source = Path("dist/EZ LightBurn Driver Switch.exe")
-    exe_dest = release_dir / "EZ LightBurn Driver Switch.exe"
-    shutil.copy2(exe_source, exe_dest)
+    # Copy executable (onedir/installer: the whole program folder)
+    exe_source = artifact or executable_path(flavor)
+    if flavor == "onefile":
+        shutil.copy2(exe_source, release_dir / exe_source.name)
+    else:
+        shutil.copytree(exe_source.parent, release_dir / APP_NAME)
+        for setup in Path("dist").glob("EZ-LightBurn-Driver-Switch-Setup-*.exe"):
+            shutil.copy2(setup, release_dir / setup.name)
     print(f"✅ Copied executable to release/")
     
     # Copy documentation
@@ -187,7 +479,8 @@ Made with ❤️ by William Sorensen (Christ Driven Geek)
     
     # Create zip archive
     import zipfile
-    zip_name = "ez-lightburn-driver-switch-v2.1.zip"
+    suffix = "" if flavor == "onefile" else f"-{flavor}"
+    zip_name = f"ez-lightburn-driver-switch-v2.1{suffix}.zip"
     with zipfile.ZipFile(zip_name, 'w', zipfile.ZIP_DEFLATED) as zipf:
         for file_path in release_dir.rglob("*"):
             if file_path.is_file():
@@ -195,11 +488,23 @@ Made with ❤️ by William Sorensen (Christ Driven Geek)
     
     print(f"✅ Created release package: {zip_name}")
     
-    return True
+    return zip_name
 
 
-def main():
+def main(argv=None):
     """Main build process."""
+    parser = argparse.ArgumentParser(description="Build EZ LightBurn Driver Switch")
+    parser.add_argument("--flavor", choices=FLAVORS, default="onefile",
+                        help="onefile (default), onedir, or installer (onedir + Inno Setup)")
+    parser.add_argument("--clean", action="store_true",
+                        help="Discard build caches and rebuild every executable")
+    parser.add_argument("--max-size-mb", type=float,
+                        help="Size budget per executable for this flavor "
+                             "(onedir/installer: program folder)")
+    parser.add_argument("--max-modules", type=int,
+                        help="Budget for modules imported at startup")
+    args = parser.parse_args(argv)
+
     print("🚀 EZ LightBurn Driver Switch - Build Script")
     print("=" * 60)
     
@@ -219,25 +524,29 @@ def main():
         print("\n❌ Source file validation failed")
         return 1
     
-    # Step 3: Clean previous builds
-    if not clean_build():
+    # Step 3: Clean previous builds (only on request; builds are incremental)
+    if args.clean and not clean_build():
         print("\n❌ Clean failed")
         return 1
     
-    # Step 4: Build executable
-    if not build_executable():
+    # Step 4: Build executables
+    artifacts = build_executables(args.flavor, {
+        "size_mb": args.max_size_mb, "modules": args.max_modules
+    })
+    if not artifacts:
         print("\n❌ Build failed")
         return 1
     
     # Step 5: Create release package
-    if not create_release_package():
+    zip_name = create_release_package(args.flavor, artifacts[APP_NAME])
+    if not zip_name:
         print("\n❌ Release package creation failed")
         return 1
     
     print("\n🎉 Build completed successfully!")
     print("=" * 60)
-    print("📦 Release package created: ez-lightburn-driver-switch-v2.1.zip")
-    print("📂 Executable location: dist/EZ LightBurn Driver Switch.exe")
+    print(f"📦 Release package created: {zip_name}")
+    print(f"📂 Executable location: {executable_path(args.flavor)}")
     print("📖 Documentation: release/ folder")
     print("\n✅ Ready for distribution!")
     
@@ -0,0 +1,6 @@
+"""
+ezswitch - Shared driver switching engine for EZ LightBurn Driver Switch
+Holds the Windows PnP plumbing used by both the GUI and helper scripts.
+"""
+
+from ezswitch.ps_session import PowerShellSession, get_session, run_powershell
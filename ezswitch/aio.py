@@ -0,0 +1,171 @@
+"""
+asyncio helpers
+Event loop plumbing shared by the switching engine, the GUI and the CLI:
+a blocking entry point for scripts, a background loop the Tk app submits
+coroutines to, and per-step timeouts.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import sys
+import threading
+
+
+class StepTimeout(Exception):
+    """A switch step did not finish within its time limit."""
+
+    def __init__(self, step, seconds):
+        super().__init__(f"{step} did not finish within {seconds:g}s")
+        self.step = step
+        self.seconds = seconds
+
+
+def new_event_loop():
+    """Event loop that supports subprocesses (the Proactor loop on Windows)."""
+    if sys.platform == 'win32':
+        return asyncio.ProactorEventLoop()
+    return asyncio.new_event_loop()
+
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion on a fresh loop and return its result.
+    Ctrl+C cancels the coroutine and still returns what it returns on cancel.
+    """
+    loop = new_event_loop()
+    task = loop.create_task(coro)
+    try:
+        try:
+            return loop.run_until_complete(task)
+        except KeyboardInterrupt:
+            task.cancel()
+            return loop.run_until_complete(task)
+    finally:
+        loop.close()
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call in the loop's worker threads."""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+async def run_daemon(func, *args, **kwargs):
+    """
+    run_blocking() on a daemon thread of its own. For calls that may never
+    return (a network peer that accepts but stays silent): an abandoned call
+    cannot keep the process alive at exit, as an executor thread would.
+    """
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def resolve(setter, value):
+        if not future.done():
+            setter(value)
+
+    def deliver(setter, value):
+        try:
+            loop.call_soon_threadsafe(resolve, setter, value)
+        except RuntimeError:
+            # The loop is closed: nobody is waiting any more
+            pass
+
+    def target():
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            deliver(future.set_exception, e)
+        else:
+            deliver(future.set_result, result)
+
+    threading.Thread(target=target, daemon=True, name="ezswitch-daemon-call").start()
+    return await future
+
+
+async def within(step, awaitable, timeout):
+    """Await `awaitable`, raising StepTimeout after `timeout` seconds (None = no limit)."""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise StepTimeout(step, timeout)
+
+
+class AsyncRunner:
+    """
+    An event loop on a background thread for the Tk app. Coroutines are
+    submitted from the UI thread; completion callbacks are handed to
+    `deliver` (e.g. lambda func: root.after(0, func)) to run on the UI thread.
+    """
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+        self.loop = new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True,
+                                        name="ezswitch-async")
+        self._thread.start()
+
+    def submit(self, coro, on_done=None, on_error=None, on_cancel=None):
+        """
+        Schedule a coroutine. Returns a concurrent.futures.Future; cancelling
+        it cancels the coroutine. The future settles, and the callbacks run
+        (with the result or exception), only once the coroutine has finished,
+        so a cancelled switch is reported after its cleanup, not before.
+        """
+        future = _TaskFuture(self.loop)
+
+        def finished(done):
+            if done.cancelled():
+                if on_cancel is not None:
+                    self.deliver(on_cancel)
+                return
+            error = done.exception()
+            if error is not None:
+                if on_error is not None:
+                    self.deliver(lambda: on_error(error))
+            elif on_done is not None:
+                self.deliver(lambda: on_done(done.result()))
+
+        future.add_done_callback(finished)
+        self.loop.call_soon_threadsafe(future.start, coro)
+        return future
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class _TaskFuture(concurrent.futures.Future):
+    """
+    Future of a coroutine running as a task on `loop`. cancel() only asks the
+    task to stop (from any thread); the future follows the task's outcome,
+    whether it ends cancelled or returns something after catching it.
+    """
+
+    def __init__(self, loop):
+        super().__init__()
+        self._loop = loop
+        self._task = None
+
+    def start(self, coro):
+        """Create the task; runs on the loop thread."""
+        self._task = self._loop.create_task(coro)
+        self._task.add_done_callback(self._settle)
+
+    def cancel(self):
+        if self.done():
+            return False
+        # Queued after start(), so the task exists by the time this runs
+        self._loop.call_soon_threadsafe(self._cancel_task)
+        return True
+
+    def _cancel_task(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def _settle(self, task):
+        if task.cancelled():
+            concurrent.futures.Future.cancel(self)
+        elif task.exception() is not None:
+            self.set_exception(task.exception())
+        else:
+            self.set_result(task.result())
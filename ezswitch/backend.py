@@ -0,0 +1,824 @@
+"""
+Device backends
+DeviceBackend is the set of PnP operations the switcher needs. The PowerShell
+backend is the real Windows implementation; the simulated backend keeps the
+device tree in memory so the switching engine can run and be timed anywhere.
+"""
+
+import asyncio
+import ctypes
+import json
+import locale
+import os
+import random
+import re
+import subprocess
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+from ezswitch.pnp_queries import (
+    DEVICES_MARKER, SWITCH_MARKER, device_records_script, device_source, exact_hardware_id,
+    instance_source, switch_script
+)
+from ezswitch.aio import run_blocking
+from ezswitch.ps_session import NO_WINDOW, run_powershell
+from ezswitch.readiness import service_matches, service_released, wait_until
+from ezswitch.tracing import span
+
+# inf_name (e.g. oem12.inf), driver_version and problem_code (0 = working)
+# are filled in where the backend can report them
+DeviceInfo = namedtuple(
+    'DeviceInfo',
+    ['instance_id', 'status', 'service', 'inf_name', 'driver_version', 'problem_code']
+)
+DeviceInfo.__new__.__defaults__ = (None, None, None)
+# Everything a consolidated switch needs; instance_id None means "look it up"
+SwitchPlan = namedtuple('SwitchPlan', [
+    'hw_id', 'instance_id', 'inf_path', 'uninstall_first', 'force',
+    'old_markers', 'expected_markers', 'uninstall_wait', 'verify_wait'
+])
+
+# pnputil prints "Published Name: oem12.inf" (label is localized, the name is not)
+_PUBLISHED_NAME = re.compile(r"\b(oem\d+\.inf)\b", re.IGNORECASE)
+# SetupAPI error when no present device matches the hardware ID
+ERROR_NO_SUCH_DEVINST = 0xE000020B
+
+
+def preferred_device(devices):
+    """The device a single switch should act on: active ones first."""
+    for device in devices:
+        if device.status.lower() == "ok":
+            return device
+    return devices[0] if devices else None
+
+
+class BackendError(RuntimeError):
+    """Raised when a backend operation fails outright."""
+
+
+def parse_device_records(stdout):
+    """DeviceInfo list from the JSON line printed by device_records_script()."""
+    for line in reversed(stdout.splitlines()):
+        if line.startswith(DEVICES_MARKER):
+            records = json.loads(line[len(DEVICES_MARKER):]) or []
+            break
+    else:
+        raise BackendError("Device query produced no result")
+    if isinstance(records, dict):
+        records = [records]
+    return [
+        DeviceInfo(
+            record['instance_id'],
+            record.get('status') or "Unknown",
+            record.get('service') or "",
+            record.get('inf_name'),
+            record.get('driver_version'),
+            record.get('problem_code')
+        )
+        for record in records
+        if record.get('instance_id')
+    ]
+
+
+class DeviceBackend:
+    """Interface for the PnP operations used by the driver switcher."""
+
+    name = "base"
+
+    def find_devices(self, hw_id):
+        """Return DeviceInfo for every device matching the hardware ID
+        (or any of a list of hardware IDs)."""
+        raise NotImplementedError
+
+    def find_instance(self, instance_id):
+        """Re-query a single device instance. Returns DeviceInfo or None."""
+        raise NotImplementedError
+
+    def get_service(self, instance_id):
+        """Return the lower-cased service bound to a device, or 'not found'."""
+        raise NotImplementedError
+
+    def uninstall(self, instance_id):
+        """Uninstall a device node. Returns True on success."""
+        raise NotImplementedError
+
+    def add_driver(self, inf_path, install=True, force=False):
+        """Add a driver package. Returns a CompletedProcess (pnputil semantics)."""
+        raise NotImplementedError
+
+    def rescan(self):
+        """Ask Windows to re-enumerate hardware."""
+        raise NotImplementedError
+
+    def stage_driver(self, inf_path):
+        """Add a package to the driver store without installing it.
+        Returns the published name (oemNN.inf) or None."""
+        raise NotImplementedError
+
+    def is_staged(self, published_name):
+        """Return True if a published package is still in the driver store."""
+        raise NotImplementedError
+
+    def package_location(self, published_name):
+        """Driver store path of the package a published name currently refers
+        to, or None if it is not staged. Windows reuses oemNN.inf names once a
+        package is deleted, so this is what identifies the package."""
+        raise NotImplementedError
+
+    def bind_driver(self, hw_id, published_name, force=False, instance_id=None):
+        """Install an already staged package on the matching devices, or only
+        on `instance_id` when given.
+        Returns a CompletedProcess (0 = success, 3010 = reboot required)."""
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Start what the backend would otherwise start on first use (shell
+        host, modules) so the first real query is fast. Default: nothing."""
+
+    def apply_timeouts(self, timeouts):
+        """Adopt the limits of a StepTimeouts for the backend's own process
+        timeouts. Backends without such timeouts ignore it."""
+
+    def find_device(self, hw_id):
+        """Return the preferred matching device (active ones first) or None."""
+        return preferred_device(self.find_devices(hw_id))
+
+    async def call_async(self, op, *args, **kwargs):
+        """
+        Awaitable form of operation `op` (e.g. "uninstall"). Runs the blocking
+        call in a worker thread; backends override it for operations they can
+        run natively on the event loop.
+        """
+        return await run_blocking(getattr(self, op), *args, **kwargs)
+
+    def run_switch(self, plan):
+        """
+        Run a whole switch for a SwitchPlan as one operation. Returns a report:
+        {"instance_id", "returncode", "service", "verified", "output",
+         "steps": [{"name", "status", "seconds", "detail"}, ...]}.
+        This default composes the single operations; backends override it to
+        do the work in one round-trip.
+        """
+        report = {"instance_id": plan.instance_id, "returncode": None, "service": "",
+                  "verified": False, "output": "", "steps": []}
+
+        def record(name, status, started, detail=""):
+            report['steps'].append({"name": name, "status": status,
+                                    "seconds": time.perf_counter() - started,
+                                    "detail": str(detail)})
+
+        started = time.perf_counter()
+        instance_id = plan.instance_id
+        if instance_id is None:
+            device = self.find_device(plan.hw_id)
+            if device is None:
+                record("lookup", "failed", started, "Device not found")
+                return report
+            instance_id = device.instance_id
+        record("lookup", "ok", started, instance_id)
+        report['instance_id'] = instance_id
+
+        uninstalled = False
+        if plan.uninstall_first:
+            started = time.perf_counter()
+            try:
+                uninstalled = self.uninstall(instance_id)
+                record("uninstall", "ok" if uninstalled else "failed", started)
+            except Exception as e:
+                record("uninstall", "failed", started, e)
+            if uninstalled:
+                started = time.perf_counter()
+                waited = wait_until(lambda: self.get_service(instance_id),
+                                    service_released(plan.old_markers),
+                                    deadline=plan.uninstall_wait)
+                record("uninstall_wait", "ok" if waited.ready else "timeout",
+                       started, waited.value)
+
+        started = time.perf_counter()
+        res = self.add_driver(plan.inf_path, install=True, force=plan.force)
+        report['returncode'] = res.returncode
+        report['output'] = res.stdout if res.returncode in (0, 3010) else res.stderr
+        ok = res.returncode in (0, 3010)
+        record("add_driver", "ok" if ok else "failed", started, f"exit {res.returncode}")
+        if not ok or res.returncode == 3010:
+            return report
+
+        started = time.perf_counter()
+        try:
+            self.rescan()
+            record("scan", "ok", started)
+        except Exception as e:
+            record("scan", "failed", started, e)
+
+        started = time.perf_counter()
+        waited = wait_until(lambda: self.get_service(instance_id),
+                            service_matches(plan.expected_markers),
+                            deadline=plan.verify_wait)
+        report['service'] = waited.value or ""
+        report['verified'] = waited.ready
+        record("verify", "ok" if waited.ready else "timeout", started, waited.value)
+        return report
+
+
+class PowerShellBackend(DeviceBackend):
+    """Real backend: PnpDevice cmdlets in the shared session, plus pnputil."""
+
+    name = "powershell"
+
+    def __init__(self, run_script=run_powershell, query_timeout=10,
+                 uninstall_timeout=15, install_timeout=30, scan_timeout=10):
+        self.run_script = run_script
+        self.query_timeout = query_timeout
+        self.uninstall_timeout = uninstall_timeout
+        self.install_timeout = install_timeout
+        self.scan_timeout = scan_timeout
+        self.base_timeouts = (query_timeout, uninstall_timeout, install_timeout, scan_timeout)
+
+    def apply_timeouts(self, timeouts):
+        # Only learned limits replace the constructor's values. A query is a
+        # lookup; stage_driver shares pnputil /add-driver's limit.
+        learned = timeouts.learned
+        query, uninstall, install, scan = self.base_timeouts
+        self.query_timeout = learned.get('lookup', query)
+        self.uninstall_timeout = learned.get('uninstall', uninstall)
+        installs = [learned[name] for name in ('add_driver', 'stage') if name in learned]
+        self.install_timeout = max(installs) if installs else install
+        self.scan_timeout = learned.get('scan', scan)
+
+    def warm_up(self):
+        # Starts the shared host; Get-PnpDevice would otherwise load the module
+        self.run_script("Import-Module PnpDevice", timeout=self.query_timeout)
+
+    def find_devices(self, hw_id):
+        res = self.run_script(device_records_script(device_source(hw_id)),
+                              timeout=self.query_timeout)
+        return parse_device_records(res.stdout)
+
+    def find_instance(self, instance_id):
+        res = self.run_script(device_records_script(instance_source(instance_id)),
+                              timeout=self.query_timeout)
+        devices = parse_device_records(res.stdout)
+        return devices[0] if devices else None
+
+    def run_switch(self, plan):
+        # Uninstall, install and both waits all happen inside one script run
+        timeout = (self.query_timeout + self.uninstall_timeout + self.install_timeout
+                   + self.scan_timeout + plan.uninstall_wait + plan.verify_wait)
+        res = self.run_script(switch_script(plan), timeout=timeout)
+        for line in reversed(res.stdout.splitlines()):
+            if line.startswith(SWITCH_MARKER):
+                report = json.loads(line[len(SWITCH_MARKER):])
+                break
+        else:
+            raise BackendError(f"Switch script produced no report: {res.stderr.strip()}")
+        steps = report.get('steps') or []
+        if isinstance(steps, dict):
+            # ConvertTo-Json collapses one-element arrays
+            steps = [steps]
+        report['steps'] = [
+            {"name": step['name'], "status": step['status'],
+             "seconds": step['ms'] / 1000.0, "detail": step.get('detail', "")}
+            for step in steps
+        ]
+        report['service'] = (report.get('service') or "").lower()
+        report['output'] = report.get('output') or ""
+        return report
+
+    def get_service(self, instance_id):
+        script = f"""
+        $device = Get-PnpDevice -InstanceId "{instance_id}" -ErrorAction SilentlyContinue
+        if ($device) {{
+            $device | Select-Object -ExpandProperty Service
+        }} else {{
+            "Not Found"
+        }}
+        """
+        res = self.run_script(script, timeout=self.query_timeout)
+        return res.stdout.strip().lower()
+
+    def uninstall(self, instance_id):
+        script = f"""
+        $device = Get-PnpDevice -InstanceId "{instance_id}"
+        if ($device) {{
+            try {{
+                $device | Uninstall-PnpDevice -Confirm:$false
+                "Uninstall Success"
+            }} catch {{
+                "Uninstall Failed: $_"
+            }}
+        }} else {{
+            "Device Not Found"
+        }}
+        """
+        res = self.run_script(script, timeout=self.uninstall_timeout)
+        return "Uninstall Success" in res.stdout
+
+    def add_driver(self, inf_path, install=True, force=False):
+        return run_process(_add_driver_command(inf_path, install, force), self.install_timeout)
+
+    def rescan(self):
+        run_process(["pnputil", "/scan-devices"], self.scan_timeout)
+
+    async def call_async(self, op, *args, **kwargs):
+        # pnputil runs as an asyncio subprocess so cancelling a switch kills it
+        if op == "add_driver":
+            return await run_process_async(_add_driver_command(*args, **kwargs),
+                                           self.install_timeout)
+        if op == "rescan":
+            await run_process_async(["pnputil", "/scan-devices"], self.scan_timeout)
+            return None
+        return await DeviceBackend.call_async(self, op, *args, **kwargs)
+
+    def stage_driver(self, inf_path):
+        res = run_process(["pnputil", "/add-driver", inf_path], self.install_timeout)
+        if res.returncode not in (0, 3010):
+            return None
+        match = _PUBLISHED_NAME.search(res.stdout)
+        return match.group(1).lower() if match else None
+
+    def is_staged(self, published_name):
+        windir = os.environ.get('WINDIR', r"C:\Windows")
+        return os.path.exists(os.path.join(windir, "INF", published_name))
+
+    def package_location(self, published_name):
+        if not self.is_staged(published_name):
+            return None
+        try:
+            # FileRepository\<original inf>_<hash>\<original inf>
+            return _driver_store_inf(published_name).lower()
+        except OSError:
+            return None
+
+    def bind_driver(self, hw_id, published_name, force=False, instance_id=None):
+        hardware_id = exact_hardware_id(hw_id)
+        target = instance_id or hardware_id or hw_id
+        args = ["UpdateDriverForPlugAndPlayDevices", target, published_name]
+        with span("bind_driver", cat="process", published=published_name,
+                  target=target) as info:
+            if instance_id is None and hardware_id is None:
+                return subprocess.CompletedProcess(
+                    args, 1, "", f"Cannot bind by hardware ID '{hw_id}'"
+                )
+            try:
+                store_inf = _driver_store_inf(published_name)
+                if instance_id is not None:
+                    args[0] = "DiInstallDevice"
+                    reboot = _install_on_instance(instance_id, store_inf)
+                else:
+                    reboot = _update_driver(hardware_id, store_inf, force)
+            except OSError as e:
+                info['returncode'] = e.winerror or 1
+                return subprocess.CompletedProcess(args, info['returncode'], "", str(e))
+            info['returncode'] = 3010 if reboot else 0
+            return subprocess.CompletedProcess(
+                args, info['returncode'], f"Bound {target} to {store_inf}", ""
+            )
+
+
+def _driver_store_inf(published_name):
+    """Resolve oemNN.inf to its INF inside the driver store FileRepository."""
+    from ctypes import wintypes
+    setupapi = ctypes.WinDLL('setupapi', use_last_error=True)
+    windir = os.environ.get('WINDIR', r"C:\Windows")
+    buffer = ctypes.create_unicode_buffer(1024)
+    required = wintypes.DWORD()
+    ok = setupapi.SetupGetInfDriverStoreLocationW(
+        os.path.join(windir, "INF", published_name), None, None,
+        buffer, len(buffer), ctypes.byref(required)
+    )
+    if not ok:
+        raise ctypes.WinError(ctypes.get_last_error())
+    return buffer.value
+
+
+def _update_driver(hardware_id, inf_path, force):
+    """Bind present devices with this hardware ID to an INF. Returns reboot flag."""
+    from ctypes import wintypes
+    INSTALLFLAG_FORCE = 0x00000001
+    INSTALLFLAG_NONINTERACTIVE = 0x00000004
+    newdev = ctypes.WinDLL('newdev', use_last_error=True)
+    flags = INSTALLFLAG_NONINTERACTIVE | (INSTALLFLAG_FORCE if force else 0)
+    reboot = wintypes.BOOL(False)
+    ok = newdev.UpdateDriverForPlugAndPlayDevicesW(
+        None, hardware_id, inf_path, flags, ctypes.byref(reboot)
+    )
+    if not ok:
+        raise ctypes.WinError(ctypes.get_last_error())
+    return bool(reboot.value)
+
+
+def _add_driver_command(inf_path, install=True, force=False):
+    cmd = ["pnputil", "/add-driver", inf_path]
+    if install:
+        cmd.append("/install")
+    if force:
+        cmd.append("/force")
+    return cmd
+
+
+def run_process(cmd, timeout):
+    """
+    subprocess.run() equivalent that traces process spawn and execution
+    time separately, along with the return code.
+    """
+    name = os.path.basename(cmd[0])
+    with span(name, cat="process", argv=" ".join(cmd)) as info:
+        with span(f"{name}.spawn", cat="process"):
+            proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                creationflags=NO_WINDOW
+            )
+        with span(f"{name}.execute", cat="process") as exec_info:
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                raise
+            exec_info['returncode'] = proc.returncode
+        info['returncode'] = proc.returncode
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+async def run_process_async(cmd, timeout):
+    """
+    run_process() on an asyncio subprocess. The process is killed if it
+    times out (subprocess.TimeoutExpired) or the awaiting task is cancelled.
+    """
+    name = os.path.basename(cmd[0])
+    with span(name, cat="process", argv=" ".join(cmd)) as info:
+        with span(f"{name}.spawn", cat="process"):
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                creationflags=NO_WINDOW
+            )
+        with span(f"{name}.execute", cat="process") as exec_info:
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+            except asyncio.TimeoutError:
+                await _kill(proc)
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            except BaseException:
+                await _kill(proc)
+                raise
+            exec_info['returncode'] = proc.returncode
+        info['returncode'] = proc.returncode
+    encoding = locale.getpreferredencoding(False)
+    return subprocess.CompletedProcess(
+        cmd, proc.returncode,
+        stdout.decode(encoding, errors='replace').replace('\r\n', '\n'),
+        stderr.decode(encoding, errors='replace').replace('\r\n', '\n')
+    )
+
+
+async def _kill(proc):
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+
+
+def _install_on_instance(instance_id, inf_path):
+    """
+    Install the driver from one INF on a single device instance (DiInstallDevice),
+    leaving other devices with the same hardware ID alone. Returns reboot flag.
+    """
+    from ctypes import wintypes
+
+    class GUID(ctypes.Structure):
+        _fields_ = [("Data1", wintypes.DWORD), ("Data2", wintypes.WORD),
+                    ("Data3", wintypes.WORD), ("Data4", wintypes.BYTE * 8)]
+
+    class SP_DEVINFO_DATA(ctypes.Structure):
+        _fields_ = [("cbSize", wintypes.DWORD), ("ClassGuid", GUID),
+                    ("DevInst", wintypes.DWORD), ("Reserved", ctypes.c_size_t)]
+
+    class SP_DEVINSTALL_PARAMS_W(ctypes.Structure):
+        _fields_ = [("cbSize", wintypes.DWORD), ("Flags", wintypes.DWORD),
+                    ("FlagsEx", wintypes.DWORD), ("hwndParent", wintypes.HWND),
+                    ("InstallMsgHandler", ctypes.c_void_p),
+                    ("InstallMsgHandlerContext", ctypes.c_void_p),
+                    ("FileQueue", ctypes.c_void_p), ("ClassInstallReserved", ctypes.c_size_t),
+                    ("Reserved", wintypes.DWORD), ("DriverPath", wintypes.WCHAR * 260)]
+
+    class SP_DRVINFO_DATA_V2_W(ctypes.Structure):
+        _fields_ = [("cbSize", wintypes.DWORD), ("DriverType", wintypes.DWORD),
+                    ("Reserved", ctypes.c_size_t), ("Description", wintypes.WCHAR * 256),
+                    ("MfgName", wintypes.WCHAR * 256), ("ProviderName", wintypes.WCHAR * 256),
+                    ("DriverDate", wintypes.FILETIME), ("DriverVersion", ctypes.c_ulonglong)]
+
+    DI_ENUMSINGLEINF = 0x00010000
+    SPDIT_COMPATDRIVER = 2
+    DIIDFLAG_NOFINISHINSTALLUI = 0x00000002
+
+    setupapi = ctypes.WinDLL('setupapi', use_last_error=True)
+    newdev = ctypes.WinDLL('newdev', use_last_error=True)
+    setupapi.SetupDiCreateDeviceInfoList.restype = ctypes.c_void_p
+    setupapi.SetupDiDestroyDeviceInfoList.argtypes = [ctypes.c_void_p]
+
+    devs = setupapi.SetupDiCreateDeviceInfoList(None, None)
+    if devs in (None, ctypes.c_void_p(-1).value):
+        raise ctypes.WinError(ctypes.get_last_error())
+    devs = ctypes.c_void_p(devs)
+    try:
+        devinfo = SP_DEVINFO_DATA(cbSize=ctypes.sizeof(SP_DEVINFO_DATA))
+        if not setupapi.SetupDiOpenDeviceInfoW(devs, instance_id, None, 0,
+                                               ctypes.byref(devinfo)):
+            raise ctypes.WinError(ctypes.get_last_error())
+
+        # Restrict the driver search to the one staged INF
+        params = SP_DEVINSTALL_PARAMS_W(cbSize=ctypes.sizeof(SP_DEVINSTALL_PARAMS_W))
+        if not setupapi.SetupDiGetDeviceInstallParamsW(devs, ctypes.byref(devinfo),
+                                                       ctypes.byref(params)):
+            raise ctypes.WinError(ctypes.get_last_error())
+        params.Flags |= DI_ENUMSINGLEINF
+        params.DriverPath = inf_path
+        if not setupapi.SetupDiSetDeviceInstallParamsW(devs, ctypes.byref(devinfo),
+                                                       ctypes.byref(params)):
+            raise ctypes.WinError(ctypes.get_last_error())
+
+        if not setupapi.SetupDiBuildDriverInfoList(devs, ctypes.byref(devinfo),
+                                                   SPDIT_COMPATDRIVER):
+            raise ctypes.WinError(ctypes.get_last_error())
+        try:
+            driver = SP_DRVINFO_DATA_V2_W(cbSize=ctypes.sizeof(SP_DRVINFO_DATA_V2_W))
+            if not setupapi.SetupDiEnumDriverInfoW(devs, ctypes.byref(devinfo),
+                                                   SPDIT_COMPATDRIVER, 0,
+                                                   ctypes.byref(driver)):
+                raise ctypes.WinError(ctypes.get_last_error())
+            reboot = wintypes.BOOL(False)
+            if not newdev.DiInstallDevice(None, devs, ctypes.byref(devinfo),
+                                          ctypes.byref(driver), DIIDFLAG_NOFINISHINSTALLUI,
+                                          ctypes.byref(reboot)):
+                raise ctypes.WinError(ctypes.get_last_error())
+            return bool(reboot.value)
+        finally:
+            setupapi.SetupDiDestroyDriverInfoList(devs, ctypes.byref(devinfo),
+                                                  SPDIT_COMPATDRIVER)
+    finally:
+        setupapi.SetupDiDestroyDeviceInfoList(devs)
+
+
+class SimulatedDevice:
+    """One device node in the simulated PnP tree."""
+
+    def __init__(self, instance_id, hardware_id, service):
+        self.instance_id = instance_id
+        self.hardware_id = hardware_id
+        self.service = service
+        self.present = True
+        # Pending re-enumeration / rebind: (ready_at, service)
+        self.pending = None
+
+
+class SimulatedBackend(DeviceBackend):
+    """
+    In-memory PnP model for testing and benchmarking off Windows.
+
+    packages     - maps INF path to the service it binds (e.g. "winusb")
+    latency      - per-operation delay in seconds, or a (low, high) range
+    failures     - per-operation count of upcoming calls that should fail
+    failure_rate - per-operation probability of failing
+    (run_switch latency stands for the one script launch of a consolidated switch)
+    bind_delay   - time for an installed driver to become the bound service
+    reenumerate_delay - time for an uninstalled device to reappear after rescan
+    """
+
+    name = "simulated"
+
+    OPERATIONS = ("find_devices", "find_instance", "get_service", "uninstall", "add_driver",
+                  "rescan", "stage_driver", "bind_driver", "run_switch")
+
+    def __init__(self, devices=None, packages=None, latency=None, failures=None,
+                 failure_rate=None, bind_delay=0.2, reenumerate_delay=0.3,
+                 reboot_required=False, seed=None, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.devices = list(devices or [])
+        self.packages = dict(packages or {})
+        self.latency = dict(latency or {})
+        self.failures = dict(failures or {})
+        self.failure_rate = dict(failure_rate or {})
+        self.bind_delay = bind_delay
+        self.reenumerate_delay = reenumerate_delay
+        self.reboot_required = reboot_required
+        self.calls = dict((op, 0) for op in self.OPERATIONS)
+        self._preferred = {}
+        self._staged = {}
+        self._random = random.Random(seed)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.RLock()
+        # Set while run_switch executes: its device queries run inside the one
+        # script and cost nothing extra; uninstall/pnputil keep their latency
+        self._in_script = threading.local()
+
+    @classmethod
+    def with_laser(cls, hw_id="VID_9588&PID_9899", service="lmcv2", count=1, **kwargs):
+        """Convenience constructor: `count` identical boards on one hardware ID."""
+        devices = [
+            SimulatedDevice(f"USB\\{hw_id}\\SIM{index:04d}", hw_id, service)
+            for index in range(count)
+        ]
+        return cls(devices=devices, **kwargs)
+
+    def find_devices(self, hw_id):
+        self._operation("find_devices")
+        with self._lock:
+            self._settle()
+            ids = [hw_id] if isinstance(hw_id, str) else list(hw_id)
+            ids = [item.upper() for item in ids]
+            return [
+                self._record(d) for d in self.devices
+                if d.present and any(item in d.hardware_id.upper() for item in ids)
+            ]
+
+    def find_instance(self, instance_id):
+        self._operation("find_instance")
+        with self._lock:
+            self._settle()
+            device = self._device(instance_id)
+            if device is None or not device.present:
+                return None
+            return self._record(device)
+
+    def get_service(self, instance_id):
+        self._operation("get_service")
+        with self._lock:
+            self._settle()
+            device = self._device(instance_id)
+            if device is None or not device.present:
+                return "not found"
+            return device.service.lower()
+
+    def uninstall(self, instance_id):
+        self._operation("uninstall")
+        with self._lock:
+            device = self._device(instance_id)
+            if device is None or not device.present:
+                return False
+            device.present = False
+            device.pending = None
+            return True
+
+    def add_driver(self, inf_path, install=True, force=False):
+        self._operation("add_driver")
+        with self._lock:
+            service = self.packages.get(inf_path)
+            if service is None:
+                return subprocess.CompletedProcess(
+                    ["pnputil", "/add-driver", inf_path], 2, "",
+                    f"Failed to add driver package: {inf_path} not found"
+                )
+            self._staged.setdefault(inf_path, f"oem{len(self._staged) + 10}.inf")
+            ready_at = self._clock() + self.bind_delay
+            for device in self.devices:
+                self._preferred[device.hardware_id.upper()] = service
+                if install and device.present:
+                    device.pending = (ready_at, service)
+            returncode = 3010 if self.reboot_required else 0
+            return subprocess.CompletedProcess(
+                ["pnputil", "/add-driver", inf_path], returncode,
+                "Driver package added successfully.", ""
+            )
+
+    def rescan(self):
+        self._operation("rescan")
+        with self._lock:
+            ready_at = self._clock() + self.reenumerate_delay
+            for device in self.devices:
+                if not device.present and device.pending is None:
+                    service = self._preferred.get(device.hardware_id.upper(), device.service)
+                    device.pending = (ready_at, service)
+
+    def stage_driver(self, inf_path):
+        self._operation("stage_driver")
+        with self._lock:
+            if inf_path not in self.packages:
+                return None
+            if inf_path not in self._staged:
+                self._staged[inf_path] = f"oem{len(self._staged) + 10}.inf"
+            return self._staged[inf_path]
+
+    def is_staged(self, published_name):
+        with self._lock:
+            return published_name in self._staged.values()
+
+    def package_location(self, published_name):
+        with self._lock:
+            for path, name in self._staged.items():
+                if name == published_name:
+                    folder = f"{os.path.basename(path).lower()}_{zlib.crc32(path.encode()):08x}"
+                    return f"driverstore\\filerepository\\{folder}\\{os.path.basename(path)}"
+        return None
+
+    def bind_driver(self, hw_id, published_name, force=False, instance_id=None):
+        self._operation("bind_driver")
+        args = ["UpdateDriverForPlugAndPlayDevices", instance_id or hw_id, published_name]
+        with self._lock:
+            self._settle()
+            sources = [path for path, name in self._staged.items() if name == published_name]
+            if not sources:
+                return subprocess.CompletedProcess(args, 2, "", "Package not in driver store")
+            service = self.packages[sources[0]]
+            matching = [
+                d for d in self.devices
+                if d.present and hw_id.upper() in d.hardware_id.upper()
+                and (instance_id is None or d.instance_id.lower() == instance_id.lower())
+            ]
+            if not matching:
+                return subprocess.CompletedProcess(
+                    args, ERROR_NO_SUCH_DEVINST, "", "No matching device present"
+                )
+            ready_at = self._clock() + self.bind_delay
+            for device in matching:
+                self._preferred[device.hardware_id.upper()] = service
+                device.pending = (ready_at, service)
+            returncode = 3010 if self.reboot_required else 0
+            return subprocess.CompletedProcess(args, returncode, "Bound", "")
+
+    def run_switch(self, plan):
+        self._operation("run_switch")
+        self._in_script.active = True
+        try:
+            return DeviceBackend.run_switch(self, plan)
+        finally:
+            self._in_script.active = False
+
+    def _record(self, device):
+        """DeviceInfo for a present device; the INF is the staged package of its service."""
+        inf_name = None
+        for path, published in self._staged.items():
+            if self.packages.get(path) == device.service:
+                inf_name = published
+        return DeviceInfo(device.instance_id, "OK", device.service, inf_name, "1.0.0.0", 0)
+
+    def _device(self, instance_id):
+        for device in self.devices:
+            if device.instance_id.lower() == instance_id.lower():
+                return device
+        return None
+
+    def _settle(self):
+        """Apply pending rebinds / re-enumerations whose time has come."""
+        now = self._clock()
+        for device in self.devices:
+            if device.pending is not None and device.pending[0] <= now:
+                device.service = device.pending[1]
+                device.present = True
+                device.pending = None
+
+    def _operation(self, op):
+        """Charge latency and inject failures for one backend call."""
+        with self._lock:
+            self.calls[op] += 1
+            fail = False
+            if self.failures.get(op, 0) > 0:
+                self.failures[op] -= 1
+                fail = True
+            elif self._random.random() < self.failure_rate.get(op, 0.0):
+                fail = True
+            delay = self.latency.get(op, 0.0)
+            in_script = getattr(self._in_script, 'active', False)
+            if in_script and op in ("find_devices", "find_instance", "get_service"):
+                delay = 0.0
+            if isinstance(delay, (tuple, list)):
+                delay = self._random.uniform(delay[0], delay[1])
+        if delay:
+            self._sleep(delay)
+        if fail:
+            raise BackendError(f"Simulated {op} failure")
+
+
+def create_backend(config):
+    """Build the backend selected by the config ('powershell' by default)."""
+    kind = config.get('backend', 'powershell')
+    if kind == 'simulated':
+        packages = {
+            config.get('ezcad_driver', ''): "lmcv2",
+            config.get('lightburn_driver', ''): "winusb",
+        }
+        backend = SimulatedBackend.with_laser(
+            config.get('hardware_id', "VID_9588&PID_9899"),
+            packages=packages,
+            latency={"add_driver": 0.5, "uninstall": 0.3, "run_switch": 0.5}
+        )
+        # One simulated board per extra board profile, bound to its EZCAD driver
+        from ezswitch.profiles import load_profiles
+        for index, profile in enumerate(load_profiles(config)[1:]):
+            for family, inf_path in profile.drivers.items():
+                backend.packages.setdefault(inf_path, profile.services[family][0])
+            hw_id = profile.hardware_ids[0]
+            backend.devices.append(SimulatedDevice(
+                f"USB\\{hw_id}\\SIMP{index:03d}", hw_id, profile.services["EZCAD"][0]
+            ))
+        return backend
+    return PowerShellBackend()
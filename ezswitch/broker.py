@@ -0,0 +1,294 @@
+"""
+Elevated broker
+An optional long-running process that is elevated once, keeps a warm
+backend (PowerShell session, staged packages) and answers status/switch
+requests over local IPC: a named pipe on Windows, a Unix socket elsewhere.
+The GUI, the CLI and scripts can then switch with a single round-trip and
+without relaunching themselves through UAC.
+
+Start: EZ_LightBurn_Driver_Switch.py --serve-broker
+With --listen HOST:PORT it serves TCP instead, as the agent for fleet
+switching (see ezswitch.fleet); both sides then share a key file.
+
+Messages are JSON documents; connections are authenticated with the key
+(HMAC challenge) before any request is read. The challenge runs on the
+connection's own thread with a deadline, so a peer that connects and stays
+silent cannot hold up the others.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge
+
+from ezswitch.ps_session import NO_WINDOW
+from ezswitch.timeouts import ceiling_timeouts
+from ezswitch.tracing import span
+
+BROKER_KEY_FILE = "broker.key"
+PIPE_NAME = r"\\.\pipe\ezlbs-broker"
+SOCKET_NAME = "ezlbs-broker.sock"
+# Seconds allowed on top of the longest switch for queueing behind another request
+REPLY_SLACK = 30
+# Seconds a peer has to complete the HMAC challenge after connecting
+HANDSHAKE_TIMEOUT = 10
+
+
+def request_timeout(config=None):
+    """How long a client waits for a reply: the longest switch the broker's
+    (possibly learned) step limits allow, plus slack."""
+    return ceiling_timeouts(config).switch_deadline() + REPLY_SLACK
+
+
+def broker_address():
+    """(address, family) of the local broker endpoint."""
+    if sys.platform == 'win32':
+        return PIPE_NAME, 'AF_PIPE'
+    return os.path.join(tempfile.gettempdir(), SOCKET_NAME), 'AF_UNIX'
+
+
+def parse_address(text):
+    """("host", port), 'AF_INET' for a "host:port" string."""
+    host, _, port = text.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"Expected HOST:PORT, got '{text}'")
+    return (host, int(port)), 'AF_INET'
+
+
+def load_or_create_key(path):
+    """Shared key for TCP brokers: read it, or create it on first use."""
+    return _read_key(path) or _create_key(path)
+
+
+def _send(conn, message):
+    conn.send_bytes(json.dumps(message).encode('utf-8'))
+
+
+def _recv(conn):
+    return json.loads(conn.recv_bytes().decode('utf-8'))
+
+
+def _authenticate(conn, authkey, server, timeout=None):
+    """HMAC challenge on a raw connection, from the server or the client side.
+    Raises AuthenticationError, or TimeoutError if the peer goes quiet."""
+    guarded = _HandshakeDeadline(conn, HANDSHAKE_TIMEOUT if timeout is None else timeout)
+    if server:
+        deliver_challenge(guarded, authkey)
+        answer_challenge(guarded, authkey)
+    else:
+        answer_challenge(guarded, authkey)
+        deliver_challenge(guarded, authkey)
+
+
+class _HandshakeDeadline:
+    """The connection as the challenge functions see it: every read must
+    arrive before one overall deadline."""
+
+    def __init__(self, conn, timeout):
+        self.conn = conn
+        self.deadline = time.monotonic() + timeout
+
+    def send_bytes(self, *args):
+        self.conn.send_bytes(*args)
+
+    def recv_bytes(self, *args):
+        if not self.conn.poll(max(0.0, self.deadline - time.monotonic())):
+            raise TimeoutError("Peer did not complete the handshake")
+        return self.conn.recv_bytes(*args)
+
+
+def _open(address, family, authkey):
+    """Connect and authenticate within HANDSHAKE_TIMEOUT. Client() with an
+    authkey would wait forever on an endpoint that accepts but never answers."""
+    conn = Client(address, family=family)
+    try:
+        _authenticate(conn, authkey, server=False)
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+def _read_key(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _create_key(path):
+    """Write a fresh key readable by the current user only."""
+    key = os.urandom(32)
+    if os.path.exists(path):
+        # A new file, so no permissive mode or ACL is inherited from the old one
+        os.remove(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    if sys.platform == 'win32':
+        _restrict_to_user(path)
+    return key
+
+
+def _restrict_to_user(path):
+    """Drop inherited ACL entries so only the current user can read the key."""
+    user = os.environ.get('USERNAME')
+    if not user:
+        return
+    domain = os.environ.get('USERDOMAIN')
+    account = f"{domain}\\{user}" if domain else user
+    subprocess.run(
+        ["icacls", path, "/inheritance:r", "/grant:r", f"{account}:F"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, creationflags=NO_WINDOW
+    )
+
+
+class Broker:
+    """
+    Serves requests with a `handler(request) -> reply` callable.
+    Requests are handled one at a time; PnP work does not parallelize.
+    """
+
+    def __init__(self, handler, address=None, key_file=BROKER_KEY_FILE, authkey=None):
+        self.handler = handler
+        self.address, self.family = address or broker_address()
+        self.key_file = key_file
+        self.authkey = authkey
+        self.listener = None
+        self._authkey = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Open the endpoint. Without a given key a fresh one is written for clients."""
+        if self.family == 'AF_UNIX' and os.path.exists(self.address):
+            os.remove(self.address)
+        self._authkey = self.authkey or _create_key(self.key_file)
+        # No authkey here: Listener.accept() would run the challenge inline,
+        # where one silent peer blocks every other; _serve_client() runs it
+        self.listener = Listener(self.address, family=self.family)
+
+    def serve_forever(self):
+        if self.listener is None:
+            self.start()
+        while not self._stopped.is_set():
+            try:
+                conn = self.listener.accept()
+            except Exception:
+                # Listener closed, or a peer that dropped while connecting
+                if self._stopped.is_set():
+                    break
+                continue
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        if self.listener is not None:
+            try:
+                self.listener.close()
+            except Exception:
+                pass
+
+    def _serve_client(self, conn):
+        with conn:
+            try:
+                _authenticate(conn, self._authkey, server=True)
+            except Exception:
+                # Wrong key, or no answer to the challenge in time
+                return
+            while not self._stopped.is_set():
+                try:
+                    request = _recv(conn)
+                except (EOFError, OSError, ValueError):
+                    return
+                op = request.get('op') if isinstance(request, dict) else None
+                if op == 'shutdown':
+                    _send(conn, {"ok": True})
+                    self.stop()
+                    return
+                with self._lock, span(f"broker.{op}", cat="broker"):
+                    try:
+                        reply = self.handler(request)
+                    except Exception as e:
+                        reply = {"ok": False, "error": str(e)}
+                try:
+                    _send(conn, reply)
+                except (EOFError, OSError):
+                    return
+
+
+class BrokerClient:
+    """
+    Connection to a running broker. A connection closed by a timeout or by
+    the broker restarting is reopened on the next request.
+    """
+
+    def __init__(self, conn, address=None, family=None, authkey=None, timeout=None):
+        self.conn = conn
+        self.address = address
+        self.family = family
+        self.authkey = authkey
+        # Default reply timeout (seconds); see request_timeout()
+        self.timeout = timeout or request_timeout()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def connect(cls, address=None, key_file=BROKER_KEY_FILE, authkey=None):
+        """Return a client, or None if no broker is listening."""
+        address, family = address or broker_address()
+        authkey = authkey or _read_key(key_file)
+        if authkey is None:
+            return None
+        if family == 'AF_UNIX' and not os.path.exists(address):
+            return None
+        try:
+            return cls(_open(address, family, authkey), address, family, authkey)
+        except Exception:
+            return None
+
+    def request(self, op, timeout=None, **params):
+        """Send one request and wait for its reply (self.timeout by default)."""
+        params['op'] = op
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock, span(f"broker_client.{op}", cat="broker"):
+            try:
+                self._connection()
+                _send(self.conn, params)
+            except (EOFError, OSError):
+                # The broker went away since the last request: nothing was
+                # delivered, so one resend on a fresh connection is safe
+                self._drop()
+                self._connection()
+                _send(self.conn, params)
+            if not self.conn.poll(timeout):
+                self._drop()
+                raise TimeoutError(f"Broker did not answer '{op}' within {timeout:g}s")
+            try:
+                return _recv(self.conn)
+            except (EOFError, OSError):
+                self._drop()
+                raise
+
+    def _connection(self):
+        """The open connection, reconnecting if it was closed."""
+        if self.conn is None:
+            if self.address is None:
+                raise ConnectionError("Broker connection closed")
+            self.conn = _open(self.address, self.family, self.authkey)
+        return self.conn
+
+    def _drop(self):
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def close(self):
+        self._drop()
@@ -0,0 +1,429 @@
+"""
+Command-line interface
+Headless status and switching for job-launch scripts. Never imports tkinter.
+
+Usage:
+  EZ_LightBurn_Driver_Switch.py --status [--json]
+  EZ_LightBurn_Driver_Switch.py --switch ezcad|lightburn [--json] [--no-broker]
+  EZ_LightBurn_Driver_Switch.py --revert [--json] [--no-broker]
+  EZ_LightBurn_Driver_Switch.py --serve-broker [--listen HOST:PORT --key-file fleet.key]
+  EZ_LightBurn_Driver_Switch.py --fleet fleet.json --status|--switch ezcad|lightburn|--revert
+  EZ_LightBurn_Driver_Switch.py --history-report [--json]
+
+When a broker is running (see ezswitch.broker) status, switch and revert requests
+are sent to it, so this process does not need to be elevated.
+
+Exit codes: 0 success, 1 switch failed, 2 bad usage or configuration,
+3 laser not found, 4 administrator rights required.
+"""
+
+import argparse
+import ctypes
+import json
+import os
+import sys
+import time
+
+from ezswitch.backend import create_backend, preferred_device
+from ezswitch.broker import (
+    Broker, BrokerClient, load_or_create_key, parse_address, request_timeout
+)
+from ezswitch.config import CONFIG_FILE, read_config
+from ezswitch.engine import DEFAULT_HARDWARE_ID, DRIVERS, SwitchEngine
+from ezswitch.fleet import (
+    DEFAULT_FLEET_PARALLEL, DEFAULT_HOST_TIMEOUT, Fleet, default_transports, load_inventory,
+    report_summary
+)
+from ezswitch.history import HISTORY_FILE, HistoryStore, format_report, history_report, read_history
+from ezswitch.inf_cache import InfCache
+from ezswitch.profiles import ProfileIndex, profile_config
+from ezswitch.snapshot import RevertPoints, save_snapshot
+from ezswitch.staging import DriverStaging
+from ezswitch.timeouts import StepTimeouts
+from ezswitch.tracing import TRACE_FILE, Tracer, set_tracer
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_NOT_FOUND = 3
+EXIT_NOT_ADMIN = 4
+
+TARGETS = {"ezcad": "EZCAD", "lightburn": "LightBurn"}
+
+
+def is_admin():
+    try:
+        return bool(ctypes.windll.shell32.IsUserAnAdmin())
+    except Exception:
+        return False
+
+
+def _attach_console():
+    """A --noconsole build has no stdout; borrow the parent's console if any."""
+    if sys.stdout is not None or sys.platform != 'win32':
+        return
+    try:
+        if ctypes.windll.kernel32.AttachConsole(-1):
+            sys.stdout = open('CONOUT$', 'w')
+            sys.stderr = sys.stdout
+    except Exception:
+        pass
+
+
+def _emit(args, data, text):
+    if sys.stdout is None:
+        return
+    if args.json:
+        print(json.dumps(data, indent=2))
+    else:
+        print(text)
+
+
+def _device_record(device, index):
+    profile, driver = index.classify(device)
+    return {
+        "instance_id": device.instance_id,
+        "profile": profile.name,
+        "status": device.status,
+        "service": device.service,
+        "driver": driver,
+        "inf_name": device.inf_name,
+        "driver_version": device.driver_version,
+        "problem_code": device.problem_code,
+    }
+
+
+def status_report(config, backend, history=None):
+    """Detect the laser. Returns (exit code, JSON data, text).
+    The detection is recorded in `history` (a HistoryStore) if given."""
+    hw_id = config.get('hardware_id', DEFAULT_HARDWARE_ID)
+    index = ProfileIndex.from_config(config)
+    if history is not None:
+        backend.apply_timeouts(StepTimeouts.from_history(config, history))
+    start = time.perf_counter()
+    try:
+        devices = index.find_devices(backend)
+    except Exception as e:
+        if history is not None:
+            history.record_detection(time.perf_counter() - start, "error", 0, backend.name)
+        return EXIT_FAILED, {"ok": False, "error": str(e)}, f"Detection failed: {e}"
+
+    device = preferred_device(devices)
+    if history is not None:
+        history.record_detection(time.perf_counter() - start,
+                                 device.status.lower() if device else "not found",
+                                 len(devices), backend.name)
+    if device is None:
+        return (EXIT_NOT_FOUND, {"ok": False, "devices": [], "error": "Laser not detected"},
+                f"Laser not detected ({', '.join(index.hardware_ids)})")
+
+    save_snapshot(device, hw_id)
+    profile, driver = index.classify(device)
+    lines = []
+    for item in devices:
+        item_profile, item_driver = index.classify(item)
+        name = DRIVERS.get(item_driver, {}).get('name', "Unknown")
+        lines.append(f"{item.instance_id} [{item.status}] {item_profile.name}: "
+                     f"{name} driver (service: {item.service})")
+    return EXIT_OK, {
+        "ok": True,
+        "driver": driver,
+        "profile": profile.name,
+        "service": device.service,
+        "instance_id": device.instance_id,
+        "devices": [_device_record(item, index) for item in devices],
+    }, "\n".join(lines)
+
+
+def _find_for_switch(index, backend, instance_id):
+    """Device to switch: (DeviceInfo, None) or (None, error report)."""
+    try:
+        if instance_id:
+            device = backend.find_instance(instance_id)
+        else:
+            device = preferred_device(index.find_devices(backend))
+    except Exception as e:
+        return None, (EXIT_FAILED, {"ok": False, "error": str(e)}, f"Detection failed: {e}")
+    if device is None:
+        return None, (EXIT_NOT_FOUND, {"ok": False, "error": "Laser not detected"},
+                      f"Laser not detected ({', '.join(index.hardware_ids)})")
+    return device, None
+
+
+def _result_report(result, target):
+    return EXIT_OK if result.success else EXIT_FAILED, {
+        "ok": result.success,
+        "target": target,
+        "service": result.service,
+        "changed": result.success,
+        "strategy": result.strategy,
+        "message": result.message,
+        "timings": dict((k, round(v, 3)) for k, v in result.timings.items()),
+    }, result.message
+
+
+def switch_report(config, backend, target, staging=None, instance_id=None, history=None,
+                  reverts=None):
+    """Switch the laser (or only `instance_id`) to `target`.
+    Returns (exit code, JSON data, text)."""
+    index = ProfileIndex.from_config(config)
+    device, error = _find_for_switch(index, backend, instance_id)
+    if device is None:
+        return error
+
+    profile, current = index.classify(device)
+    if current == target:
+        return (EXIT_OK,
+                {"ok": True, "target": target, "service": device.service, "changed": False},
+                f"{DRIVERS[target]['name']} driver already active.")
+
+    if staging is None:
+        staging = DriverStaging(inf_cache=InfCache())
+    if reverts is None:
+        reverts = RevertPoints()
+    engine = SwitchEngine(backend, profile_config(config, profile), staging, history, reverts)
+    if instance_id:
+        # A batch of one: switch_many() binds by instance, where pnputil
+        # /add-driver /install would also switch the other boards
+        result = engine.switch_many([device], target).results[0][1]
+    else:
+        result = engine.switch(current, target=target, device=device)
+    return _result_report(result, target)
+
+
+def revert_report(config, backend, staging=None, instance_id=None, history=None, reverts=None):
+    """Rebind the driver the last switch of the laser (or `instance_id`) replaced.
+    Returns (exit code, JSON data, text)."""
+    index = ProfileIndex.from_config(config)
+    device, error = _find_for_switch(index, backend, instance_id)
+    if device is None:
+        return error
+
+    if reverts is None:
+        reverts = RevertPoints()
+    if reverts.get(device.instance_id) is None:
+        return (EXIT_USAGE, {"ok": False, "error": "No previous driver recorded"},
+                "No previous driver recorded for this laser; switch it first.")
+    profile, current = index.classify(device)
+    if staging is None:
+        staging = DriverStaging(inf_cache=InfCache())
+    engine = SwitchEngine(backend, profile_config(config, profile), staging, history, reverts)
+    result = engine.revert(device=device)
+    return _result_report(result, result.target)
+
+
+def cmd_status(args, config, backend):
+    code, data, text = status_report(config, backend, HistoryStore())
+    _emit(args, data, text)
+    return code
+
+
+def cmd_switch(args, config, backend):
+    if backend.name != "simulated" and not is_admin():
+        _emit(args, {"ok": False, "error": "Administrator rights required"},
+              "Switching drivers requires an elevated (Administrator) prompt.\n"
+              "Alternatively start the broker once with --serve-broker.")
+        return EXIT_NOT_ADMIN
+    if args.revert:
+        code, data, text = revert_report(config, backend, history=HistoryStore())
+    else:
+        code, data, text = switch_report(config, backend, TARGETS[args.switch],
+                                         history=HistoryStore())
+    _emit(args, data, text)
+    return code
+
+
+def cmd_via_broker(args, client):
+    """Run --status / --switch / --revert in the broker.
+    Returns None if it failed to answer."""
+    try:
+        if args.status:
+            reply = client.request("status")
+        elif args.revert:
+            reply = client.request("revert")
+        else:
+            reply = client.request("switch", target=TARGETS[args.switch])
+    except Exception:
+        return None
+    finally:
+        client.close()
+    if 'exit' not in reply:
+        return None
+    _emit(args, reply['data'], reply['text'])
+    return reply['exit']
+
+
+class BrokerHandler:
+    """
+    Request handler run inside the broker. Keeps one backend and one
+    DriverStaging so repeat requests start warm. Only the configuration file
+    the broker was started with is used; clients cannot point the elevated
+    process at other driver packages.
+    """
+
+    def __init__(self, config_path=CONFIG_FILE):
+        # Re-read per request so settings saved by the GUI apply
+        self.config_path = os.path.abspath(config_path)
+        self.backends = {}
+        self.staging = DriverStaging(inf_cache=InfCache())
+        self.history = HistoryStore()
+        self.reverts = RevertPoints()
+
+    def _backend(self, config):
+        key = config.get('backend', 'powershell')
+        if key not in self.backends:
+            self.backends[key] = create_backend(config)
+        return self.backends[key]
+
+    def warm_up(self, config):
+        """Start the backend (and its PowerShell session) before the first request."""
+        self._backend(config).warm_up()
+
+    def __call__(self, request):
+        op = request.get('op')
+        if op == 'ping':
+            return {"ok": True, "pid": os.getpid()}
+        path = self.config_path
+        config, valid = read_config(path)
+        if not config or (op in ('switch', 'revert') and not valid):
+            error = f"Invalid or missing configuration: {path}"
+            return {"exit": EXIT_USAGE, "data": {"ok": False, "error": error}, "text": error}
+        backend = self._backend(config)
+        if op == 'status':
+            code, data, text = status_report(config, backend, self.history)
+        elif op == 'switch':
+            target = request.get('target')
+            if target not in DRIVERS:
+                return {"ok": False, "error": f"Unknown target: {target}"}
+            code, data, text = switch_report(config, backend, target, self.staging,
+                                             request.get('instance_id'), self.history,
+                                             self.reverts)
+        elif op == 'revert':
+            code, data, text = revert_report(config, backend, self.staging,
+                                             request.get('instance_id'), self.history,
+                                             self.reverts)
+        else:
+            return {"ok": False, "error": f"Unknown operation: {op}"}
+        return {"exit": code, "data": data, "text": text}
+
+
+def cmd_serve_broker(args, config):
+    """Run the broker in the foreground until it is asked to shut down."""
+    if config.get('backend', 'powershell') != "simulated" and not is_admin():
+        _emit(args, {"ok": False, "error": "Administrator rights required"},
+              "The broker must be started from an elevated (Administrator) prompt.")
+        return EXIT_NOT_ADMIN
+    handler = BrokerHandler(args.config)
+    handler.warm_up(config)
+    if args.listen:
+        # Fleet agent: TCP, authenticated with the key shared with the controller
+        try:
+            address = parse_address(args.listen)
+        except ValueError as e:
+            _emit(args, {"ok": False, "error": str(e)}, str(e))
+            return EXIT_USAGE
+        broker = Broker(handler, address, authkey=load_or_create_key(args.key_file))
+    else:
+        broker = Broker(handler)
+    broker.start()
+    address = args.listen or broker.address
+    _emit(args, {"ok": True, "address": address}, f"Broker listening on {address}")
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        broker.stop()
+    return EXIT_OK
+
+
+def cmd_fleet(args):
+    """Run --status / --switch / --revert on every host of a fleet inventory."""
+    try:
+        hosts, settings = load_inventory(args.fleet)
+    except (OSError, ValueError) as e:
+        _emit(args, {"ok": False, "error": str(e)}, f"Cannot read fleet inventory: {e}")
+        return EXIT_USAGE
+    transports = default_transports(settings)
+    fleet = Fleet(
+        hosts, transports,
+        max_parallel=settings.get('max_parallel', DEFAULT_FLEET_PARALLEL),
+        timeout=settings.get('timeout', DEFAULT_HOST_TIMEOUT)
+    )
+    if args.status:
+        report = fleet.run("status")
+    elif args.revert:
+        report = fleet.run("revert")
+    else:
+        report = fleet.run("switch", target=TARGETS[args.switch])
+    data, text = report_summary(report)
+    data['ok'] = data['succeeded'] == data['hosts']
+    _emit(args, data, text)
+    return EXIT_OK if data['ok'] else EXIT_FAILED
+
+
+def cmd_history_report(args):
+    """Summarize switch_history.jsonl (success rate, phase percentiles per machine)."""
+    report = history_report(read_history([HISTORY_FILE]))
+    _emit(args, report, format_report(report))
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="EZ_LightBurn_Driver_Switch",
+        description="Switch fiber laser drivers between EZCAD2 and LightBurn."
+    )
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--status", action="store_true", help="Show the active driver")
+    action.add_argument("--switch", choices=sorted(TARGETS), help="Switch to this driver")
+    action.add_argument("--revert", action="store_true",
+                        help="Rebind the driver the last switch replaced")
+    action.add_argument("--serve-broker", action="store_true",
+                        help="Run the elevated broker that serves --status/--switch requests")
+    action.add_argument("--history-report", action="store_true",
+                        help="Summarize recorded detections and switches per machine")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    parser.add_argument("--config", default=CONFIG_FILE, help="Path to driver_paths.json")
+    parser.add_argument("--no-broker", action="store_true",
+                        help="Do not use a running broker; work in this process")
+    parser.add_argument("--listen", metavar="HOST:PORT",
+                        help="With --serve-broker: accept fleet requests over TCP")
+    parser.add_argument("--key-file", default="fleet.key",
+                        help="Shared key for --listen (created on first use)")
+    parser.add_argument("--fleet", metavar="INVENTORY",
+                        help="Send --status/--switch/--revert to every host in a fleet inventory")
+    return parser
+
+
+def main(argv=None):
+    _attach_console()
+    args = build_parser().parse_args(argv)
+    if args.history_report:
+        return cmd_history_report(args)
+
+    if args.fleet and not args.serve_broker:
+        set_tracer(Tracer(TRACE_FILE))
+        return cmd_fleet(args)
+
+    config, valid = read_config(args.config)
+    if not valid and not args.serve_broker and not (args.status and config):
+        _emit(args, {"ok": False, "error": f"Invalid or missing configuration: {args.config}"},
+              f"Invalid or missing configuration: {args.config}\n"
+              "Run the application without arguments to complete setup.")
+        return EXIT_USAGE
+
+    set_tracer(Tracer(TRACE_FILE))
+    if args.serve_broker:
+        return cmd_serve_broker(args, config)
+
+    if not args.no_broker:
+        client = BrokerClient.connect()
+        if client is not None:
+            client.timeout = request_timeout(config)
+            code = cmd_via_broker(args, client)
+            if code is not None:
+                return code
+
+    backend = create_backend(config)
+    if args.status:
+        return cmd_status(args, config, backend)
+    return cmd_switch(args, config, backend)
@@ -0,0 +1,147 @@
+"""
+Configuration file handling
+Reads driver_paths.json the same way for the GUI and the command line.
+Driver paths may live on a slow or offline network share, so the GUI checks
+them with PathChecker (off the UI thread, with a timeout) instead of in
+read_config.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from ezswitch.engine import DEFAULT_HARDWARE_ID
+
+CONFIG_FILE = "driver_paths.json"
+PATH_CHECK_FILE = "path_checks.json"
+# Seconds to wait for a driver path before reporting it as unreachable
+DEFAULT_PATH_TIMEOUT = 5.0
+
+# status: "ok", "missing" or "timeout"; mtime of the file when it was checked
+PathCheck = namedtuple('PathCheck', ['path', 'status', 'mtime'])
+
+
+def read_config(path=CONFIG_FILE, check_paths=True):
+    """
+    Load and validate the configuration.
+    Returns (config, valid). `config` holds whatever could be read, so the
+    setup wizard can pre-fill it even when validation fails. With
+    check_paths=False the driver files are not touched.
+    """
+    config = {}
+    if not os.path.exists(path):
+        return config, False
+    try:
+        with open(path, 'r') as f:
+            config = json.load(f)
+
+        # Ensure all required keys exist
+        required_keys = ['ezcad_driver', 'lightburn_driver', 'hardware_id', 'force_install']
+        for key in required_keys:
+            if key not in config:
+                if key == 'hardware_id':
+                    config[key] = DEFAULT_HARDWARE_ID
+                elif key == 'force_install':
+                    config[key] = True
+                else:
+                    return config, False
+
+        # Validate driver files exist
+        if check_paths and (not os.path.exists(config['ezcad_driver']) or
+                            not os.path.exists(config['lightburn_driver'])):
+            return config, False
+
+        return config, True
+    except Exception:
+        return config, False
+
+
+def write_config(config, path=CONFIG_FILE):
+    """Save configuration to JSON. Raises OSError on failure."""
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=4)
+
+
+class PathChecker:
+    """
+    Checks that driver files exist and are readable, giving up after a
+    timeout. The last result per path is kept in path_checks.json with the
+    file's mtime: the GUI shows it immediately at startup, and a file whose
+    mtime is unchanged since a good check is not read again.
+    """
+
+    def __init__(self, path=PATH_CHECK_FILE, timeout=DEFAULT_PATH_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.records = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def last_known(self, inf_path):
+        """The cached PathCheck for `inf_path` (no file access), or None."""
+        with self._lock:
+            record = self.records.get(inf_path)
+        if record is None:
+            return None
+        return PathCheck(inf_path, record['status'], record.get('mtime'))
+
+    def check(self, inf_path, timeout=None):
+        """
+        Check one path, blocking for at most `timeout` seconds. A hung check
+        keeps running in a daemon thread and reports "timeout"; its late
+        result still updates the cache.
+        """
+        results = []
+        done = threading.Event()
+
+        def probe():
+            try:
+                results.append(self._probe(inf_path))
+            except OSError:
+                results.append(PathCheck(inf_path, "missing", None))
+            self._remember(results[0])
+            done.set()
+
+        threading.Thread(target=probe, daemon=True, name="ezswitch-path-check").start()
+        if not done.wait(self.timeout if timeout is None else timeout):
+            return PathCheck(inf_path, "timeout", None)
+        return results[0]
+
+    def _probe(self, inf_path):
+        stat = os.stat(inf_path)
+        if not os.path.isfile(inf_path):
+            return PathCheck(inf_path, "missing", None)
+        cached = self.last_known(inf_path)
+        if cached is None or cached.status != "ok" or cached.mtime != stat.st_mtime:
+            with open(inf_path, 'rb') as f:
+                f.read(1)
+        return PathCheck(inf_path, "ok", stat.st_mtime)
+
+    def _remember(self, check):
+        with self._lock:
+            self.records[check.path] = {
+                "status": check.status,
+                "mtime": check.mtime,
+                "checked_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            self._save()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.records = json.load(f)
+        except Exception:
+            self.records = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(self.records, f, indent=4)
+        except OSError:
+            pass
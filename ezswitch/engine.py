@@ -0,0 +1,594 @@
+"""
+Switching engine
+The uninstall / add-driver / scan / verify sequence, independent of the GUI.
+The engine is a coroutine: steps carry their own timeouts, independent work
+(staging the target package) overlaps the device lookup, and cancelling the
+task stops the switch. Progress is reported through a callback so the Tk app,
+the CLI, scripts and benchmarks can all drive the same code against any
+DeviceBackend; switch() is the blocking entry point. revert() rebinds the
+package the last switch replaced, which costs about one bind.
+"""
+
+import asyncio
+import re
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from ezswitch.aio import run_blocking, run_sync, within
+from ezswitch.backend import SwitchPlan
+from ezswitch.readiness import device_present, service_matches, service_released, wait_until_async
+from ezswitch.timeouts import StepTimeouts
+from ezswitch.tracing import span
+
+DEFAULT_HARDWARE_ID = "VID_9588&PID_9899"
+# Boards switched at once in multi-device mode
+DEFAULT_MAX_PARALLEL = 3
+# "steps": one backend call per phase; "consolidated": the whole switch in
+# one backend.run_switch() call (a single PowerShell run on Windows)
+DEFAULT_SWITCH_MODE = "steps"
+
+# Driver families: display name, config key of the INF, service name markers
+DRIVERS = {
+    "EZCAD": {"name": "EZCAD2", "config_key": "ezcad_driver", "markers": ["lmc", "bjjcz"]},
+    "LightBurn": {"name": "LightBurn", "config_key": "lightburn_driver",
+                  "markers": ["winusb", "usblmc"]},
+}
+
+# timings maps phase name -> seconds (lookup, uninstall, uninstall_wait,
+# add_driver, scan, verify) plus the overall "total". strategy is how the
+# driver went on ("bind", "add_driver", "consolidated" or "revert"); returncode is the
+# install step's code (0, 3010 or an error), None if it never ran
+SwitchResult = namedtuple('SwitchResult', ['success', 'message', 'target', 'service', 'timings',
+                                           'strategy', 'returncode'])
+SwitchResult.__new__.__defaults__ = (None, None)
+# results is a list of (DeviceInfo, SwitchResult); elapsed is total wall time
+MultiSwitchResult = namedtuple('MultiSwitchResult', ['results', 'elapsed'])
+
+
+def target_for(current_driver):
+    """Driver family to switch to from the currently detected one."""
+    return "EZCAD" if current_driver == "LightBurn" else "LightBurn"
+
+
+class ServiceClassifier:
+    """
+    Maps service names to driver families in one regex pass. Markers are
+    tried longest first, so "usblmc" (LightBurn) wins over "lmc" (EZCAD).
+    """
+
+    def __init__(self, markers):
+        # markers: family -> list of service names or name fragments
+        pairs = sorted(
+            ((marker.lower(), family) for family, names in markers.items() for marker in names),
+            key=lambda pair: -len(pair[0])
+        )
+        self.families = [family for _, family in pairs]
+        self.pattern = re.compile("|".join(f"({re.escape(marker)})" for marker, _ in pairs)) \
+            if pairs else None
+
+    def classify(self, service):
+        """Driver family ("LightBurn", "EZCAD" or "Unknown") for a service name."""
+        if self.pattern is None or not service:
+            return "Unknown"
+        match = self.pattern.search(service.lower())
+        return self.families[match.lastindex - 1] if match else "Unknown"
+
+
+_classifier = ServiceClassifier(dict((family, info['markers']) for family, info in DRIVERS.items()))
+
+
+def classify_service(service):
+    """Driver family ("LightBurn", "EZCAD" or "Unknown") for a service name."""
+    return _classifier.classify(service)
+
+
+def service_markers(config, family):
+    """Service markers of a driver family, as overridden by a board profile."""
+    return config.get('service_markers', {}).get(family, DRIVERS[family]['markers'])
+
+
+class SwitchEngine:
+    """Runs a driver switch against a DeviceBackend."""
+
+    def __init__(self, backend, config, staging=None, history=None, reverts=None):
+        self.backend = backend
+        self.config = config
+        # HistoryStore; when set, every switch is recorded and step timeouts
+        # and readiness deadlines are learned from this machine's history
+        self.history = history
+        self.timeouts = StepTimeouts.from_history(config, history)
+        backend.apply_timeouts(self.timeouts)
+        # DriverStaging; when set, switches rebind already staged packages
+        self.staging = staging
+        # RevertPoints; when set, each switch records the package it replaces
+        # and revert() can rebind it
+        self.reverts = reverts
+        # During switch_many(): INF path -> the one pnputil /add-driver task of the batch
+        self._batch_installs = None
+        # During switch_many(): INF path -> published name staged up front (None if it failed)
+        self._batch_packages = None
+        self.classifier = ServiceClassifier(
+            dict((family, service_markers(config, family)) for family in DRIVERS)
+        )
+
+    def switch(self, current_driver, progress=None, device=None, target=None, cached=None):
+        """Blocking form of switch_async() for scripts, the CLI and benchmarks."""
+        return run_sync(self.switch_async(current_driver, progress, device, target, cached))
+
+    async def switch_async(self, current_driver, progress=None, device=None, target=None,
+                           cached=None, package=None):
+        """
+        Switch the laser away from `current_driver` (or to `target`).
+        With `device` given, only that instance is switched; otherwise the
+        preferred matching device is looked up. `cached` is a DeviceInfo from an
+        earlier detection: it is re-queried on its own and only falls back to a
+        full lookup if it has gone away. `package` is a published oemNN.inf to
+        bind as-is, without staging or uninstalling first (see revert_async()).
+        Returns a SwitchResult; never raises, and a cancelled switch returns a
+        failed result.
+        """
+        report = progress or (lambda message: None)
+        timings = {}
+        details = {}
+        start = time.perf_counter()
+        with span("switch", backend=self.backend.name, current=current_driver) as info:
+            try:
+                result = await self._switch(current_driver, report, timings, details, device,
+                                            target, cached, package)
+            except asyncio.CancelledError:
+                result = SwitchResult(False, "Switch cancelled.", target, "", timings)
+            except Exception as e:
+                result = SwitchResult(False, f"Unexpected error: {str(e)}", None, "", timings)
+            result = result._replace(**details)
+            info.update(target=result.target, success=result.success, service=result.service)
+        timings['total'] = time.perf_counter() - start
+        if self.history is not None:
+            self.history.record_switch(result, current_driver, self.backend.name)
+        return result
+
+    def revert(self, progress=None, device=None, cached=None):
+        """Blocking form of revert_async()."""
+        return run_sync(self.revert_async(progress, device, cached))
+
+    async def revert_async(self, progress=None, device=None, cached=None):
+        """
+        Put back the driver the last switch of this laser replaced by binding
+        its recorded package straight onto the device. Falls back to a full
+        switch to that driver family if the package has left the driver store.
+        `device` and `cached` are as for switch_async(). Returns a SwitchResult.
+        """
+        report = progress or (lambda message: None)
+        if self.reverts is None:
+            return SwitchResult(False, "No previous driver recorded.", None, "", {})
+        try:
+            if device is None and cached is not None:
+                device = await self._step('lookup', 'find_instance', cached.instance_id)
+            if device is None:
+                device = await self._step(
+                    'lookup', 'find_device', self.config.get('hardware_id', DEFAULT_HARDWARE_ID)
+                )
+        except Exception as e:
+            return SwitchResult(False, f"Failed to find device: {str(e)}", None, "", {})
+        if device is None:
+            return SwitchResult(False, "Device not found. Ensure laser is connected.", None,
+                                "", {})
+
+        point = self.reverts.get(device.instance_id)
+        if point is None or point.get('family') not in DRIVERS:
+            return SwitchResult(False, "No previous driver recorded for this laser.", None,
+                                device.service, {})
+        target = point['family']
+        if (device.inf_name or "").lower() == point['inf_name'].lower():
+            return SwitchResult(True, f"{DRIVERS[target]['name']} driver already active.",
+                                target, device.service, {})
+
+        current = self.classifier.classify(device.service)
+        try:
+            staged = await run_blocking(self.backend.is_staged, point['inf_name'])
+        except Exception:
+            staged = False
+        if not staged:
+            report("Previous driver package is gone, reinstalling...")
+            return await self.switch_async(current, progress, device, target)
+        report(f"Reverting to {point['inf_name']} ({point.get('driver_version') or 'unknown'})...")
+        return await self.switch_async(current, progress, device, target,
+                                       package=point['inf_name'])
+
+    @staticmethod
+    @contextmanager
+    def _phase(timings, name):
+        """Trace one phase and record its wall time into `timings`."""
+        start = time.perf_counter()
+        try:
+            with span(name):
+                yield
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    def _step(self, name, op, *args, **kwargs):
+        """Backend operation `op` as an awaitable bounded by step `name`'s timeout."""
+        return within(name, self.backend.call_async(op, *args, **kwargs),
+                      self.timeouts.step(name))
+
+    def switch_many(self, devices, target, max_workers=None, progress=None):
+        """Blocking form of switch_many_async()."""
+        return run_sync(self.switch_many_async(devices, target, max_workers, progress))
+
+    async def switch_many_async(self, devices, target, max_workers=None, progress=None):
+        """
+        Switch several devices to `target` concurrently, at most `max_workers`
+        at a time. Progress messages are prefixed with the device instance ID.
+        pnputil /add-driver /install and the consolidated script install on
+        every board with the hardware ID, so the package is staged once and
+        bound to each selected instance instead, whatever the switch mode. If
+        it cannot be staged, only a selection of every board goes ahead.
+        """
+        if max_workers is None:
+            max_workers = int(self.config.get('max_parallel_switches', DEFAULT_MAX_PARALLEL))
+        report = progress or (lambda message: None)
+        workers = max(1, min(max_workers, len(devices)))
+        slots = asyncio.Semaphore(workers)
+        start = time.perf_counter()
+
+        target_path = self.config[DRIVERS[target]['config_key']]
+        published = await self._stage_batch_package(target_path)
+        if published is None and not await self._selects_every_board(devices):
+            message = (f"Could not stage the {DRIVERS[target]['name']} driver package. "
+                       "Installing it without staging would also switch the lasers "
+                       "that were not selected.")
+            return MultiSwitchResult(
+                [(device, SwitchResult(False, message, target, device.service, {'total': 0.0}))
+                 for device in devices],
+                time.perf_counter() - start
+            )
+
+        async def run(device):
+            async with slots:
+                return await self.switch_async(
+                    self.classifier.classify(device.service),
+                    progress=lambda message: report(f"{device.instance_id}: {message}"),
+                    device=device,
+                    target=target
+                )
+
+        self._batch_installs = {}
+        self._batch_packages = {target_path: published}
+        try:
+            with span("switch_many", target=target, devices=len(devices), workers=workers):
+                results = await asyncio.gather(*[run(device) for device in devices])
+        finally:
+            self._batch_installs = None
+            self._batch_packages = None
+        return MultiSwitchResult(list(zip(devices, results)), time.perf_counter() - start)
+
+    async def _stage_batch_package(self, inf_path):
+        """Stage a switch_many() target package once, through the DriverStaging
+        store when there is one. Returns the published name or None."""
+        if self.staging is not None:
+            stage = run_blocking(self.staging.ensure_staged, self.backend, inf_path)
+        else:
+            stage = self.backend.call_async('stage_driver', inf_path)
+        try:
+            with span("stage", batch=True):
+                return await within('stage', stage, self.timeouts.step('stage'))
+        except Exception:
+            return None
+
+    async def _selects_every_board(self, devices):
+        """True if `devices` covers every present board with the hardware ID."""
+        try:
+            present = await self._step(
+                'lookup', 'find_devices', self.config.get('hardware_id', DEFAULT_HARDWARE_ID)
+            )
+        except Exception:
+            return False
+        selected = set(device.instance_id.lower() for device in devices)
+        return all(device.instance_id.lower() in selected for device in present)
+
+    async def _switch(self, current_driver, report, timings, details, device=None, target=None,
+                      cached=None, package=None):
+        if package is None and self._batch_packages is None and \
+                self.config.get('switch_mode', DEFAULT_SWITCH_MODE) == "consolidated":
+            return await self._switch_consolidated(current_driver, report, timings, details,
+                                                   device, target, cached)
+        hw_id = self.config.get('hardware_id', DEFAULT_HARDWARE_ID)
+        # A revert binds over the current driver; uninstalling would only add a re-enumeration
+        uninstall_first = self.config.get('uninstall_first', True) and package is None
+
+        # Identify which driver we want to end up with
+        if target is None:
+            target = target_for(current_driver)
+        target_path = self.config[DRIVERS[target]['config_key']]
+        target_name = DRIVERS[target]['name']
+        expected_service_markers = service_markers(self.config, target)
+        old_service_markers = service_markers(self.config, current_driver) \
+            if current_driver in DRIVERS else []
+
+        wait_times = []
+
+        def fail(message, service=""):
+            return SwitchResult(False, message, target, service, timings)
+
+        def service_of(instance_id):
+            return lambda: self.backend.call_async('get_service', instance_id)
+
+        # Validate/stage the target package while the device is looked up
+        staging = asyncio.ensure_future(
+            self._staged_package(target_path, timings) if package is None else _ready(package)
+        )
+        uninstalled = False
+        # Set before the uninstall starts: a cancelled switch must wait for it
+        uninstall = None
+        try:
+            # Find device instance ID (unless the caller picked one)
+            single_instance = device is not None
+            if device is None:
+                try:
+                    with self._phase(timings, 'lookup'):
+                        if cached is not None:
+                            device = await self._step('lookup', 'find_instance', cached.instance_id)
+                        if device is None:
+                            device = await self._step('lookup', 'find_device', hw_id)
+                except Exception as e:
+                    return fail(f"Failed to find device: {str(e)}")
+                if device is None:
+                    return fail("Device not found. Ensure laser is connected.")
+            device_instance = device.instance_id
+            self._record_revert_point(device, current_driver, hw_id)
+
+            # Step 1: Uninstall old driver if enabled
+            if uninstall_first:
+                report("Uninstalling old driver...")
+                # Its own task, shielded: cancelling the switch does not stop the
+                # worker thread removing the device node, so it must be waited for
+                uninstall = asyncio.ensure_future(
+                    self.backend.call_async('uninstall', device_instance)
+                )
+                try:
+                    with self._phase(timings, 'uninstall'):
+                        uninstalled = await within('uninstall', asyncio.shield(uninstall),
+                                                   self.timeouts.step('uninstall'))
+                    if uninstalled:
+                        # Wait until Windows has released the old driver
+                        with self._phase(timings, 'uninstall_wait'):
+                            waited = await wait_until_async(
+                                service_of(device_instance),
+                                service_released(old_service_markers),
+                                deadline=self.timeouts.wait('uninstall_wait')
+                            )
+                        wait_times.append(f"Uninstall settled in {waited.elapsed:.1f}s")
+                except Exception:
+                    # Continue even if uninstall fails
+                    pass
+
+            # Step 2: Install new driver - bind the staged package when we have one
+            published = await staging
+            force = self.config.get('force_install', True)
+            report(f"Installing {target_name} driver...")
+            try:
+                details['strategy'] = "revert" if package else \
+                    "bind" if published else "add_driver"
+                if published:
+                    if uninstalled:
+                        # The device must be back in the tree before it can be bound
+                        report("Scanning for hardware changes...")
+                        with self._phase(timings, 'scan'):
+                            await self._step('scan', 'rescan')
+                        with self._phase(timings, 'reenumerate'):
+                            await wait_until_async(
+                                service_of(device_instance),
+                                device_present,
+                                deadline=self.timeouts.wait('reenumerate')
+                            )
+                    with self._phase(timings, 'bind'):
+                        res = await self._step(
+                            'bind', 'bind_driver', hw_id, published, force=force,
+                            instance_id=device_instance if single_instance else None
+                        )
+                else:
+                    with self._phase(timings, 'add_driver'):
+                        res = await self._add_driver(target_path, force)
+
+                # Check for success codes (0 = Success, 3010 = Reboot Required)
+                details['returncode'] = res.returncode
+                success = res.returncode == 0 or res.returncode == 3010
+                restart_required = res.returncode == 3010
+                log_msg = res.stdout if success else res.stderr
+
+                if not success:
+                    return fail(f"Driver installation failed:\n{log_msg}")
+
+                if restart_required:
+                    # If restart is required, we can't verify effectively without reboot
+                    return SwitchResult(
+                        True,
+                        f"{target_name} driver installed.\n\n"
+                        "IMPORTANT: Restart your computer to complete the update.",
+                        target,
+                        "",
+                        timings
+                    )
+
+                # Step 3: Scan for hardware changes (a direct bind needs none)
+                if not published:
+                    report("Scanning for hardware changes...")
+                    try:
+                        with self._phase(timings, 'scan'):
+                            await self._step('scan', 'rescan')
+                    except Exception:
+                        pass
+
+                # Step 4: Verification - poll until the new driver is bound
+                report("Verifying installation...")
+                with self._phase(timings, 'verify'):
+                    waited = await wait_until_async(
+                        service_of(device_instance),
+                        service_matches(expected_service_markers),
+                        deadline=self.timeouts.wait('verify')
+                    )
+                wait_times.append(f"Driver bound in {waited.elapsed:.1f}s")
+                current_service = waited.value or ""
+                timing_note = "\n".join(wait_times)
+
+                if waited.ready:
+                    return SwitchResult(
+                        True,
+                        f"{target_name} driver installed and verified!\n\n{timing_note}",
+                        target,
+                        current_service,
+                        timings
+                    )
+                return fail(
+                    f"Driver was installed but device is still using '{current_service}' "
+                    f"after {waited.elapsed:.1f}s.\n\n"
+                    "Try:\n"
+                    "1. Restarting your computer\n"
+                    "2. Unplugging and replugging the laser\n"
+                    "3. Checking 'Force Install' in Settings",
+                    current_service
+                )
+
+            except Exception as e:
+                return fail(f"Installation error: {str(e)}")
+        except asyncio.CancelledError:
+            if uninstall is not None:
+                # Let an uninstall still in flight finish, then bring the device
+                # node back rather than leave the laser uninstalled
+                try:
+                    await within('uninstall', uninstall, self.timeouts.step('uninstall'))
+                except Exception:
+                    pass
+                try:
+                    await self._step('scan', 'rescan')
+                except Exception:
+                    pass
+            raise
+        finally:
+            if not staging.done():
+                staging.cancel()
+
+    async def _switch_consolidated(self, current_driver, report, timings, details, device=None,
+                                   target=None, cached=None):
+        """Run the switch as a single backend.run_switch() call and translate its report.
+        The script looks the device up itself; `cached` (the detected DeviceInfo)
+        only supplies the revert point when the script acted on that instance."""
+        if target is None:
+            target = target_for(current_driver)
+        target_name = DRIVERS[target]['name']
+        plan = SwitchPlan(
+            hw_id=self.config.get('hardware_id', DEFAULT_HARDWARE_ID),
+            instance_id=device.instance_id if device is not None else None,
+            inf_path=self.config[DRIVERS[target]['config_key']],
+            uninstall_first=self.config.get('uninstall_first', True),
+            force=self.config.get('force_install', True),
+            old_markers=service_markers(self.config, current_driver)
+            if current_driver in DRIVERS else [],
+            expected_markers=service_markers(self.config, target),
+            uninstall_wait=self.timeouts.wait('uninstall_wait'),
+            verify_wait=self.timeouts.wait('verify'),
+        )
+
+        def fail(message, service=""):
+            return SwitchResult(False, message, target, service, timings)
+
+        if device is not None:
+            self._record_revert_point(device, current_driver, plan.hw_id)
+        report(f"Switching to {target_name} driver...")
+        details['strategy'] = "consolidated"
+        try:
+            with span("run_switch", mode="consolidated") as info:
+                outcome = await self._step('run_switch', 'run_switch', plan)
+                info.update(returncode=outcome['returncode'], verified=outcome['verified'])
+        except Exception as e:
+            return fail(f"Installation error: {str(e)}")
+        for step in outcome['steps']:
+            timings[step['name']] = step['seconds']
+
+        if outcome['instance_id'] is None:
+            return fail("Device not found. Ensure laser is connected.")
+        if device is None and cached is not None and \
+                cached.instance_id.lower() == outcome['instance_id'].lower():
+            self._record_revert_point(cached, current_driver, plan.hw_id)
+        returncode = outcome['returncode']
+        details['returncode'] = returncode
+        if returncode not in (0, 3010):
+            return fail(f"Driver installation failed:\n{outcome['output']}")
+        if returncode == 3010:
+            return SwitchResult(
+                True,
+                f"{target_name} driver installed.\n\n"
+                "IMPORTANT: Restart your computer to complete the update.",
+                target,
+                "",
+                timings
+            )
+
+        service = outcome['service']
+        step_note = ", ".join(f"{step['name']} {step['seconds']:.1f}s" for step in outcome['steps'])
+        if outcome['verified']:
+            return SwitchResult(
+                True,
+                f"{target_name} driver installed and verified!\n\n{step_note}",
+                target,
+                service,
+                timings
+            )
+        return fail(
+            f"Driver was installed but device is still using '{service}' "
+            f"after {timings.get('verify', 0.0):.1f}s.\n\n"
+            "Try:\n"
+            "1. Restarting your computer\n"
+            "2. Unplugging and replugging the laser\n"
+            "3. Checking 'Force Install' in Settings",
+            service
+        )
+
+    def _record_revert_point(self, device, current_driver, hw_id):
+        """Remember the package about to be replaced so revert() can rebind it."""
+        if self.reverts is None or current_driver not in DRIVERS:
+            return
+        try:
+            self.reverts.record(device, current_driver, hw_id)
+        except Exception:
+            pass
+
+    async def _add_driver(self, inf_path, force):
+        """
+        pnputil /add-driver /install. It installs on every device with the
+        hardware ID, so in a switch_many() batch it runs once per package and
+        the other boards wait for that run instead of contending for the
+        driver store with copies of it.
+        """
+        if self._batch_installs is None:
+            return await self._step('add_driver', 'add_driver', inf_path, install=True, force=force)
+        install = self._batch_installs.get(inf_path)
+        if install is None:
+            install = asyncio.ensure_future(
+                self._step('add_driver', 'add_driver', inf_path, install=True, force=force)
+            )
+            self._batch_installs[inf_path] = install
+        # One board being cancelled must not cancel the install the others wait for
+        return await asyncio.shield(install)
+
+    async def _staged_package(self, inf_path, timings):
+        """Published name of the staged target package, staging it if needed.
+        Returns None (fall back to pnputil /add-driver) if staging is off or fails."""
+        if self._batch_packages is not None:
+            # switch_many_async() staged it for the whole batch
+            return self._batch_packages.get(inf_path)
+        if self.staging is None or not self.config.get('use_staged_drivers', True):
+            return None
+        timeout = self.timeouts.step('stage')
+        try:
+            with self._phase(timings, 'stage'):
+                return await within(
+                    'stage', run_blocking(self.staging.ensure_staged, self.backend, inf_path),
+                    timeout
+                )
+        except Exception:
+            return None
+
+
+async def _ready(value):
+    return value
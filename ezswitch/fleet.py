@@ -0,0 +1,179 @@
+"""
+Fleet switching
+Runs --status / --switch on many shop PCs at once. Every host runs the broker
+as a TCP agent:
+
+    EZ_LightBurn_Driver_Switch.py --serve-broker --listen 0.0.0.0:47800 --key-file fleet.key
+
+and this side fans a request out to all of them with a bounded number in
+flight and a timeout per host, then aggregates one report.
+
+Inventory (fleet.json):
+    {"key_file": "fleet.key", "max_parallel": 8, "timeout": 120,
+     "hosts": [{"name": "cell-1", "address": "10.0.0.21:47800"},
+               {"name": "cell-2", "address": "10.0.0.22:47800"}]}
+
+Transports are pluggable: "broker" talks to a TCP broker; "local" calls an
+in-process handler, which is how the fan-out is exercised without a shop
+network (a stand-in agent on 127.0.0.1 works too, on any OS).
+"""
+
+import asyncio
+import json
+import time
+from collections import namedtuple
+
+from ezswitch.aio import StepTimeout, run_daemon, run_sync, within
+from ezswitch.broker import BrokerClient, load_or_create_key, parse_address
+from ezswitch.tracing import span
+
+FLEET_FILE = "fleet.json"
+DEFAULT_FLEET_PARALLEL = 8
+DEFAULT_HOST_TIMEOUT = 120
+
+Host = namedtuple('Host', ['name', 'address', 'transport'])
+# exit is the broker's exit code (None if the host never answered)
+HostResult = namedtuple('HostResult', ['host', 'ok', 'exit', 'message', 'elapsed', 'data'])
+FleetReport = namedtuple('FleetReport', ['op', 'results', 'elapsed'])
+
+
+class Transport:
+    """How a request reaches one host."""
+
+    def request(self, host, op, timeout, **params):
+        """Send one request; returns the broker reply {"exit", "data", "text"}."""
+        raise NotImplementedError
+
+
+class BrokerTransport(Transport):
+    """TCP connection to a host's broker, authenticated with the shared key."""
+
+    def __init__(self, authkey):
+        self.authkey = authkey
+
+    def request(self, host, op, timeout, **params):
+        client = BrokerClient.connect(parse_address(host.address), authkey=self.authkey)
+        if client is None:
+            raise ConnectionError(f"No broker at {host.address}")
+        try:
+            return client.request(op, timeout=timeout, **params)
+        finally:
+            client.close()
+
+
+class LocalTransport(Transport):
+    """Calls in-process handlers (e.g. cli.BrokerHandler) by host name."""
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+
+    def request(self, host, op, timeout, **params):
+        params['op'] = op
+        return self.handlers[host.name](params)
+
+
+def load_inventory(path=FLEET_FILE):
+    """Read an inventory file. Returns (hosts, settings)."""
+    with open(path, 'r') as f:
+        inventory = json.load(f)
+    hosts = [
+        Host(entry.get('name') or entry['address'], entry.get('address', ""),
+             entry.get('transport', "broker"))
+        for entry in inventory.get('hosts', [])
+    ]
+    settings = dict((key, value) for key, value in inventory.items() if key != 'hosts')
+    return hosts, settings
+
+
+def default_transports(settings):
+    """Transports for an inventory's settings (the broker needs the shared key)."""
+    transports = {}
+    if settings.get('key_file'):
+        transports["broker"] = BrokerTransport(load_or_create_key(settings['key_file']))
+    return transports
+
+
+class Fleet:
+    """Fans one request out to many hosts."""
+
+    def __init__(self, hosts, transports, max_parallel=DEFAULT_FLEET_PARALLEL,
+                 timeout=DEFAULT_HOST_TIMEOUT):
+        self.hosts = list(hosts)
+        self.transports = transports
+        self.max_parallel = max(1, int(max_parallel))
+        self.timeout = float(timeout)
+
+    def run(self, op, **params):
+        """Blocking form of run_async()."""
+        return run_sync(self.run_async(op, **params))
+
+    async def run_async(self, op, **params):
+        """Send `op` to every host. Returns a FleetReport; never raises."""
+        slots = asyncio.Semaphore(self.max_parallel)
+        start = time.perf_counter()
+
+        async def run_host(host):
+            async with slots:
+                return await self._run_host(host, op, params)
+
+        with span("fleet", cat="fleet", op=op, hosts=len(self.hosts)):
+            results = await asyncio.gather(*[run_host(host) for host in self.hosts])
+        return FleetReport(op, list(results), time.perf_counter() - start)
+
+    async def _run_host(self, host, op, params):
+        start = time.perf_counter()
+        with span(f"fleet.{op}", cat="fleet", host=host.name) as info:
+            transport = self.transports.get(host.transport)
+            try:
+                if transport is None:
+                    raise ValueError(f"No '{host.transport}' transport configured")
+                # A host that accepts but never answers can block the connect
+                # handshake forever; the daemon thread is simply left behind
+                reply = await within(
+                    host.name,
+                    run_daemon(transport.request, host, op, self.timeout, **params),
+                    self.timeout
+                )
+            except StepTimeout:
+                result = HostResult(host, False, None, f"No answer within {self.timeout:g}s",
+                                    time.perf_counter() - start, {})
+            except Exception as e:
+                result = HostResult(host, False, None, f"Unreachable: {e}",
+                                    time.perf_counter() - start, {})
+            else:
+                if 'exit' in reply:
+                    result = HostResult(host, reply['exit'] == 0, reply['exit'], reply['text'],
+                                        time.perf_counter() - start, reply.get('data', {}))
+                else:
+                    result = HostResult(host, False, None, reply.get('error', "Bad reply"),
+                                        time.perf_counter() - start, {})
+            info.update(ok=result.ok, exit=result.exit)
+        return result
+
+
+def report_summary(report):
+    """(JSON data, text) aggregating a FleetReport."""
+    answered = [r for r in report.results if r.exit is not None]
+    data = {
+        "op": report.op,
+        "hosts": len(report.results),
+        "succeeded": sum(1 for r in report.results if r.ok),
+        "failed": sum(1 for r in answered if not r.ok),
+        "unreachable": len(report.results) - len(answered),
+        "elapsed": round(report.elapsed, 3),
+        "results": [
+            {"host": r.host.name, "address": r.host.address, "ok": r.ok, "exit": r.exit,
+             "message": r.message, "elapsed": round(r.elapsed, 3), "data": r.data}
+            for r in report.results
+        ],
+    }
+    lines = []
+    for r in report.results:
+        mark = "✓" if r.ok else "✗"
+        summary = (r.message or "").split('\n')[0]
+        lines.append(f"{mark} {r.host.name:<20} {r.elapsed:6.1f}s  {summary}")
+    lines.append(
+        f"\n{data['succeeded']}/{data['hosts']} succeeded, {data['failed']} failed, "
+        f"{data['unreachable']} unreachable in {report.elapsed:.1f}s"
+    )
+    return data, "\n".join(lines)
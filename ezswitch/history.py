@@ -0,0 +1,172 @@
+"""
+Switch history
+Every detection and switch is appended to a compact JSON-lines file
+(switch_history.jsonl) that rotates by size, so it can be left running on a
+shop PC indefinitely. The report aggregates success rate and p50/p95 phase
+durations per machine; histories copied from several PCs can be combined.
+
+Report: python -m ezswitch.history [--json] [history files...]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+from ezswitch.stats import summarize
+
+HISTORY_FILE = "switch_history.jsonl"
+HISTORY_MAX_BYTES = 512 * 1024
+HISTORY_BACKUPS = 2
+
+
+class HistoryStore:
+    """Appends history entries, rotating the file when it grows too large."""
+
+    def __init__(self, path=HISTORY_FILE, max_bytes=HISTORY_MAX_BYTES,
+                 backup_count=HISTORY_BACKUPS, machine=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.machine = machine or platform.node() or "unknown"
+        self._lock = threading.Lock()
+
+    def record_switch(self, result, current_driver, backend):
+        """Record a SwitchResult."""
+        return self._append({
+            "kind": "switch",
+            "from": current_driver,
+            "to": result.target,
+            "strategy": result.strategy,
+            "backend": backend,
+            "ok": result.success,
+            # Verified: the new service was seen bound (not just a 3010 reboot request)
+            "verified": bool(result.success and result.service),
+            "rc": result.returncode,
+            "phases": dict((name, round(seconds, 3)) for name, seconds in result.timings.items()),
+        })
+
+    def record_detection(self, elapsed, status, devices, backend):
+        """Record one detection (status of the preferred device, device count)."""
+        return self._append({
+            "kind": "detect",
+            "backend": backend,
+            "ok": status not in ("error", "timeout", "not found"),
+            "status": status,
+            "devices": devices,
+            "phases": {"detect": round(elapsed, 3)},
+        })
+
+    def entries(self):
+        """All recorded entries of this store, oldest first."""
+        return read_history([self.path], self.backup_count)
+
+    def _append(self, entry):
+        entry = dict({"ts": round(time.time(), 3), "host": self.machine}, **entry)
+        line = json.dumps(entry, separators=(',', ':')) + "\n"
+        with self._lock:
+            try:
+                if os.path.exists(self.path) and \
+                        os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError:
+                pass
+        return entry
+
+    def _rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+def read_history(paths, backups=HISTORY_BACKUPS):
+    """Entries from history files and their rotated backups, oldest first."""
+    entries = []
+    for path in paths:
+        files = [f"{path}.{index}" for index in range(backups, 0, -1)] + [path]
+        for name in files:
+            if not os.path.exists(name):
+                continue
+            with open(name, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+    return sorted(entries, key=lambda entry: entry.get('ts', 0))
+
+
+def history_report(entries):
+    """Per machine: switch/detection counts, success and verified rates and
+    p50/p95 per phase (seconds)."""
+    machines = {}
+    for entry in entries:
+        host = machines.setdefault(entry.get('host', "unknown"), {
+            "switches": 0, "succeeded": 0, "verified": 0, "detections": 0,
+            "detected": 0, "strategies": {}, "phases": {},
+        })
+        if entry.get('kind') == 'switch':
+            host['switches'] += 1
+            host['succeeded'] += 1 if entry.get('ok') else 0
+            host['verified'] += 1 if entry.get('verified') else 0
+            strategy = entry.get('strategy') or "none"
+            host['strategies'][strategy] = host['strategies'].get(strategy, 0) + 1
+        else:
+            host['detections'] += 1
+            host['detected'] += 1 if entry.get('ok') else 0
+        for name, seconds in (entry.get('phases') or {}).items():
+            host['phases'].setdefault(name, []).append(seconds)
+
+    report = {}
+    for name, host in sorted(machines.items()):
+        switches = host['switches']
+        report[name] = {
+            "switches": switches,
+            "success_rate": round(host['succeeded'] / float(switches), 3) if switches else None,
+            "verified_rate": round(host['verified'] / float(switches), 3) if switches else None,
+            "strategies": host['strategies'],
+            "detections": host['detections'],
+            "detect_rate": round(host['detected'] / float(host['detections']), 3)
+            if host['detections'] else None,
+            "phases": dict((phase, summarize(values))
+                           for phase, values in sorted(host['phases'].items())),
+        }
+    return report
+
+
+def format_report(report):
+    """Plain-text table of history_report() output."""
+    lines = []
+    for name, host in report.items():
+        rate = "-" if host['success_rate'] is None else f"{host['success_rate'] * 100:.0f}%"
+        lines.append(f"{name}: {host['switches']} switches, {rate} succeeded, "
+                     f"{host['detections']} detections")
+        for phase, stats in host['phases'].items():
+            lines.append(f"    {phase:<16} n={stats['count']:<5} p50={stats['p50']:.2f}s  "
+                         f"p95={stats['p95']:.2f}s  max={stats['max']:.2f}s")
+    return "\n".join(lines) if lines else "No history recorded yet."
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Switch history report")
+    parser.add_argument("files", nargs="*", default=[HISTORY_FILE],
+                        help="History files (one per machine, rotated backups included)")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    args = parser.parse_args(argv)
+    report = history_report(read_history(args.files))
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+INF package content cache
+Records a content hash of each configured driver package (the INF plus the
+.sys/.cat files it references). Entries are keyed by path, size and mtime,
+so an unchanged package is recognised from a few stat() calls and only a
+changed or replaced driver folder is re-hashed.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+INF_CACHE_FILE = "inf_cache.json"
+
+_SECTION = re.compile(r"^\s*\[([^\]]+)\]")
+_CATALOG = re.compile(r"^\s*CatalogFile(\.[\w.]+)?\s*=\s*(.+?)\s*$", re.IGNORECASE)
+
+
+def read_inf_text(inf_path):
+    """Decode an INF file (UTF-16 with BOM, UTF-8 with BOM, or ANSI)."""
+    with open(inf_path, 'rb') as f:
+        raw = f.read()
+    if raw.startswith(b'\xff\xfe') or raw.startswith(b'\xfe\xff'):
+        return raw.decode('utf-16', 'replace')
+    if raw.startswith(b'\xef\xbb\xbf'):
+        return raw[3:].decode('utf-8', 'replace')
+    return raw.decode('latin-1')
+
+
+def referenced_files(inf_path):
+    """
+    Files shipped with an INF package: catalogs (CatalogFile=) and every
+    entry of the [SourceDisksFiles*] sections that exists next to the INF.
+    Returns sorted paths relative to the INF's folder.
+    """
+    base = os.path.dirname(os.path.abspath(inf_path))
+    names = set()
+    section = ""
+    for line in read_inf_text(inf_path).splitlines():
+        line = line.split(';', 1)[0].strip()
+        if not line:
+            continue
+        header = _SECTION.match(line)
+        if header:
+            section = header.group(1).strip().lower()
+            continue
+        catalog = _CATALOG.match(line)
+        if catalog:
+            names.add(catalog.group(2).strip('"'))
+        elif section.startswith("sourcedisksfiles"):
+            name, _, value = line.partition('=')
+            fields = [field.strip() for field in value.split(',')]
+            subdir = fields[1] if len(fields) > 1 and fields[1] else ""
+            names.add(os.path.join(subdir, name.strip().strip('"')))
+
+    found = []
+    for name in names:
+        if os.path.isfile(os.path.join(base, name)):
+            found.append(os.path.normpath(name))
+    return sorted(found)
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+class InfCache:
+    """Persistent content hashes of driver packages."""
+
+    def __init__(self, path=INF_CACHE_FILE):
+        self.path = path
+        self.entries = {}
+        self.hashed = 0  # number of packages actually re-hashed this session
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def key(inf_path):
+        return os.path.normcase(os.path.abspath(inf_path))
+
+    def digest(self, inf_path):
+        """Content hash of the package, re-hashed only if something changed."""
+        key = self.key(inf_path)
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry is not None and self._unchanged(inf_path, entry):
+            return entry['digest']
+
+        entry = self._hash_package(inf_path)
+        with self._lock:
+            self.entries[key] = entry
+            self.hashed += 1
+            self._save()
+        return entry['digest']
+
+    def _unchanged(self, inf_path, entry):
+        base = os.path.dirname(os.path.abspath(inf_path))
+        try:
+            if _stat_key(inf_path) != entry['stat']:
+                return False
+            for name, stat in entry['files'].items():
+                if _stat_key(os.path.join(base, name)) != stat:
+                    return False
+        except OSError:
+            return False
+        return True
+
+    def _hash_package(self, inf_path):
+        base = os.path.dirname(os.path.abspath(inf_path))
+        sha = hashlib.sha256()
+        files = {}
+        stat = _stat_key(inf_path)
+        with open(inf_path, 'rb') as f:
+            sha.update(f.read())
+        for name in referenced_files(inf_path):
+            path = os.path.join(base, name)
+            files[name] = _stat_key(path)
+            sha.update(b"\0" + name.lower().encode('utf-8') + b"\0")
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha.update(chunk)
+        return {"stat": stat, "files": files, "digest": sha.hexdigest()}
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except Exception:
+            self.entries = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(self.entries, f, indent=4)
+        except OSError:
+            pass
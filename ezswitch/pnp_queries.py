@@ -0,0 +1,217 @@
+"""
+PnP query scripts
+Builds the PowerShell used to find the laser controller. Lookups ask PnP for
+the configured USB instance-ID prefix directly, so Windows filters at the
+source instead of materializing every device on the machine first.
+"""
+
+import json
+import re
+
+# Revision suffix is part of the hardware ID but never of the instance ID
+_REV_SUFFIX = re.compile(r"&REV_[0-9A-F]+$", re.IGNORECASE)
+_USB_ID = re.compile(r"^(USB\\)?VID_[0-9A-F]{4}&PID_[0-9A-F]{4}", re.IGNORECASE)
+
+
+def instance_id_pattern(hw_id):
+    """
+    Convert a configured hardware ID to a Get-PnpDevice -InstanceId wildcard.
+    Returns None if the ID is not a USB VID/PID and needs the full scan.
+    """
+    hw_id = hw_id.strip()
+    if not _USB_ID.match(hw_id):
+        return None
+    if not hw_id.upper().startswith("USB\\"):
+        hw_id = "USB\\" + hw_id
+    return _REV_SUFFIX.sub("", hw_id) + "*"
+
+
+def exact_hardware_id(hw_id):
+    """Full USB hardware ID (e.g. USB\\VID_9588&PID_9899) or None if not USB."""
+    pattern = instance_id_pattern(hw_id)
+    return pattern[:-1] if pattern else None
+
+
+def _id_list(hw_id):
+    return [hw_id] if isinstance(hw_id, str) else list(hw_id)
+
+
+def legacy_device_source(hw_id):
+    """Original pipeline: enumerate every device, then filter by hardware ID(s)."""
+    tests = " -or ".join(f'$_.HardwareID -like "*{item}*"' for item in _id_list(hw_id))
+    return f'Get-PnpDevice | Where-Object {{{tests}}}'
+
+
+def device_source(hw_id):
+    """
+    PowerShell expression yielding the devices matching a hardware ID, or
+    any of a list of them (one query for every board profile).
+    """
+    ids = _id_list(hw_id)
+    patterns = [instance_id_pattern(item) for item in ids]
+    if None in patterns:
+        return legacy_device_source(ids)
+    quoted = ",".join(f"'{pattern}'" for pattern in patterns)
+    return f"Get-PnpDevice -InstanceId {quoted} -ErrorAction SilentlyContinue"
+
+
+# Prefix of the JSON line printed by device_records_script()
+DEVICES_MARKER = "#EZLBS-DEVICES#"
+
+
+def instance_source(instance_id):
+    """PowerShell expression yielding one device instance (if present)."""
+    escaped = instance_id.replace("'", "''")
+    return f"Get-PnpDevice -InstanceId '{escaped}' -ErrorAction SilentlyContinue"
+
+
+def device_records_script(source):
+    """
+    Script printing every device from `source` as one JSON array: instance
+    ID, status, service, driver INF, driver version and problem code.
+    """
+    return f"""
+    $records = @({source}) | ForEach-Object {{
+        $props = @{{}}
+        Get-PnpDeviceProperty -InstanceId $_.InstanceId -ErrorAction SilentlyContinue `
+            -KeyName 'DEVPKEY_Device_DriverInfPath', 'DEVPKEY_Device_DriverVersion' |
+            ForEach-Object {{ $props[$_.KeyName] = $_.Data }}
+        [ordered]@{{
+            instance_id = $_.InstanceId
+            status = "$($_.Status)"
+            service = "$($_.Service)"
+            inf_name = $props['DEVPKEY_Device_DriverInfPath']
+            driver_version = $props['DEVPKEY_Device_DriverVersion']
+            problem_code = [int]$_.ConfigManagerErrorCode
+        }}
+    }}
+    '{DEVICES_MARKER}' + (ConvertTo-Json -InputObject @($records) -Compress -Depth 3)
+    """
+
+
+def select_device_script(hw_id, fields, source=None):
+    """
+    Script printing the given properties of the preferred matching device,
+    one per line, or "Not Found". Active (Status OK) devices are preferred.
+    """
+    if source is None:
+        source = device_source(hw_id)
+    lines = "\n        ".join(f"$target.{field}" for field in fields)
+    return f"""
+    $devices = @({source})
+    if ($devices) {{
+        $target = $devices | Where-Object {{$_.Status -eq 'OK'}} | Select-Object -First 1
+        if (-not $target) {{ $target = $devices | Select-Object -First 1 }}
+        {lines}
+    }} else {{
+        "Not Found"
+    }}
+    """
+
+
+# Whole switch in one PowerShell run (consolidated switch mode). The plan is
+# injected as JSON; the script prints one JSON report line after SWITCH_MARKER.
+SWITCH_MARKER = "#EZLBS-SWITCH#"
+
+_SWITCH_BODY = r"""
+$steps = New-Object System.Collections.ArrayList
+$report = [ordered]@{
+    instance_id = $plan.instance_id; returncode = $null; service = ''
+    verified = $false; output = ''; steps = $steps
+}
+
+function Add-Step($name, $status, $watch, $detail) {
+    [void]$steps.Add([ordered]@{
+        name = $name; status = $status
+        ms = [int]$watch.Elapsed.TotalMilliseconds; detail = "$detail"
+    })
+}
+
+function Get-BoundService($id) {
+    $device = Get-PnpDevice -InstanceId $id -ErrorAction SilentlyContinue
+    if ($device) { "$($device.Service)".ToLower() } else { 'not found' }
+}
+
+function Test-Markers($service, $markers) {
+    foreach ($marker in $markers) { if ($service -like "*$marker*") { return $true } }
+    return $false
+}
+
+# Poll with exponential backoff (same schedule as readiness.wait_until)
+function Wait-Service($id, $deadline, [scriptblock]$isReady) {
+    $watch = [Diagnostics.Stopwatch]::StartNew()
+    $delay = 100
+    while ($true) {
+        $service = Get-BoundService $id
+        if (& $isReady $service) { return @{ ready = $true; service = $service } }
+        if ($watch.Elapsed.TotalSeconds -ge $deadline) { return @{ ready = $false; service = $service } }
+        Start-Sleep -Milliseconds $delay
+        $delay = [Math]::Min($delay * 2, 1000)
+    }
+}
+
+function Invoke-Switch {
+    $watch = [Diagnostics.Stopwatch]::StartNew()
+    $id = $plan.instance_id
+    if (-not $id) {
+        $devices = @(& ([ScriptBlock]::Create($plan.source)))
+        $target = $devices | Where-Object { $_.Status -eq 'OK' } | Select-Object -First 1
+        if (-not $target) { $target = $devices | Select-Object -First 1 }
+        if ($target) { $id = $target.InstanceId }
+    }
+    if (-not $id) { Add-Step 'lookup' 'failed' $watch 'Device not found'; return }
+    Add-Step 'lookup' 'ok' $watch $id
+    $report.instance_id = $id
+
+    $uninstalled = $false
+    if ($plan.uninstall_first) {
+        $watch = [Diagnostics.Stopwatch]::StartNew()
+        try {
+            Get-PnpDevice -InstanceId $id -ErrorAction Stop | Uninstall-PnpDevice -Confirm:$false -ErrorAction Stop
+            $uninstalled = $true
+            Add-Step 'uninstall' 'ok' $watch ''
+        } catch {
+            Add-Step 'uninstall' 'failed' $watch $_
+        }
+        if ($uninstalled) {
+            $watch = [Diagnostics.Stopwatch]::StartNew()
+            $old = $plan.old_markers
+            $wait = Wait-Service $id $plan.uninstall_wait { param($s) -not (Test-Markers $s $old) }
+            Add-Step 'uninstall_wait' $(if ($wait.ready) { 'ok' } else { 'timeout' }) $watch $wait.service
+        }
+    }
+
+    $watch = [Diagnostics.Stopwatch]::StartNew()
+    $arguments = @('/add-driver', $plan.inf_path, '/install')
+    if ($plan.force) { $arguments += '/force' }
+    $report.output = (& pnputil @arguments 2>&1 | Out-String)
+    $report.returncode = $LASTEXITCODE
+    $ok = $LASTEXITCODE -eq 0 -or $LASTEXITCODE -eq 3010
+    Add-Step 'add_driver' $(if ($ok) { 'ok' } else { 'failed' }) $watch "exit $LASTEXITCODE"
+    if (-not $ok -or $LASTEXITCODE -eq 3010) { return }
+
+    $watch = [Diagnostics.Stopwatch]::StartNew()
+    & pnputil /scan-devices 2>&1 | Out-Null
+    Add-Step 'scan' 'ok' $watch "exit $LASTEXITCODE"
+
+    $watch = [Diagnostics.Stopwatch]::StartNew()
+    $expected = $plan.expected_markers
+    $wait = Wait-Service $id $plan.verify_wait { param($s) Test-Markers $s $expected }
+    $report.service = $wait.service
+    $report.verified = $wait.ready
+    Add-Step 'verify' $(if ($wait.ready) { 'ok' } else { 'timeout' }) $watch $wait.service
+}
+
+Invoke-Switch
+"""
+
+
+def switch_script(plan):
+    """
+    PowerShell running a whole switch (lookup, uninstall, add-driver, scan,
+    verify) for a backend.SwitchPlan and printing a single JSON report.
+    """
+    values = dict(plan._asdict(), source=device_source(plan.hw_id))
+    header = "$plan = @'\n" + json.dumps(values) + "\n'@ | ConvertFrom-Json\n"
+    footer = f"\n'{SWITCH_MARKER}' + ($report | ConvertTo-Json -Compress -Depth 4)\n"
+    return header + _SWITCH_BODY + footer
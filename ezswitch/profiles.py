@@ -0,0 +1,118 @@
+"""
+Board profiles
+A profile describes one galvo controller family: the hardware IDs it
+enumerates as, the service names each driver binds, and the INF to install
+for each driver. Extra profiles live under "profiles" in driver_paths.json;
+the classic hardware_id / ezcad_driver / lightburn_driver settings always
+form the first one.
+
+    "profiles": [
+        {"name": "JCZ DLC2",
+         "hardware_ids": ["VID_9588&PID_9900"],
+         "services": {"EZCAD": ["dlc"], "LightBurn": ["winusb"]},
+         "drivers": {"EZCAD": "C:\\Drivers\\DLC2\\dlc.inf",
+                     "LightBurn": "C:\\Drivers\\WinUSB\\winusb.inf"}}
+    ]
+
+ProfileIndex precomputes hardware-ID and service lookups so the devices of
+every profile come back from one enumeration and are classified in one pass.
+"""
+
+import re
+from collections import namedtuple
+
+from ezswitch.engine import DEFAULT_HARDWARE_ID, DRIVERS, ServiceClassifier
+
+DEFAULT_PROFILE_NAME = "BJJCZ LMC"
+
+# services: family -> service names/markers; drivers: family -> INF path
+BoardProfile = namedtuple('BoardProfile', ['name', 'hardware_ids', 'services', 'drivers'])
+
+_VID_PID = re.compile(r"VID_[0-9A-F]{4}&PID_[0-9A-F]{4}", re.IGNORECASE)
+
+
+def default_profile(config):
+    """The profile described by the top-level configuration keys."""
+    return BoardProfile(
+        DEFAULT_PROFILE_NAME,
+        [config.get('hardware_id', DEFAULT_HARDWARE_ID)],
+        dict((family, info['markers']) for family, info in DRIVERS.items()),
+        dict((family, config.get(info['config_key'], "")) for family, info in DRIVERS.items())
+    )
+
+
+def load_profiles(config):
+    """All board profiles: the default one first, then any configured extras."""
+    base = default_profile(config)
+    profiles = [base]
+    for entry in config.get('profiles', []):
+        hardware_ids = entry.get('hardware_ids') or [entry.get('hardware_id')]
+        hardware_ids = [hw_id for hw_id in hardware_ids if hw_id]
+        if not hardware_ids:
+            continue
+        profiles.append(BoardProfile(
+            entry.get('name') or hardware_ids[0],
+            hardware_ids,
+            dict(base.services, **entry.get('services', {})),
+            dict(base.drivers, **entry.get('drivers', {}))
+        ))
+    return profiles
+
+
+def profile_config(config, profile):
+    """Copy of `config` that points the switching engine at one profile."""
+    derived = dict(config)
+    derived['hardware_id'] = profile.hardware_ids[0]
+    derived['service_markers'] = dict(profile.services)
+    for family, info in DRIVERS.items():
+        if profile.drivers.get(family):
+            derived[info['config_key']] = profile.drivers[family]
+    return derived
+
+
+class ProfileIndex:
+    """Precomputed hardware-ID -> profile and service -> driver lookups."""
+
+    def __init__(self, profiles):
+        self.profiles = list(profiles)
+        self._by_vid_pid = {}
+        self._by_fragment = []
+        self._classifiers = {}
+        hardware_ids = []
+        for profile in self.profiles:
+            for hw_id in profile.hardware_ids:
+                if hw_id not in hardware_ids:
+                    hardware_ids.append(hw_id)
+                key = _VID_PID.search(hw_id)
+                if key:
+                    # First profile wins when two claim the same board
+                    self._by_vid_pid.setdefault(key.group(0).upper(), profile)
+                else:
+                    self._by_fragment.append((hw_id.upper(), profile))
+            self._classifiers[profile.name] = ServiceClassifier(profile.services)
+        self.hardware_ids = hardware_ids
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(load_profiles(config))
+
+    def profile_for(self, instance_id):
+        """Profile a device instance belongs to, or None."""
+        key = _VID_PID.search(instance_id or "")
+        if key and key.group(0).upper() in self._by_vid_pid:
+            return self._by_vid_pid[key.group(0).upper()]
+        instance_id = (instance_id or "").upper()
+        for fragment, profile in self._by_fragment:
+            if fragment in instance_id:
+                return profile
+        return None
+
+    def classify(self, device):
+        """(profile, driver family) for a DeviceInfo. Devices whose instance ID
+        names no known board (non-USB IDs) are treated as the default profile."""
+        profile = self.profile_for(device.instance_id) or self.profiles[0]
+        return profile, self._classifiers[profile.name].classify(device.service)
+
+    def find_devices(self, backend):
+        """Every device of every profile, from a single enumeration."""
+        return backend.find_devices(self.hardware_ids)
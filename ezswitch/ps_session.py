@@ -0,0 +1,214 @@
+"""
+Persistent PowerShell session
+Starts one long-lived powershell.exe per app session and feeds it commands
+over stdin. Each reply comes back as a single framed JSON line, so startup and
+module load costs are paid once instead of on every query.
+"""
+
+import atexit
+import base64
+import itertools
+import json
+import queue
+import subprocess
+import threading
+import time
+
+from ezswitch.tracing import span
+
+# Prevents a console window flashing up (Windows only)
+NO_WINDOW = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+# Prefix marking a reply line; anything else on stdout (Write-Host etc.) is ignored
+REPLY_MARKER = "#EZLBS#"
+
+# Read-eval loop run inside the host. One JSON request per line in,
+# one marker-prefixed JSON reply per line out.
+HOST_SCRIPT = r"""
+$ErrorActionPreference = 'Continue'
+$utf8 = New-Object System.Text.UTF8Encoding $false
+$reader = New-Object System.IO.StreamReader([Console]::OpenStandardInput(), $utf8)
+$writer = New-Object System.IO.StreamWriter([Console]::OpenStandardOutput(), $utf8)
+$writer.AutoFlush = $true
+while ($true) {
+    $line = $reader.ReadLine()
+    if ($line -eq $null) { break }
+    if (-not $line.Trim()) { continue }
+    $request = $line | ConvertFrom-Json
+    $ok = $true
+    $global:LASTEXITCODE = 0
+    try {
+        $records = & ([ScriptBlock]::Create($request.script)) 2>&1
+    } catch {
+        $ok = $false
+        $records = @($_)
+    }
+    $errors = @($records | Where-Object { $_ -is [System.Management.Automation.ErrorRecord] })
+    $output = $records | Where-Object { $_ -isnot [System.Management.Automation.ErrorRecord] }
+    $reply = @{
+        id = $request.id
+        ok = $ok
+        exit = $global:LASTEXITCODE
+        stdout = ($output | Out-String)
+        stderr = ($errors | Out-String)
+    }
+    $writer.WriteLine('#EZLBS#' + ($reply | ConvertTo-Json -Compress))
+}
+"""
+
+
+class PowerShellSessionError(RuntimeError):
+    """Raised when the PowerShell host dies while running a command."""
+
+
+class PowerShellSession:
+    """A single powershell.exe host that runs scripts on request."""
+
+    def __init__(self, executable="powershell"):
+        self.executable = executable
+        self.restarts = 0
+        self._proc = None
+        self._replies = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def is_alive(self):
+        """Return True if the host process is running."""
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self):
+        """Start the host if it is not already running."""
+        with self._lock:
+            self._ensure_started()
+
+    def run(self, script, timeout=None):
+        """
+        Run a PowerShell script in the shared host.
+        Returns a subprocess.CompletedProcess so callers can treat it like
+        subprocess.run(). Raises subprocess.TimeoutExpired on timeout.
+        """
+        with self._lock, span("powershell.run", cat="process") as info:
+            self._ensure_started()
+            request_id = next(self._ids)
+            payload = json.dumps({"id": request_id, "script": script}) + "\n"
+
+            try:
+                self._send(payload)
+            except (OSError, ValueError):
+                # Host died between commands - restart once and resend
+                self._kill()
+                self._ensure_started()
+                self._send(payload)
+
+            reply = self._wait_reply(request_id, script, timeout)
+            info['ok'] = bool(reply.get('ok'))
+            info['exit'] = reply.get('exit')
+
+        # Match subprocess.run(text=True), which normalises line endings
+        stdout = (reply.get('stdout') or "").replace('\r\n', '\n')
+        stderr = (reply.get('stderr') or "").replace('\r\n', '\n')
+        returncode = 0 if reply.get('ok') else 1
+        if reply.get('exit'):
+            returncode = reply['exit']
+        return subprocess.CompletedProcess(
+            args=script,
+            returncode=returncode,
+            stdout=stdout,
+            stderr=stderr
+        )
+
+    def close(self):
+        """Stop the host process."""
+        with self._lock:
+            if self.is_alive():
+                try:
+                    self._proc.stdin.close()
+                    self._proc.wait(timeout=2)
+                except Exception:
+                    pass
+            self._kill()
+
+    def _ensure_started(self):
+        if self.is_alive():
+            return
+        if self._proc is not None:
+            self.restarts += 1
+        encoded = base64.b64encode(HOST_SCRIPT.encode('utf-16-le')).decode('ascii')
+        with span("powershell.spawn", cat="process", restarts=self.restarts):
+            self._proc = subprocess.Popen(
+                [self.executable, "-NoLogo", "-NoProfile", "-NonInteractive",
+                 "-EncodedCommand", encoded],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                creationflags=NO_WINDOW
+            )
+        self._replies = queue.Queue()
+        threading.Thread(
+            target=self._read_replies,
+            args=(self._proc, self._replies),
+            daemon=True
+        ).start()
+
+    def _send(self, payload):
+        self._proc.stdin.write(payload.encode('utf-8'))
+        self._proc.stdin.flush()
+
+    def _wait_reply(self, request_id, script, timeout):
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            try:
+                reply = self._replies.get(timeout=remaining)
+            except queue.Empty:
+                # A hung command would block every later caller - recycle the host
+                self._kill()
+                raise subprocess.TimeoutExpired(script, timeout)
+            if reply is None:
+                self._kill()
+                raise PowerShellSessionError("PowerShell host exited unexpectedly")
+            if reply.get('id') == request_id:
+                return reply
+            # Stale reply from a command that previously timed out - skip it
+
+    def _kill(self):
+        if self._proc is not None and self._proc.poll() is None:
+            try:
+                self._proc.kill()
+                self._proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+
+    @staticmethod
+    def _read_replies(proc, replies):
+        """Reader thread: turn marker lines into reply dicts."""
+        for raw in proc.stdout:
+            line = raw.decode('utf-8', 'replace').strip()
+            if not line.startswith(REPLY_MARKER):
+                continue
+            try:
+                replies.put(json.loads(line[len(REPLY_MARKER):]))
+            except ValueError:
+                continue
+        replies.put(None)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the shared PowerShell session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = PowerShellSession()
+            atexit.register(_session.close)
+        return _session
+
+
+def run_powershell(script, timeout=None):
+    """Run a script in the shared session (drop-in for subprocess.run)."""
+    return get_session().run(script, timeout=timeout)
@@ -0,0 +1,83 @@
+"""
+Readiness polling
+Replaces fixed sleeps with a probe that is retried on an exponential backoff
+until it reports ready or a deadline expires. The caller gets back how long
+the wait actually took so slow machines show up in the results.
+"""
+
+import asyncio
+import time
+from collections import namedtuple
+
+WaitResult = namedtuple('WaitResult', ['ready', 'value', 'elapsed', 'attempts'])
+
+
+def wait_until(probe, is_ready, deadline, initial_delay=0.1, max_delay=1.0,
+               backoff=2.0, sleep=time.sleep, clock=time.monotonic):
+    """
+    Call probe() until is_ready(value) is true or `deadline` seconds pass.
+    Probe exceptions count as "not ready yet". Always probes at least once.
+    """
+    start = clock()
+    delay = initial_delay
+    attempts = 0
+    value = None
+
+    while True:
+        attempts += 1
+        try:
+            value = probe()
+            if is_ready(value):
+                return WaitResult(True, value, clock() - start, attempts)
+        except Exception:
+            pass
+
+        remaining = deadline - (clock() - start)
+        if remaining <= 0:
+            return WaitResult(False, value, clock() - start, attempts)
+        sleep(min(delay, remaining))
+        delay = min(delay * backoff, max_delay)
+
+
+async def wait_until_async(probe, is_ready, deadline, initial_delay=0.1, max_delay=1.0,
+                           backoff=2.0, clock=time.monotonic):
+    """wait_until() for coroutine probes; sleeping does not block the loop."""
+    start = clock()
+    delay = initial_delay
+    attempts = 0
+    value = None
+
+    while True:
+        attempts += 1
+        try:
+            value = await probe()
+            if is_ready(value):
+                return WaitResult(True, value, clock() - start, attempts)
+        except Exception:
+            pass
+
+        remaining = deadline - (clock() - start)
+        if remaining <= 0:
+            return WaitResult(False, value, clock() - start, attempts)
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * backoff, max_delay)
+
+
+def service_matches(markers):
+    """Predicate: service name contains one of the markers."""
+    def check(service):
+        return any(marker in (service or "") for marker in markers)
+    return check
+
+
+def device_present(service):
+    """Predicate: device has (re)appeared in the PnP tree."""
+    return bool(service) and service != "not found"
+
+
+def service_released(old_markers):
+    """Predicate: device is gone or no longer bound to the old service."""
+    def check(service):
+        service = service or ""
+        return service == "not found" or not any(marker in service for marker in old_markers)
+    return check
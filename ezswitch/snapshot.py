@@ -0,0 +1,104 @@
+"""
+Device snapshot
+Persists the last detected device state next to driver_paths.json so the
+GUI can show a "last known" status instantly while detection refreshes it.
+Revert points remember the driver package each switch replaced, so a revert
+rebinds that exact package instead of running a full switch.
+"""
+
+import json
+import os
+import threading
+import time
+
+SNAPSHOT_FILE = "device_snapshot.json"
+REVERT_FILE = "revert_points.json"
+
+
+def save_snapshot(device, hw_id, path=SNAPSHOT_FILE):
+    """Record a detected DeviceInfo. Failures are ignored (cache only)."""
+    snapshot = {
+        "hardware_id": hw_id,
+        "instance_id": device.instance_id,
+        "status": device.status,
+        "service": device.service,
+        "inf_name": device.inf_name,
+        "driver_version": device.driver_version,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    try:
+        with open(path, 'w') as f:
+            json.dump(snapshot, f, indent=4)
+    except OSError:
+        pass
+    return snapshot
+
+
+def load_snapshot(hw_id, path=SNAPSHOT_FILE):
+    """Last snapshot for this hardware ID, or None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            snapshot = json.load(f)
+    except Exception:
+        return None
+    if snapshot.get('hardware_id') != hw_id or not snapshot.get('instance_id'):
+        return None
+    return snapshot
+
+
+class RevertPoints:
+    """Persistent map of device instance ID -> driver package a switch replaced."""
+
+    def __init__(self, path=REVERT_FILE):
+        self.path = path
+        self.points = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def key(instance_id):
+        return instance_id.upper()
+
+    def record(self, device, family, hw_id):
+        """Remember the package `device` is bound to before it is switched away.
+        Devices without a published INF (nothing to rebind) are skipped."""
+        if not device.inf_name:
+            return None
+        point = {
+            "hardware_id": hw_id,
+            "instance_id": device.instance_id,
+            "family": family,
+            "service": device.service,
+            "inf_name": device.inf_name,
+            "driver_version": device.driver_version,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with self._lock:
+            self.points[self.key(device.instance_id)] = point
+            self._save()
+        return point
+
+    def get(self, instance_id):
+        """Revert point of a device instance, or None."""
+        with self._lock:
+            return self.points.get(self.key(instance_id))
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.points = json.load(f)
+        except Exception:
+            self.points = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(self.points, f, indent=4)
+        except OSError:
+            pass
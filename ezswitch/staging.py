@@ -0,0 +1,104 @@
+"""
+Driver staging
+Adds each driver package to the Windows driver store once and remembers the
+published oemNN.inf name, so later switches can bind the device straight to
+the staged package instead of re-copying it with pnputil /add-driver.
+A package is only re-staged when its source INF changes.
+"""
+
+import json
+import os
+import threading
+import time
+
+STAGING_FILE = "staged_drivers.json"
+
+
+class DriverStaging:
+    """Persistent map of source INF path -> published driver store name."""
+
+    def __init__(self, path=STAGING_FILE, inf_cache=None):
+        self.path = path
+        # InfCache; when set, packages are identified by content hash
+        self.inf_cache = inf_cache
+        self.records = {}
+        self._lock = threading.Lock()
+        # Serializes staging so parallel switches never stage one package twice
+        self._stage_lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def key(inf_path):
+        return os.path.normcase(os.path.abspath(inf_path))
+
+    def fingerprint(self, inf_path):
+        """Identity of the source package; a change means it must be re-staged."""
+        if self.inf_cache is not None:
+            return {"digest": self.inf_cache.digest(inf_path)}
+        stat = os.stat(inf_path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def lookup(self, backend, inf_path):
+        """Published name if the package is staged and still current, else None."""
+        with self._lock:
+            record = self.records.get(self.key(inf_path))
+        if not record:
+            return None
+        try:
+            if record.get('fingerprint') != self.fingerprint(inf_path):
+                return None
+        except OSError:
+            return None
+        # The name alone is not enough: Windows hands a deleted package's
+        # oemNN.inf to the next one staged, possibly the other driver family
+        location = backend.package_location(record['published_name'])
+        if location is None or location != record.get('location'):
+            return None
+        return record['published_name']
+
+    def ensure_staged(self, backend, inf_path):
+        """Return the published name, staging the package first if needed."""
+        published = self.lookup(backend, inf_path)
+        if published:
+            return published
+        with self._stage_lock:
+            published = self.lookup(backend, inf_path)
+            if published:
+                return published
+            fingerprint = self.fingerprint(inf_path)
+            published = backend.stage_driver(inf_path)
+            if not published:
+                return None
+            with self._lock:
+                self.records[self.key(inf_path)] = {
+                    "source": inf_path,
+                    "published_name": published,
+                    "location": backend.package_location(published),
+                    "fingerprint": fingerprint,
+                    "staged_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }
+                self._save()
+        return published
+
+    def resolve(self, backend, inf_paths):
+        """lookup() for several packages: {inf_path: published name or None}.
+        Hashes the packages, so it also warms the INF content cache."""
+        return dict((inf_path, self.lookup(backend, inf_path)) for inf_path in inf_paths)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.records = json.load(f)
+        except Exception:
+            self.records = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(self.records, f, indent=4)
+        except OSError:
+            pass
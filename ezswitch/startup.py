@@ -0,0 +1,57 @@
+"""
+Startup markers
+When EZSWITCH_STARTUP_LOG names a file, the app appends one JSON line with a
+wall-clock timestamp the first time it reaches each startup milestone
+("first_window", "first_detection"). benchmarks/bench_startup.py launches
+each build flavor with it set and reads the markers back.
+
+startup_report() describes the running bundle (modules imported so far,
+executable size); build.py checks it against the build's budget.
+"""
+
+import json
+import os
+import sys
+import time
+
+STARTUP_LOG_ENV = "EZSWITCH_STARTUP_LOG"
+
+_seen = set()
+
+
+def mark(event, **fields):
+    """Record `event` once per process if startup logging is enabled."""
+    path = os.environ.get(STARTUP_LOG_ENV)
+    if not path or event in _seen:
+        return
+    _seen.add(event)
+    entry = dict(fields, event=event, ts=time.time(), pid=os.getpid())
+    try:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError:
+        pass
+
+
+def startup_report():
+    """Modules imported so far and, in a frozen build, the exe size in bytes."""
+    frozen = getattr(sys, 'frozen', False)
+    return {
+        "modules": len(sys.modules),
+        "exe_bytes": os.path.getsize(sys.executable) if frozen else None,
+    }
+
+
+def read_marks(path):
+    """{event: entry} from a startup log (first entry per event wins)."""
+    marks = {}
+    if not os.path.exists(path):
+        return marks
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            marks.setdefault(entry.get('event'), entry)
+    return marks
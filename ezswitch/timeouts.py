@@ -0,0 +1,138 @@
+"""
+Adaptive timeouts
+Step timeouts and readiness deadlines learned from this machine's switch
+history: a limit is a multiple of the step's p95 over recent healthy runs,
+clamped to a floor and a ceiling, so a hung step is abandoned in about the
+time a healthy one takes. Steps with too few samples keep the defaults, and
+values set in driver_paths.json ("step_timeouts", "uninstall_wait",
+"verify_wait") always win. "adaptive_timeouts": false turns learning off.
+"""
+
+from ezswitch.stats import percentile
+
+# Defaults (seconds), used until enough history has been recorded.
+# Step timeouts bound one backend call; waits are readiness deadlines.
+DEFAULT_STEP_TIMEOUTS = {
+    "detect": 20.0,
+    "lookup": 30.0,
+    "uninstall": 30.0,
+    "stage": 90.0,
+    "scan": 30.0,
+    "bind": 90.0,
+    "add_driver": 120.0,
+    "run_switch": 240.0,
+}
+DEFAULT_UNINSTALL_WAIT = 10.0
+DEFAULT_VERIFY_WAIT = 15.0
+DEFAULT_WAITS = {
+    "uninstall_wait": DEFAULT_UNINSTALL_WAIT,
+    "reenumerate": DEFAULT_UNINSTALL_WAIT,
+    "verify": DEFAULT_VERIFY_WAIT,
+}
+
+# (floor, ceiling) per step or wait; learned values are clamped into these
+LIMITS = {
+    "detect": (10.0, 60.0),
+    "lookup": (5.0, 60.0),
+    "uninstall": (10.0, 60.0),
+    "stage": (20.0, 180.0),
+    "scan": (5.0, 60.0),
+    "bind": (15.0, 180.0),
+    "add_driver": (20.0, 240.0),
+    "run_switch": (30.0, 480.0),
+    "uninstall_wait": (3.0, 30.0),
+    "reenumerate": (3.0, 30.0),
+    "verify": (5.0, 45.0),
+}
+# limit = p95 * HEADROOM + SLACK, from the last HISTORY_WINDOW healthy samples
+HEADROOM = 2.0
+SLACK = 1.0
+MIN_SAMPLES = 5
+HISTORY_WINDOW = 200
+
+
+def learn_limits(entries, machine=None):
+    """
+    Learned limit (seconds) per step/wait from history entries of `machine`
+    (all machines if None). Only successful detections and switches count,
+    so timeouts and failed waits never inflate the limits.
+    """
+    samples = {}
+    for entry in entries:
+        if not entry.get('ok') or (machine is not None and entry.get('host') != machine):
+            continue
+        phases = entry.get('phases') or {}
+        if entry.get('kind') == 'switch' and entry.get('strategy') == 'consolidated':
+            # The script's own steps overlap run_switch; only its total is a step here
+            phases = {"run_switch": phases.get('total')}
+        for name, seconds in phases.items():
+            if name in LIMITS and seconds is not None:
+                samples.setdefault(name, []).append(seconds)
+
+    limits = {}
+    for name, values in samples.items():
+        values = values[-HISTORY_WINDOW:]
+        if len(values) < MIN_SAMPLES:
+            continue
+        floor, ceiling = LIMITS[name]
+        limits[name] = round(min(max(percentile(values, 95) * HEADROOM + SLACK, floor),
+                                 ceiling), 1)
+    return limits
+
+
+class StepTimeouts:
+    """Timeouts for one configuration: defaults, then learned limits, then the
+    values configured explicitly."""
+
+    def __init__(self, config=None, learned=None):
+        config = config or {}
+        if not config.get('adaptive_timeouts', True):
+            learned = {}
+        learned = learned or {}
+        self.learned = learned
+        self.steps = dict(DEFAULT_STEP_TIMEOUTS)
+        self.steps.update((name, value) for name, value in learned.items()
+                          if name in DEFAULT_STEP_TIMEOUTS)
+        self.steps.update(config.get('step_timeouts', {}))
+        self.waits = dict(DEFAULT_WAITS)
+        self.waits.update((name, value) for name, value in learned.items()
+                          if name in DEFAULT_WAITS)
+        if 'uninstall_wait' in config:
+            self.waits['uninstall_wait'] = self.waits['reenumerate'] = \
+                float(config['uninstall_wait'])
+        if 'verify_wait' in config:
+            self.waits['verify'] = float(config['verify_wait'])
+
+    @classmethod
+    def from_history(cls, config, history):
+        """Timeouts learned from a HistoryStore (defaults if history is None)."""
+        if history is None or not (config or {}).get('adaptive_timeouts', True):
+            return cls(config)
+        return cls(config, learn_limits(history.entries(), history.machine))
+
+    def step(self, name):
+        """Timeout (seconds) for backend step `name`, None if unbounded."""
+        return self.steps.get(name)
+
+    def wait(self, name):
+        """Readiness deadline (seconds): 'uninstall_wait', 'reenumerate' or 'verify'."""
+        return self.waits[name]
+
+    def switch_deadline(self):
+        """
+        Longest a whole switch can take with these limits: staging overlaps the
+        lookup, then uninstall, then either the bind path or pnputil /add-driver,
+        then verification; or the single run_switch script.
+        """
+        step = self.steps.get
+        bind = step('scan', 0) + self.wait('reenumerate') + step('bind', 0)
+        add_driver = step('add_driver', 0) + step('scan', 0)
+        steps = (max(step('lookup', 0), step('stage', 0)) + step('uninstall', 0) +
+                 self.wait('uninstall_wait') + max(bind, add_driver) + self.wait('verify'))
+        return max(steps, step('run_switch', 0))
+
+
+def ceiling_timeouts(config=None):
+    """StepTimeouts with every learnable limit at its ceiling: what a process
+    that cannot see this machine's history must allow for."""
+    return StepTimeouts(config, dict((name, limits[1]) for name, limits in LIMITS.items()))
@@ -0,0 +1,140 @@
+"""
+Swap pipeline tracing
+Span-based timing for detection and switching. Spans are kept in memory and,
+when a trace file is configured, appended to a size-rotated JSON-lines file
+as Chrome trace events, so a slow switch on a shop PC can be opened in a
+timeline viewer (chrome://tracing or ui.perfetto.dev).
+
+Export: python -m ezswitch.tracing [trace_file] [output.json]
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+TRACE_FILE = "switch_trace.jsonl"
+TRACE_MAX_BYTES = 1024 * 1024
+TRACE_BACKUPS = 3
+
+
+class Tracer:
+    """Records spans as Chrome trace "complete" (ph=X) events."""
+
+    def __init__(self, path=None, max_bytes=TRACE_MAX_BYTES, backup_count=TRACE_BACKUPS,
+                 keep=2000):
+        self.path = path
+        self.events = deque(maxlen=keep)
+        self._logger = None
+        if path:
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger = logging.getLogger(f"ezswitch.trace.{id(self)}")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            self._logger.addHandler(handler)
+
+    @contextmanager
+    def span(self, name, cat="switch", **args):
+        """
+        Time a block. Yields the args dict so the block can attach results
+        (return codes, service names) before the span is written.
+        """
+        start = time.time()
+        perf_start = time.perf_counter()
+        try:
+            yield args
+        except BaseException as e:
+            args['error'] = str(e) or type(e).__name__
+            raise
+        finally:
+            self.record(name, cat, start, time.perf_counter() - perf_start, args)
+
+    def record(self, name, cat, start, duration, args=None):
+        """Add a finished span (start in epoch seconds, duration in seconds)."""
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": int(start * 1e6),
+            "dur": int(duration * 1e6),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": dict((k, v) for k, v in (args or {}).items() if _jsonable(v)),
+        }
+        self.events.append(event)
+        if self._logger is not None:
+            try:
+                self._logger.info(json.dumps(event))
+            except Exception:
+                pass
+
+    def close(self):
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                handler.close()
+                self._logger.removeHandler(handler)
+
+
+def _jsonable(value):
+    return isinstance(value, (str, int, float, bool, type(None), list, dict))
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    """Return the process-wide tracer (in-memory only until configured)."""
+    return _tracer
+
+
+def set_tracer(tracer):
+    """Replace the process-wide tracer, e.g. with one writing TRACE_FILE."""
+    global _tracer
+    _tracer = tracer
+    return tracer
+
+
+def span(name, cat="switch", **args):
+    """Shortcut for get_tracer().span(...)."""
+    return _tracer.span(name, cat, **args)
+
+
+def read_trace_events(path=TRACE_FILE, backups=TRACE_BACKUPS):
+    """Read events from a trace file and its rotated backups, oldest first."""
+    files = [f"{path}.{index}" for index in range(backups, 0, -1)] + [path]
+    events = []
+    for name in files:
+        if not os.path.exists(name):
+            continue
+        with open(name, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    return events
+
+
+def export_chrome_trace(output_path, trace_path=TRACE_FILE, events=None):
+    """Write events in Chrome trace-event JSON format. Returns the event count."""
+    if events is None:
+        events = read_trace_events(trace_path)
+    events = sorted(events, key=lambda event: event.get("ts", 0))
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else TRACE_FILE
+    output = sys.argv[2] if len(sys.argv) > 2 else "switch_trace.json"
+    count = export_chrome_trace(output, source)
+    print(f"Exported {count} events to {output}")
@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ezswitch.backend import SimulatedBackend  # noqa: E402
+
+HW_ID = "VID_9588&PID_9899"
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """State files (staged_drivers.json, revert_points.json, ...) go to a temp folder."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def config(workdir):
+    ezcad = workdir / "lmc1usb.inf"
+    lightburn = workdir / "EzCad2Driver.inf"
+    ezcad.write_text("[Version]\n")
+    lightburn.write_text("[Version]\n")
+    return {
+        "ezcad_driver": str(ezcad),
+        "lightburn_driver": str(lightburn),
+        "hardware_id": HW_ID,
+        "force_install": True,
+        "uninstall_first": True,
+    }
+
+
+@pytest.fixture
+def config_file(config, workdir):
+    """driver_paths.json for the simulated backend, as a broker or CLI reads it."""
+    config['backend'] = "simulated"
+    path = str(workdir / "driver_paths.json")
+    with open(path, 'w') as f:
+        json.dump(config, f)
+    return path
+
+
+@pytest.fixture
+def make_backend(config):
+    """SimulatedBackend with fast settle times and the config's two packages."""
+    def make(count=1, service="lmcv2", **kwargs):
+        kwargs.setdefault('bind_delay', 0.01)
+        kwargs.setdefault('reenumerate_delay', 0.01)
+        packages = {config['ezcad_driver']: "lmcv2", config['lightburn_driver']: "winusb"}
+        return SimulatedBackend.with_laser(HW_ID, service=service, count=count,
+                                           packages=packages, **kwargs)
+    return make
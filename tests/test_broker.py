@@ -0,0 +1,134 @@
+import json
+import os
+import socket
+import stat
+import sys
+import threading
+
+import pytest
+
+from ezswitch import broker as broker_module
+from ezswitch.broker import Broker, BrokerClient, load_or_create_key, request_timeout
+from ezswitch.cli import BrokerHandler
+from ezswitch.timeouts import DEFAULT_STEP_TIMEOUTS, StepTimeouts
+
+
+def test_handler_ignores_client_config(config_file, workdir):
+    other = dict(json.load(open(config_file)), lightburn_driver=str(workdir / "evil.inf"))
+    (workdir / "evil.inf").write_text("[Version]\n")
+    with open("other.json", 'w') as f:
+        json.dump(other, f)
+
+    handler = BrokerHandler(config_file)
+    reply = handler({"op": "switch", "target": "LightBurn",
+                     "config": str(workdir / "other.json")})
+    assert reply['exit'] == 0
+    # The backend was built from the broker's own configuration
+    backend = handler.backends["simulated"]
+    assert str(workdir / "evil.inf") not in backend.packages
+
+
+def test_handler_rejects_unknown_requests(config_file):
+    handler = BrokerHandler(config_file)
+    assert handler({"op": "switch", "target": "Other"})['ok'] is False
+    assert "Unknown operation" in handler({"op": "format"})['error']
+    assert handler({"op": "ping"})['ok']
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="POSIX permission bits")
+def test_key_file_is_owner_only(workdir):
+    key = load_or_create_key("fleet.key")
+    assert len(key) == 32 and load_or_create_key("fleet.key") == key
+    assert stat.S_IMODE(os.stat("fleet.key").st_mode) == 0o600
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="POSIX permission bits")
+def test_broker_replaces_loose_key_file(workdir):
+    (workdir / "broker.key").write_bytes(b"old")
+    os.chmod("broker.key", 0o644)
+    broker = Broker(lambda request: {"ok": True},
+                    address=(str(workdir / "b.sock"), 'AF_UNIX'), key_file="broker.key")
+    broker.start()
+    try:
+        assert stat.S_IMODE(os.stat("broker.key").st_mode) == 0o600
+        assert open("broker.key", 'rb').read() != b"old"
+    finally:
+        broker.stop()
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="Unix socket endpoint")
+def test_broker_round_trip(workdir):
+    address = (str(workdir / "b.sock"), 'AF_UNIX')
+    broker = Broker(lambda request: {"echo": request['op']}, address=address,
+                    key_file="broker.key")
+    broker.start()
+    threading.Thread(target=broker.serve_forever, daemon=True).start()
+    client = BrokerClient.connect(address, key_file="broker.key")
+    try:
+        assert client.request("status") == {"echo": "status"}
+    finally:
+        client.close()
+        broker.stop()
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="Unix socket endpoint")
+def test_client_reconnects_after_timeout(workdir):
+    address = (str(workdir / "b.sock"), 'AF_UNIX')
+    released = threading.Event()
+
+    def handler(request):
+        if request['op'] == 'slow':
+            released.wait(5)
+        return {"echo": request['op']}
+
+    broker = Broker(handler, address=address, key_file="broker.key")
+    broker.start()
+    threading.Thread(target=broker.serve_forever, daemon=True).start()
+    client = BrokerClient.connect(address, key_file="broker.key")
+    try:
+        with pytest.raises(TimeoutError):
+            client.request("slow", timeout=0.2)
+        released.set()
+        assert client.request("status", timeout=5) == {"echo": "status"}
+    finally:
+        client.close()
+        broker.stop()
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="Unix socket endpoint")
+def test_connect_gives_up_on_silent_endpoint(workdir, monkeypatch):
+    monkeypatch.setattr(broker_module, "HANDSHAKE_TIMEOUT", 0.3)
+    (workdir / "broker.key").write_bytes(b"k" * 32)
+    server = socket.socket(socket.AF_UNIX)
+    server.bind(str(workdir / "b.sock"))
+    server.listen(1)
+    try:
+        assert BrokerClient.connect((str(workdir / "b.sock"), 'AF_UNIX'),
+                                    key_file="broker.key") is None
+    finally:
+        server.close()
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="Unix socket endpoint")
+def test_broker_serves_while_a_local_client_stays_silent(workdir, monkeypatch):
+    monkeypatch.setattr(broker_module, "HANDSHAKE_TIMEOUT", 0.3)
+    address = (str(workdir / "b.sock"), 'AF_UNIX')
+    broker = Broker(lambda request: {"echo": request['op']}, address=address,
+                    key_file="broker.key")
+    broker.start()
+    threading.Thread(target=broker.serve_forever, daemon=True).start()
+    mute = socket.socket(socket.AF_UNIX)
+    mute.connect(address[0])
+    client = BrokerClient.connect(address, key_file="broker.key")
+    try:
+        assert client.request("status", timeout=5) == {"echo": "status"}
+    finally:
+        client.close()
+        mute.close()
+        broker.stop()
+
+
+def test_request_timeout_covers_the_longest_switch():
+    assert StepTimeouts().switch_deadline() > DEFAULT_STEP_TIMEOUTS['add_driver'] + 30 + 10 + 15
+    assert request_timeout() > StepTimeouts().switch_deadline()
+    assert request_timeout({"step_timeouts": {"add_driver": 900}}) > 900
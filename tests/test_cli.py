@@ -0,0 +1,49 @@
+import json
+import sys
+
+from ezswitch.cli import (
+    EXIT_NOT_FOUND, EXIT_OK, EXIT_USAGE, main, status_report, switch_report
+)
+
+
+def run(capsys, *argv):
+    code = main(list(argv) + ["--json", "--no-broker"])
+    return code, json.loads(capsys.readouterr().out)
+
+
+def test_status_and_switch_round_trip(config_file, capsys):
+    code, data = run(capsys, "--status", "--config", config_file)
+    assert code == EXIT_OK and data['ok'] and data['driver'] == "EZCAD"
+    assert data['service'] == "lmcv2" and len(data['devices']) == 1
+
+    code, data = run(capsys, "--switch", "lightburn", "--config", config_file)
+    assert code == EXIT_OK and data['ok'] and data['changed']
+    assert data['target'] == "LightBurn" and data['service'] == "winusb"
+    assert "total" in data['timings']
+
+
+def test_missing_configuration_is_a_usage_error(workdir, capsys):
+    code, data = run(capsys, "--switch", "ezcad", "--config", str(workdir / "none.json"))
+    assert code == EXIT_USAGE and not data['ok']
+    assert "none.json" in data['error']
+
+
+def test_status_without_laser(config, make_backend):
+    code, data, text = status_report(config, make_backend(count=0))
+    assert code == EXIT_NOT_FOUND and data == {"ok": False, "devices": [],
+                                               "error": "Laser not detected"}
+    assert "VID_9588&PID_9899" in text
+
+
+def test_switch_to_active_driver_changes_nothing(config, make_backend):
+    backend = make_backend()
+    code, data, text = switch_report(config, backend, "EZCAD")
+    assert code == EXIT_OK and data['changed'] is False
+    assert text == "EZCAD2 driver already active."
+    assert backend.calls["uninstall"] == 0
+
+
+def test_cli_does_not_import_tkinter(config_file, monkeypatch, capsys):
+    monkeypatch.delitem(sys.modules, "tkinter", raising=False)
+    code, _ = run(capsys, "--status", "--config", config_file)
+    assert code == EXIT_OK and "tkinter" not in sys.modules
@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+
+from ezswitch.config import PathCheck, PathChecker, read_config
+
+
+def write(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def test_read_config_fills_defaults(config, workdir):
+    del config['hardware_id'], config['force_install']
+    write("driver_paths.json", config)
+    loaded, valid = read_config()
+    assert valid
+    assert loaded['hardware_id'] == "VID_9588&PID_9899" and loaded['force_install'] is True
+
+
+def test_read_config_missing_file_or_key(config):
+    assert read_config("absent.json") == ({}, False)
+    del config['lightburn_driver']
+    write("driver_paths.json", config)
+    assert read_config()[1] is False
+
+
+def test_read_config_checks_paths(config, monkeypatch):
+    config['lightburn_driver'] = "/nonexistent/lb.inf"
+    write("driver_paths.json", config)
+    assert read_config()[1] is False
+
+    # The GUI defers the check to PathChecker: no driver file may be touched
+    checked = []
+    real_exists = os.path.exists
+    monkeypatch.setattr(os.path, 'exists',
+                        lambda path: checked.append(path) or real_exists(path))
+    loaded, valid = read_config(check_paths=False)
+    assert valid and loaded['lightburn_driver'] == "/nonexistent/lb.inf"
+    assert checked == ["driver_paths.json"]
+
+
+def test_path_checker_caches_results(config):
+    checker = PathChecker()
+    assert checker.check(config['ezcad_driver']).status == "ok"
+    assert checker.check("/nonexistent/lb.inf").status == "missing"
+    assert PathChecker().last_known(config['ezcad_driver']).status == "ok"
+
+
+def test_path_checker_times_out(config, monkeypatch):
+    # A share that does not answer: the probe blocks until released
+    released = threading.Event()
+
+    def hung_probe(path):
+        released.wait(5)
+        return PathCheck(path, "ok", 0.0)
+
+    checker = PathChecker(timeout=0.1)
+    monkeypatch.setattr(checker, '_probe', hung_probe)
+    try:
+        assert checker.check(config['ezcad_driver']).status == "timeout"
+    finally:
+        released.set()
@@ -0,0 +1,284 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from ezswitch.aio import AsyncRunner, new_event_loop
+from ezswitch.engine import ServiceClassifier, SwitchEngine, classify_service, target_for
+from ezswitch.snapshot import RevertPoints
+from ezswitch.staging import DriverStaging
+
+from conftest import HW_ID
+
+
+def test_classifier_prefers_longest_marker():
+    assert classify_service("usblmc") == "LightBurn"
+    assert classify_service("LMCV2") == "EZCAD"
+    assert classify_service("WinUSB") == "LightBurn"
+    assert classify_service("bjjcz_usb") == "EZCAD"
+    assert classify_service("") == "Unknown"
+    assert classify_service("usbser") == "Unknown"
+    assert ServiceClassifier({}).classify("lmc") == "Unknown"
+    custom = ServiceClassifier({"EZCAD": ["dlc"], "LightBurn": ["winusb"]})
+    assert custom.classify("dlc2") == "EZCAD"
+
+
+def test_target_for():
+    assert target_for("LightBurn") == "EZCAD"
+    assert target_for("EZCAD") == "LightBurn"
+    assert target_for("Unknown") == "LightBurn"
+
+
+def test_switch_with_add_driver(config, make_backend):
+    backend = make_backend()
+    result = SwitchEngine(backend, config).switch("EZCAD")
+    assert result.success, result.message
+    assert result.target == "LightBurn" and result.service == "winusb"
+    assert result.strategy == "add_driver" and result.returncode == 0
+    assert {"lookup", "uninstall", "add_driver", "verify", "total"} <= set(result.timings)
+
+
+def test_switch_binds_staged_package(config, make_backend):
+    backend = make_backend()
+    staging = DriverStaging()
+    engine = SwitchEngine(backend, config, staging)
+    result = engine.switch("EZCAD")
+    assert result.success and result.strategy == "bind"
+    assert backend.calls["add_driver"] == 0 and backend.calls["bind_driver"] == 1
+
+    # The second switch back reuses the record; nothing is staged twice
+    assert engine.switch("LightBurn").success
+    assert engine.switch("EZCAD").success
+    assert backend.calls["stage_driver"] == 2
+
+
+def test_switch_reports_missing_device(config, make_backend):
+    backend = make_backend(count=0)
+    result = SwitchEngine(backend, config).switch("EZCAD")
+    assert not result.success and "not found" in result.message
+
+
+def test_switch_reports_install_failure(config, make_backend):
+    backend = make_backend()
+    config['lightburn_driver'] = "missing.inf"
+    result = SwitchEngine(backend, config).switch("EZCAD")
+    assert not result.success and result.returncode == 2
+
+
+def test_reboot_required_is_success_without_verify(config, make_backend):
+    result = SwitchEngine(make_backend(reboot_required=True), config).switch("EZCAD")
+    assert result.success and result.returncode == 3010
+    assert "Restart" in result.message and "verify" not in result.timings
+
+
+def test_consolidated_switch(config, make_backend):
+    config['switch_mode'] = "consolidated"
+    backend = make_backend()
+    result = SwitchEngine(backend, config).switch("EZCAD")
+    assert result.success, result.message
+    assert result.strategy == "consolidated" and result.service == "winusb"
+    assert backend.calls["run_switch"] == 1
+
+
+def test_cancelled_switch_returns_failed_result(config, make_backend):
+    backend = make_backend(latency={"uninstall": 0.5})
+    engine = SwitchEngine(backend, config)
+
+    async def cancel_midway():
+        task = asyncio.ensure_future(engine.switch_async("EZCAD"))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        return await task
+
+    loop = new_event_loop()
+    try:
+        result = loop.run_until_complete(cancel_midway())
+    finally:
+        loop.close()
+    assert not result.success and result.message == "Switch cancelled."
+
+
+def test_cancel_during_uninstall_restores_device(config, make_backend):
+    backend = make_backend(latency={"uninstall": 1.0})
+    engine = SwitchEngine(backend, config)
+
+    async def cancel_midway():
+        task = asyncio.ensure_future(engine.switch_async("EZCAD"))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        return await task
+
+    loop = new_event_loop()
+    try:
+        result = loop.run_until_complete(cancel_midway())
+    finally:
+        loop.close()
+    assert not result.success and result.message == "Switch cancelled."
+    # The uninstall finished after the cancel; the rescan brought the board back
+    assert backend.calls["rescan"] == 1
+    time.sleep(0.05)
+    device = backend.find_device(HW_ID)
+    assert device is not None and device.service == "lmcv2"
+
+
+def test_runner_reports_cancel_after_the_coroutine_finishes():
+    events = []
+    reported = threading.Event()
+
+    async def slow_cleanup():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            await asyncio.sleep(0.2)
+            events.append("cleaned up")
+            raise
+
+    def cancelled():
+        events.append("cancelled")
+        reported.set()
+
+    runner = AsyncRunner(lambda func: func())
+    try:
+        future = runner.submit(slow_cleanup(), on_cancel=cancelled)
+        time.sleep(0.05)
+        assert future.cancel()
+        assert not future.done()
+        with pytest.raises(concurrent.futures.CancelledError):
+            future.result(5)
+        assert reported.wait(5)
+        assert events == ["cleaned up", "cancelled"]
+    finally:
+        runner.close()
+
+
+def test_runner_delivers_result_of_coroutine_that_handles_cancel():
+    outcome = []
+    reported = threading.Event()
+
+    async def returns_on_cancel():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            return "stopped"
+
+    def done(result):
+        outcome.append(result)
+        reported.set()
+
+    runner = AsyncRunner(lambda func: func())
+    try:
+        future = runner.submit(returns_on_cancel(), on_done=done, on_cancel=reported.set)
+        time.sleep(0.05)
+        future.cancel()
+        assert reported.wait(5) and outcome == ["stopped"]
+        assert future.result(1) == "stopped"
+    finally:
+        runner.close()
+
+
+def test_learned_timeout_abandons_hung_step(config, make_backend):
+    config['step_timeouts'] = {"add_driver": 0.2}
+    backend = make_backend(latency={"add_driver": 1.0})
+    result = SwitchEngine(backend, config).switch("EZCAD")
+    assert not result.success and "add_driver did not finish" in result.message
+
+
+def test_revert_rebinds_replaced_package(config, make_backend):
+    backend = make_backend()
+    backend.stage_driver(config['ezcad_driver'])
+    reverts = RevertPoints()
+    engine = SwitchEngine(backend, config, DriverStaging(), reverts=reverts)
+
+    assert engine.switch("EZCAD").success
+    device = backend.find_device(HW_ID)
+    point = reverts.get(device.instance_id)
+    assert point['family'] == "EZCAD" and point['service'] == "lmcv2"
+
+    result = engine.revert()
+    assert result.success, result.message
+    assert result.strategy == "revert" and result.target == "EZCAD"
+    assert "uninstall" not in result.timings and "stage" not in result.timings
+    assert backend.find_device(HW_ID).service == "lmcv2"
+
+    # Reverting again goes back to the driver the revert replaced
+    result = engine.revert()
+    assert result.success and result.target == "LightBurn"
+
+
+def test_revert_falls_back_to_full_switch(config, make_backend):
+    backend = make_backend()
+    backend.stage_driver(config['ezcad_driver'])
+    engine = SwitchEngine(backend, config, DriverStaging(), reverts=RevertPoints())
+    assert engine.switch("EZCAD").success
+    backend._staged.clear()
+
+    result = engine.revert()
+    assert result.success and result.strategy != "revert"
+    assert backend.find_device(HW_ID).service == "lmcv2"
+
+
+def test_revert_without_record(config, make_backend):
+    engine = SwitchEngine(make_backend(), config, reverts=RevertPoints())
+    result = engine.revert()
+    assert not result.success and "No previous driver" in result.message
+
+
+def test_consolidated_switch_records_revert_point_from_detection(config, make_backend):
+    config['switch_mode'] = "consolidated"
+    backend = make_backend()
+    backend.stage_driver(config['ezcad_driver'])
+    reverts = RevertPoints()
+    engine = SwitchEngine(backend, config, reverts=reverts)
+    detected = backend.find_device(HW_ID)
+
+    assert engine.switch("EZCAD", cached=detected).success
+    assert reverts.get(detected.instance_id)['inf_name'] == detected.inf_name
+
+    result = engine.revert(cached=backend.find_device(HW_ID))
+    assert result.success and result.strategy == "revert"
+    assert backend.find_device(HW_ID).service == "lmcv2"
+
+
+def test_switch_many_switches_every_board(config, make_backend):
+    backend = make_backend(count=3)
+    devices = backend.find_devices(HW_ID)
+    outcome = SwitchEngine(backend, config, DriverStaging()).switch_many(devices, "LightBurn")
+    assert len(outcome.results) == 3
+    assert all(result.success for _, result in outcome.results)
+    assert {d.service for d in backend.find_devices(HW_ID)} == {"winusb"}
+
+
+def test_switch_many_switches_only_selected_boards(config, make_backend):
+    config['switch_mode'] = "consolidated"
+    config['use_staged_drivers'] = False
+    backend = make_backend(count=3)
+    devices = backend.find_devices(HW_ID)
+    outcome = SwitchEngine(backend, config).switch_many(devices[:1], "LightBurn")
+    assert [result.strategy for _, result in outcome.results] == ["bind"]
+    assert outcome.results[0][1].success, outcome.results[0][1].message
+    assert backend.calls["add_driver"] == 0 and backend.calls["run_switch"] == 0
+    services = dict((d.instance_id, d.service) for d in backend.find_devices(HW_ID))
+    assert services == {devices[0].instance_id: "winusb", devices[1].instance_id: "lmcv2",
+                        devices[2].instance_id: "lmcv2"}
+
+
+def test_switch_many_refuses_subset_it_cannot_stage(config, make_backend):
+    backend = make_backend(count=3, failures={"stage_driver": 1})
+    devices = backend.find_devices(HW_ID)
+    outcome = SwitchEngine(backend, config).switch_many(devices[:2], "LightBurn")
+    assert not any(result.success for _, result in outcome.results)
+    assert "not selected" in outcome.results[0][1].message
+    assert backend.calls["add_driver"] == 0 and backend.calls["uninstall"] == 0
+    assert {d.service for d in backend.find_devices(HW_ID)} == {"lmcv2"}
+
+
+def test_switch_many_adds_package_once_when_staging_fails(config, make_backend):
+    backend = make_backend(count=3, latency={"add_driver": 0.1}, failures={"stage_driver": 1})
+    devices = backend.find_devices(HW_ID)
+    outcome = SwitchEngine(backend, config).switch_many(devices, "LightBurn")
+    assert all(result.success for _, result in outcome.results)
+    assert all(result.strategy == "add_driver" for _, result in outcome.results)
+    assert backend.calls["add_driver"] == 1
+    assert {d.service for d in backend.find_devices(HW_ID)} == {"winusb"}
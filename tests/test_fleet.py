@@ -0,0 +1,123 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from ezswitch import broker as broker_module
+from ezswitch.broker import Broker, BrokerClient
+from ezswitch.cli import BrokerHandler
+from ezswitch.fleet import BrokerTransport, Fleet, Host, LocalTransport, report_summary
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_fleet_switches_every_host(config_file):
+    hosts = [Host(f"cell-{index}", "", "local") for index in range(4)]
+    transport = LocalTransport(dict((host.name, BrokerHandler(config_file)) for host in hosts))
+    fleet = Fleet(hosts, {"local": transport}, max_parallel=2, timeout=30)
+
+    report = fleet.run("switch", target="LightBurn")
+    data, text = report_summary(report)
+    assert data['succeeded'] == 4 and data['unreachable'] == 0
+    assert all(r.data['service'] == "winusb" for r in report.results)
+    assert "4/4 succeeded" in text
+
+
+def test_fleet_reports_slow_and_broken_hosts(config_file):
+    released = threading.Event()
+
+    def slow(request):
+        released.wait(5)
+        return {"exit": 0, "data": {}, "text": "late"}
+
+    handlers = {"ok": BrokerHandler(config_file), "slow": slow,
+                "broken": lambda request: {"ok": False, "error": "Unknown operation"}}
+    hosts = [Host(name, "", "local") for name in handlers] + [Host("remote", "10.0.0.1:1", "ssh")]
+    fleet = Fleet(hosts, {"local": LocalTransport(handlers)}, timeout=0.3)
+    start = time.perf_counter()
+    try:
+        report = fleet.run("status")
+    finally:
+        released.set()
+    assert time.perf_counter() - start < 3
+
+    results = dict((r.host.name, r) for r in report.results)
+    assert results["ok"].ok and results["ok"].exit == 0
+    assert not results["slow"].ok and "No answer within" in results["slow"].message
+    assert results["broken"].message == "Unknown operation"
+    assert "No 'ssh' transport" in results["remote"].message
+    assert report_summary(report)[0]['unreachable'] == 3
+
+
+@pytest.fixture
+def silent_agent():
+    """A stand-in agent that accepts TCP connections but never says a word."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(8)
+    accepted = []
+
+    def accept():
+        while True:
+            try:
+                accepted.append(server.accept()[0])
+            except OSError:
+                return
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield "127.0.0.1:%d" % server.getsockname()[1]
+    server.close()
+    for conn in accepted:
+        conn.close()
+
+
+def test_silent_host_times_out(silent_agent):
+    fleet = Fleet([Host("mute", silent_agent, "broker")],
+                  {"broker": BrokerTransport(b"k" * 32)}, timeout=0.5)
+    report = fleet.run("status")
+    assert "No answer within 0.5s" in report.results[0].message
+    assert report.elapsed < 3
+
+
+def test_fleet_cli_exits_despite_silent_host(silent_agent, workdir):
+    with open("fleet.json", 'w') as f:
+        json.dump({"key_file": "fleet.key", "timeout": 1,
+                   "hosts": [{"name": "mute", "address": silent_agent}]}, f)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    done = subprocess.run(
+        [sys.executable, "-c", "import sys; from ezswitch.cli import main; "
+         "sys.exit(main(['--fleet', 'fleet.json', '--status', '--json']))"],
+        cwd=str(workdir), env=env, stdout=subprocess.PIPE, timeout=20
+    )
+    assert done.returncode == 1
+    assert json.loads(done.stdout.decode('utf-8'))['unreachable'] == 1
+
+
+def test_agent_serves_others_while_a_client_stays_silent(monkeypatch):
+    monkeypatch.setattr(broker_module, "HANDSHAKE_TIMEOUT", 0.5)
+    key = b"k" * 32
+    agent = Broker(lambda request: {"echo": request['op']},
+                   address=(("127.0.0.1", 0), 'AF_INET'), authkey=key)
+    agent.start()
+    threading.Thread(target=agent.serve_forever, daemon=True).start()
+    address = (agent.listener.address, 'AF_INET')
+    mute = socket.create_connection(agent.listener.address)
+    try:
+        client = BrokerClient.connect(address, authkey=key)
+        assert client is not None
+        try:
+            assert client.request("status", timeout=5) == {"echo": "status"}
+        finally:
+            client.close()
+        # The silent peer is dropped once its handshake deadline passes
+        mute.settimeout(5)
+        while mute.recv(1024):
+            pass
+    finally:
+        mute.close()
+        agent.stop()
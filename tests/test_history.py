@@ -0,0 +1,61 @@
+import json
+import os
+
+from ezswitch.engine import SwitchResult
+from ezswitch.history import HistoryStore, format_report, history_report, main, read_history
+
+
+def test_history_rotates_and_keeps_backups():
+    store = HistoryStore("h.jsonl", max_bytes=400, backup_count=2, machine="pc")
+    for index in range(30):
+        store.record_detection(index / 100.0, "ok", 1, "simulated")
+    assert os.path.exists("h.jsonl.1") and os.path.exists("h.jsonl.2")
+    assert not os.path.exists("h.jsonl.3")
+    assert all(os.path.getsize(name) <= 400 for name in ("h.jsonl", "h.jsonl.1", "h.jsonl.2"))
+
+    entries = store.entries()
+    # The oldest entries were rotated out; what is left is in order and ends last
+    assert 0 < len(entries) < 30
+    assert entries[-1]['phases'] == {"detect": 0.29}
+    assert [e['ts'] for e in entries] == sorted(e['ts'] for e in entries)
+
+
+def test_history_without_backups_starts_over():
+    store = HistoryStore("h.jsonl", max_bytes=200, backup_count=0, machine="pc")
+    for index in range(10):
+        store.record_detection(0.1, "ok", 1, "simulated")
+    assert not os.path.exists("h.jsonl.1")
+    assert 0 < len(store.entries()) < 10
+
+
+def test_report_per_machine():
+    shop = HistoryStore("shop.jsonl", machine="shop")
+    office = HistoryStore("office.jsonl", machine="office")
+    for seconds in (1.0, 2.0, 3.0):
+        shop.record_switch(SwitchResult(True, "", "LightBurn", "winusb",
+                                        {"bind": seconds, "total": seconds}, "bind", 0),
+                           "EZCAD", "simulated")
+    shop.record_switch(SwitchResult(False, "", "EZCAD", "", {"total": 9.0}, "add_driver", 2),
+                       "LightBurn", "simulated")
+    office.record_detection(0.5, "timeout", 0, "powershell")
+    with open("shop.jsonl", 'a') as f:
+        f.write("not json\n")
+
+    report = history_report(read_history(["shop.jsonl", "office.jsonl"]))
+    assert list(report) == ["office", "shop"]
+    shop_report = report["shop"]
+    assert shop_report['switches'] == 4 and shop_report['success_rate'] == 0.75
+    assert shop_report['verified_rate'] == 0.75
+    assert shop_report['strategies'] == {"bind": 3, "add_driver": 1}
+    assert shop_report['phases']['bind']['p50'] == 2.0
+    assert report["office"]['success_rate'] is None and report["office"]['detect_rate'] == 0.0
+
+    text = format_report(report)
+    assert "shop: 4 switches, 75% succeeded" in text and "bind" in text
+    assert format_report({}) == "No history recorded yet."
+
+
+def test_report_command(capsys):
+    HistoryStore("h.jsonl", machine="pc").record_detection(0.2, "ok", 1, "simulated")
+    assert main(["--json", "h.jsonl"]) == 0
+    assert json.loads(capsys.readouterr().out)["pc"]['detections'] == 1
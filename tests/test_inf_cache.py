@@ -0,0 +1,54 @@
+import os
+
+from ezswitch.inf_cache import InfCache, referenced_files
+
+INF = """\
+[Version]
+Signature="$WINDOWS NT$"
+CatalogFile.NTamd64 = "lmc1usb.cat"  ; signed catalog
+
+[SourceDisksFiles]
+lmc1usb.sys = 1
+missing.sys = 1
+
+[SourceDisksFiles.amd64]
+lmc1usb64.sys = 1,x64
+"""
+
+
+def make_package(folder, inf=INF, encoding='latin-1'):
+    os.makedirs(os.path.join(folder, "x64"))
+    for name in ("lmc1usb.cat", "lmc1usb.sys", os.path.join("x64", "lmc1usb64.sys")):
+        with open(os.path.join(folder, name), 'wb') as f:
+            f.write(name.encode('ascii'))
+    path = os.path.join(folder, "lmc1usb.inf")
+    with open(path, 'w', encoding=encoding) as f:
+        f.write(inf)
+    return path
+
+
+def test_referenced_files(workdir):
+    path = make_package(str(workdir))
+    assert referenced_files(path) == sorted(
+        ["lmc1usb.cat", "lmc1usb.sys", os.path.join("x64", "lmc1usb64.sys")]
+    )
+
+
+def test_referenced_files_utf16(workdir):
+    path = make_package(str(workdir), encoding='utf-16')
+    assert "lmc1usb.sys" in referenced_files(path)
+
+
+def test_digest_rehashes_only_on_change(workdir):
+    path = make_package(str(workdir))
+    cache = InfCache()
+    first = cache.digest(path)
+    assert cache.digest(path) == first and cache.hashed == 1
+
+    # A fresh cache recognises the package from the persisted stat keys
+    assert InfCache().digest(path) == first
+
+    sys_file = os.path.join(str(workdir), "lmc1usb.sys")
+    with open(sys_file, 'wb') as f:
+        f.write(b"rebuilt driver")
+    assert cache.digest(path) != first and cache.hashed == 2
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from ezswitch.backend import BackendError, DeviceInfo, parse_device_records, preferred_device
+from ezswitch.pnp_queries import (
+    DEVICES_MARKER, device_source, exact_hardware_id, instance_id_pattern
+)
+
+
+@pytest.mark.parametrize("hw_id, pattern", [
+    ("VID_9588&PID_9899", "USB\\VID_9588&PID_9899*"),
+    ("USB\\VID_9588&PID_9899", "USB\\VID_9588&PID_9899*"),
+    ("usb\\vid_9588&pid_9899&REV_0100", "usb\\vid_9588&pid_9899*"),
+    ("  VID_9588&PID_9899  ", "USB\\VID_9588&PID_9899*"),
+    ("PCI\\VEN_8086", None),
+    ("lmc", None),
+])
+def test_instance_id_pattern(hw_id, pattern):
+    assert instance_id_pattern(hw_id) == pattern
+
+
+def test_exact_hardware_id():
+    assert exact_hardware_id("VID_9588&PID_9899&REV_0001") == "USB\\VID_9588&PID_9899"
+    assert exact_hardware_id("ACPI\\PNP0A08") is None
+
+
+def test_device_source_filters_at_the_source():
+    source = device_source(["VID_9588&PID_9899", "VID_9588&PID_9900"])
+    assert source.startswith("Get-PnpDevice -InstanceId ")
+    assert "'USB\\VID_9588&PID_9899*'" in source and "'USB\\VID_9588&PID_9900*'" in source
+
+
+def test_device_source_falls_back_to_full_scan():
+    assert "Where-Object" in device_source("ACPI\\PNP0A08")
+
+
+def test_parse_device_records_list_and_single_object():
+    records = [
+        {"instance_id": "USB\\VID_9588&PID_9899\\1", "status": "Error", "service": None},
+        {"instance_id": "USB\\VID_9588&PID_9899\\2", "status": "OK", "service": "lmcv2",
+         "inf_name": "oem12.inf", "driver_version": "2.0.0.0", "problem_code": 0},
+        {"instance_id": None},
+    ]
+    stdout = "noise\n" + DEVICES_MARKER + json.dumps(records) + "\n"
+    devices = parse_device_records(stdout)
+    assert [d.instance_id[-1] for d in devices] == ["1", "2"]
+    assert devices[0].service == ""
+    assert devices[1] == DeviceInfo("USB\\VID_9588&PID_9899\\2", "OK", "lmcv2", "oem12.inf",
+                                    "2.0.0.0", 0)
+    assert preferred_device(devices) is devices[1]
+
+    single = DEVICES_MARKER + json.dumps(records[1])
+    assert len(parse_device_records(single)) == 1
+    assert parse_device_records(DEVICES_MARKER + "null") == []
+
+
+def test_parse_device_records_without_marker():
+    with pytest.raises(BackendError):
+        parse_device_records("Get-PnpDevice : access denied")
@@ -0,0 +1,48 @@
+from ezswitch.backend import DeviceInfo, create_backend
+from ezswitch.profiles import DEFAULT_PROFILE_NAME, ProfileIndex, load_profiles, profile_config
+
+
+def dlc_config(config, workdir):
+    dlc = workdir / "dlc.inf"
+    dlc.write_text("[Version]\n")
+    config['profiles'] = [
+        {"name": "JCZ DLC2", "hardware_ids": ["VID_9588&PID_9900"],
+         "services": {"EZCAD": ["dlc"]}, "drivers": {"EZCAD": str(dlc)}},
+        {"name": "No IDs", "hardware_ids": []},
+    ]
+    return config
+
+
+def test_profiles_extend_the_default(config, workdir):
+    profiles = load_profiles(dlc_config(config, workdir))
+    assert [p.name for p in profiles] == [DEFAULT_PROFILE_NAME, "JCZ DLC2"]
+    dlc = profiles[1]
+    assert dlc.services["EZCAD"] == ["dlc"] and "winusb" in dlc.services["LightBurn"]
+    assert dlc.drivers["LightBurn"] == config['lightburn_driver']
+
+    derived = profile_config(config, dlc)
+    assert derived['hardware_id'] == "VID_9588&PID_9900"
+    assert derived['ezcad_driver'] == str(workdir / "dlc.inf")
+    assert derived['service_markers']["EZCAD"] == ["dlc"]
+    assert config['hardware_id'] != derived['hardware_id']
+
+
+def test_index_classifies_boards_of_every_profile(config, workdir):
+    config = dict(dlc_config(config, workdir), backend="simulated")
+    backend = create_backend(config)
+    index = ProfileIndex.from_config(config)
+    devices = index.find_devices(backend)
+    assert backend.calls["find_devices"] == 1 and len(devices) == 2
+
+    classified = dict((d.instance_id, index.classify(d)) for d in devices)
+    names = sorted((profile.name, driver) for profile, driver in classified.values())
+    assert names == [(DEFAULT_PROFILE_NAME, "EZCAD"), ("JCZ DLC2", "EZCAD")]
+
+
+def test_index_falls_back_to_the_default_profile(config, workdir):
+    index = ProfileIndex.from_config(dlc_config(config, workdir))
+    other = DeviceInfo("ACPI\\PNP0A08\\0", "OK", "winusb")
+    profile, driver = index.classify(other)
+    assert profile.name == DEFAULT_PROFILE_NAME and driver == "LightBurn"
+    assert index.profile_for("USB\\VID_9588&PID_9900\\5").name == "JCZ DLC2"
+    assert index.profile_for("USB\\VID_1234&PID_0001\\5") is None
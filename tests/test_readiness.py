@@ -0,0 +1,78 @@
+from ezswitch.aio import run_sync
+from ezswitch.readiness import (
+    device_present, service_matches, service_released, wait_until, wait_until_async
+)
+
+
+class FakeClock:
+    """Time that only moves when the code under test sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_wait_until_backs_off_until_ready():
+    clock = FakeClock()
+    values = iter(["lmcv2", "not found", "not found", "winusb"])
+    waited = wait_until(lambda: next(values), service_matches(["winusb"]), deadline=10,
+                        sleep=clock.sleep, clock=clock)
+    assert waited.ready and waited.value == "winusb" and waited.attempts == 4
+    assert clock.sleeps == [0.1, 0.2, 0.4]
+    assert abs(waited.elapsed - 0.7) < 1e-9
+
+
+def test_wait_until_stops_at_the_deadline():
+    clock = FakeClock()
+    waited = wait_until(lambda: "lmcv2", service_matches(["winusb"]), deadline=2.5,
+                        sleep=clock.sleep, clock=clock)
+    assert not waited.ready and waited.value == "lmcv2"
+    # 0.1 + 0.2 + 0.4 + 0.8 + 1.0, then only what is left of the deadline
+    assert clock.sleeps[:5] == [0.1, 0.2, 0.4, 0.8, 1.0]
+    assert abs(sum(clock.sleeps) - 2.5) < 1e-9 and waited.elapsed >= 2.5
+
+
+def test_wait_until_treats_probe_errors_as_not_ready():
+    clock = FakeClock()
+    calls = []
+
+    def probe():
+        calls.append(1)
+        if len(calls) < 3:
+            raise OSError("query failed")
+        return "winusb"
+
+    waited = wait_until(probe, service_matches(["winusb"]), deadline=5,
+                        sleep=clock.sleep, clock=clock)
+    assert waited.ready and waited.attempts == 3
+
+
+def test_wait_until_probes_once_without_time_left():
+    waited = wait_until(lambda: "lmcv2", service_matches(["winusb"]), deadline=0,
+                        sleep=lambda seconds: None)
+    assert not waited.ready and waited.attempts == 1
+
+
+def test_wait_until_async():
+    values = iter(["not found", "lmcv2"])
+
+    async def probe():
+        return next(values)
+
+    waited = run_sync(wait_until_async(probe, device_present, deadline=5, initial_delay=0.01))
+    assert waited.ready and waited.value == "lmcv2" and waited.attempts == 2
+
+
+def test_predicates():
+    assert service_released(["lmc"])("not found")
+    assert service_released(["lmc"])("winusb")
+    assert not service_released(["lmc"])("lmcv2")
+    assert not device_present("not found") and not device_present("")
+    assert device_present("winusb")
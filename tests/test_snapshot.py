@@ -0,0 +1,30 @@
+from ezswitch.backend import DeviceInfo
+from ezswitch.snapshot import load_snapshot, save_snapshot
+
+from conftest import HW_ID
+
+DEVICE = DeviceInfo("USB\\VID_9588&PID_9899\\1", "OK", "lmcv2", "oem12.inf", "2.0.0.0", 0)
+
+
+def test_snapshot_round_trip():
+    save_snapshot(DEVICE, HW_ID)
+    snapshot = load_snapshot(HW_ID)
+    assert snapshot['instance_id'] == DEVICE.instance_id
+    assert snapshot['service'] == "lmcv2" and snapshot['inf_name'] == "oem12.inf"
+    assert snapshot['timestamp']
+
+
+def test_snapshot_of_other_hardware_id_is_ignored():
+    save_snapshot(DEVICE, HW_ID)
+    assert load_snapshot("VID_1234&PID_5678") is None
+
+
+def test_missing_or_corrupt_snapshot(workdir):
+    assert load_snapshot(HW_ID) is None
+    (workdir / "device_snapshot.json").write_text("{not json")
+    assert load_snapshot(HW_ID) is None
+
+
+def test_unwritable_snapshot_is_ignored(workdir):
+    snapshot = save_snapshot(DEVICE, HW_ID, path=str(workdir / "missing" / "snapshot.json"))
+    assert snapshot['service'] == "lmcv2"
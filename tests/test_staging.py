@@ -0,0 +1,37 @@
+from ezswitch.staging import DriverStaging
+
+
+def test_ensure_staged_records_and_reuses_package(config, make_backend):
+    backend = make_backend()
+    staging = DriverStaging()
+    published = staging.ensure_staged(backend, config['ezcad_driver'])
+    assert published and backend.calls["stage_driver"] == 1
+
+    # A new session reads the record and finds the package still in the store
+    assert DriverStaging().lookup(backend, config['ezcad_driver']) == published
+    assert staging.ensure_staged(backend, config['ezcad_driver']) == published
+    assert backend.calls["stage_driver"] == 1
+
+
+def test_reused_published_name_is_not_trusted(config, make_backend):
+    backend = make_backend()
+    staging = DriverStaging()
+    published = staging.ensure_staged(backend, config['ezcad_driver'])
+
+    # The package was deleted and Windows gave its oemNN.inf to the LightBurn driver
+    backend._staged = {config['lightburn_driver']: published}
+    assert backend.is_staged(published)
+    assert staging.lookup(backend, config['ezcad_driver']) is None
+
+    restaged = staging.ensure_staged(backend, config['ezcad_driver'])
+    assert restaged != published
+    assert backend.package_location(restaged).endswith("lmc1usb.inf")
+
+
+def test_changed_source_is_restaged(config, make_backend):
+    backend = make_backend()
+    staging = DriverStaging()
+    staging.ensure_staged(backend, config['ezcad_driver'])
+    with open(config['ezcad_driver'], 'a') as f:
+        f.write("; new build\n")
+    assert staging.lookup(backend, config['ezcad_driver']) is None
@@ -0,0 +1,52 @@
+from ezswitch.stats import percentile, summarize
+from ezswitch.timeouts import (
+    DEFAULT_STEP_TIMEOUTS, LIMITS, MIN_SAMPLES, StepTimeouts, learn_limits
+)
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([4.0], 95) == 4.0
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile([3, 1, 2], 0) == 1 and percentile([3, 1, 2], 100) == 3
+    assert summarize([1.0, 2.0, 3.0]) == {"count": 3, "p50": 2.0, "p95": 2.9, "max": 3.0}
+
+
+def switch(uninstall, ok=True, host="cell-1", strategy="bind"):
+    return {"kind": "switch", "ok": ok, "host": host, "strategy": strategy,
+            "phases": {"uninstall": uninstall, "verify": 1.0}}
+
+
+def test_learn_limits_from_healthy_runs():
+    entries = [switch(10.0) for _ in range(MIN_SAMPLES)]
+    # Failures and other machines never count
+    entries += [switch(59.0, ok=False), switch(50.0, host="cell-2")]
+    limits = learn_limits(entries, "cell-1")
+    assert limits["uninstall"] == 21.0
+    assert limits["verify"] == LIMITS["verify"][0]
+
+
+def test_learn_limits_needs_enough_samples():
+    assert learn_limits([switch(1.0)] * (MIN_SAMPLES - 1), "cell-1") == {}
+
+
+def test_learn_limits_clamps_to_ceiling():
+    assert learn_limits([switch(100.0)] * MIN_SAMPLES)["uninstall"] == LIMITS["uninstall"][1]
+
+
+def test_consolidated_switch_only_teaches_run_switch():
+    entry = {"kind": "switch", "ok": True, "strategy": "consolidated",
+             "phases": {"uninstall": 5.0, "total": 40.0}}
+    assert learn_limits([entry] * MIN_SAMPLES) == {"run_switch": 81.0}
+
+
+def test_step_timeouts_precedence():
+    learned = {"uninstall": 21.0, "verify": 7.0}
+    timeouts = StepTimeouts({"step_timeouts": {"uninstall": 5.0}, "verify_wait": 3}, learned)
+    assert timeouts.step("uninstall") == 5.0
+    assert timeouts.wait("verify") == 3.0
+    assert timeouts.step("bind") == DEFAULT_STEP_TIMEOUTS["bind"]
+
+    timeouts = StepTimeouts({"adaptive_timeouts": False}, learned)
+    assert timeouts.step("uninstall") == DEFAULT_STEP_TIMEOUTS["uninstall"]
+    assert timeouts.learned == {}